@@ -0,0 +1,340 @@
+"""
+切片参数扫描：在不同的块大小、重叠和分割策略下重新切分 DATASET 中的文档，
+每种配置在本地建立索引并运行带标注的问题集，用数据选择默认的切片参数
+
+每种配置按与 upsert.py 相同的流程处理（分割 → 近重复去重 → 嵌入 → 写入切片产物），
+再用仓库根目录的 LocalVectorIndex 检索，输出：
+    chunks        块数（去重后）
+    embed_tokens  嵌入的token总数，决定入库费用
+    index_mb      切片产物的大小
+    ingest_s      入库耗时（分割、去重、嵌入、写入产物）
+    recall@k      前k个结果（section策略扩展为父级section后）中找到的标注证据比例
+    tokens        前 --top-k 个结果拼成的上下文的token数，即每次查询的提示词token
+    p50/p95 ms    检索耗时（本地索引查询和上下文拼接，不含查询嵌入）
+
+section 策略的块大小即叶子段落的最大字符数，不使用重叠；langchain 策略按固定窗口切分。
+
+问题集为JSON数组，每项 {"query": 问题, "evidence": [答案所在原文的片段]}，
+片段不要超过最小的块大小；只有 expect 关键词的冒烟查询也可以使用，按关键词计算。
+
+用法：
+    python chunk_sweep.py                                  # 默认网格，OpenAI嵌入
+    python chunk_sweep.py --embedder hashing               # 本地哈希嵌入，不调用API，只适合比较相对差异
+    python chunk_sweep.py --strategies langchain --sizes 1000,1500,2000 --overlaps 0,150,300 --output sweep.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+import numpy as np
+from dedup import deduplicate_chunks, DEFAULT_THRESHOLD
+from section_chunker import section_passages
+
+# 复用仓库根目录下的切片产物和本地索引
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunk_artifact import ChunkArtifact, write_artifact
+from local_index import LocalVectorIndex
+from chunk_types import classify_chunk
+
+DEFAULT_SIZES = [400, 800, 1500, 2000]
+DEFAULT_OVERLAPS = [0, 150]
+DEFAULT_K = [3, 5, 10]
+# 哈希嵌入的维度
+HASH_DIM = 1024
+
+_WHITESPACE = re.compile(r'\s+')
+_CJK = re.compile(r'[一-鿿]')
+
+
+def count_tokens(text: str) -> int:
+    """按嵌入模型的分词计算token数，未安装tiktoken时按中文每字一个token、其他每4个字符一个token估算"""
+    try:
+        import tiktoken
+    except ImportError:
+        cjk = len(_CJK.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+class HashingEmbedder:
+    """字符二元组哈希嵌入，不调用API，只用于比较不同配置的相对差异"""
+
+    model = "hashing-bigram"
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = _WHITESPACE.sub('', text)
+            for i in range(len(text) - 1):
+                h = zlib.crc32(text[i:i + 2].encode('utf-8'))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return vectors
+
+
+class OpenAIEmbedder:
+    """与 upsert.py 相同的嵌入模型和API密钥"""
+
+    def __init__(self):
+        # 只在使用OpenAI嵌入时导入upsert（依赖langchain和pinecone）
+        from upsert import embed_texts, EMBEDDING_MODEL
+        self._embed_texts = embed_texts
+        self.model = EMBEDDING_MODEL
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        import asyncio
+        return np.asarray(asyncio.run(self._embed_texts(texts)), dtype=np.float32)
+
+
+def load_documents(patterns: List[str]) -> Dict[str, str]:
+    """读取源文档，文件路径 -> 全文"""
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        raise ValueError(f"没有找到源文档：{patterns}")
+    documents = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            documents[path] = f.read()
+    return documents
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """读取问题集，证据统一放在 evidence 中"""
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    questions = []
+    for item in items:
+        evidence = item.get("evidence") or item.get("expect") or []
+        if evidence:
+            questions.append({"query": item["query"], "evidence": list(evidence)})
+    if not questions:
+        raise ValueError(f"{path} 中没有带 evidence 或 expect 的问题")
+    return questions
+
+
+def build_grid(strategies: List[str], sizes: List[int], overlaps: List[int]) -> List[Dict[str, Any]]:
+    """生成要测量的配置，section策略不使用重叠，每个大小只测一次"""
+    grid = []
+    for strategy in strategies:
+        for size in sizes:
+            for overlap in ([0] if strategy == "section" else overlaps):
+                if overlap < size:
+                    grid.append({"strategy": strategy, "size": size, "overlap": overlap})
+    return grid
+
+
+def chunk_documents(documents: Dict[str, str], strategy: str, size: int, overlap: int,
+                    dedup_threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[str], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    按一种配置切分所有文档并去重
+
+    Returns:
+        Tuple: (块文本, 块metadata, 父级section)
+    """
+    current_time = datetime.now().isoformat()
+    texts, metadatas, sections = [], [], []
+    for source_file, content in documents.items():
+        if strategy == "section":
+            passages, parents = section_passages(content, source_file, current_time, max_passage_chars=size)
+            chunks = [p["text"] for p in passages]
+            parent_ids = [p["parent_id"] for p in passages]
+            sections.extend(parents)
+        else:
+            # 只在需要时导入langchain；分割结果不需要导出为文本
+            from langchain_splitter import process_markdown_with_langchain
+            chunks = process_markdown_with_langchain(size, overlap, content, os.devnull)
+            parent_ids = [None] * len(chunks)
+        if dedup_threshold > 0:
+            original = chunks
+            chunks, sources, _ = deduplicate_chunks(chunks, dedup_threshold)
+            parent_ids = [next(parent_ids[j] for j in members if original[j] == text)
+                          for text, members in zip(chunks, sources)]
+        for text, parent_id in zip(chunks, parent_ids):
+            metadata = {"source_file": source_file, "chunk_type": classify_chunk(text, source_file)}
+            if parent_id:
+                metadata["parent_id"] = parent_id
+            texts.append(text)
+            metadatas.append(metadata)
+    return texts, metadatas, sections
+
+
+def _found(context: str, evidence: List[str]) -> float:
+    # 去掉空白后匹配，切分处的换行不影响判断
+    context = _WHITESPACE.sub('', context)
+    return sum(1 for snippet in evidence if _WHITESPACE.sub('', snippet) in context) / len(evidence)
+
+
+def _context(hits: List[Dict[str, Any]], sections: Dict[str, str], expand: bool) -> List[str]:
+    # 与VectorSearch相同：命中的段落扩展为父级section，同一section只取一次
+    texts, seen = [], set()
+    for hit in hits:
+        parent_id = hit["metadata"].get("parent_id")
+        key = parent_id if expand and parent_id in sections else hit["id"]
+        if key in seen:
+            continue
+        seen.add(key)
+        texts.append(sections[key] if key == parent_id else hit["metadata"]["text"])
+    return texts
+
+
+def evaluate(index: LocalVectorIndex, sections: Dict[str, str], questions: List[Dict[str, Any]],
+             query_vectors: np.ndarray, k_values: List[int], top_k: int, expand: bool = True,
+             repeat: int = 3) -> Dict[str, Any]:
+    """
+    在一个索引上运行问题集
+
+    Args:
+        index: 本地索引
+        sections: 父级section ID -> 文本
+        questions: 问题集
+        query_vectors: 问题的嵌入
+        k_values: 计算recall的k
+        top_k: 计算提示词token时使用的结果数（应用中的TOP_K）
+        expand: 是否把命中的段落扩展为父级section
+        repeat: 检索耗时的重复次数
+
+    Returns:
+        Dict[str, Any]: 各k的recall、每次查询的平均提示词token和检索耗时
+    """
+    max_k = max(k_values + [top_k])
+    recall = {k: 0.0 for k in k_values}
+    tokens, latencies = [], []
+    for question, vector in zip(questions, query_vectors):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hits = index.query(vector, max_k)
+            context = _context(hits[:top_k], sections, expand)
+            latencies.append((time.perf_counter() - start) * 1000)
+        for k in k_values:
+            recall[k] += _found("\n".join(_context(hits[:k], sections, expand)), question["evidence"])
+        tokens.append(count_tokens("\n\n".join(context)))
+    latencies.sort()
+    return {
+        **{f"recall@{k}": recall[k] / len(questions) for k in k_values},
+        "tokens": statistics.mean(tokens),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def run_config(config: Dict[str, Any], documents: Dict[str, str], embedder, questions: List[Dict[str, Any]],
+               query_vectors: np.ndarray, workdir: str, k_values: List[int], top_k: int,
+               dedup_threshold: float = DEFAULT_THRESHOLD, expand: bool = True) -> Dict[str, Any]:
+    """入库并评估一种配置"""
+    start = time.perf_counter()
+    texts, metadatas, sections = chunk_documents(documents, config["strategy"], config["size"],
+                                                 config["overlap"], dedup_threshold)
+    vectors = embedder.embed(texts)
+    name = f"{config['strategy']}-{config['size']}-{config['overlap']}"
+    path = os.path.join(workdir, name)
+    ids = [f"{name}_{i}" for i in range(len(texts))]
+    write_artifact(path, ids, texts, metadatas, vectors, model=embedder.model, sections=sections)
+    ingest_seconds = time.perf_counter() - start
+
+    index = LocalVectorIndex([path])
+    try:
+        artifact = ChunkArtifact(path)
+        parents = {section["id"]: section["text"] for section in artifact.iter_sections()}
+        artifact.close()
+        metrics = evaluate(index, parents, questions, query_vectors, k_values, top_k, expand)
+    finally:
+        index.close()
+    return {
+        **config,
+        "chunks": len(texts),
+        "embed_tokens": sum(count_tokens(text) for text in texts),
+        "index_mb": _dir_size(path) / 1024 / 1024,
+        "ingest_s": ingest_seconds,
+        **metrics,
+    }
+
+
+def best_config(results: List[Dict[str, Any]], top_k: int) -> Dict[str, Any]:
+    """recall@top_k最高的配置，相同时取提示词token最少的"""
+    key = f"recall@{top_k}"
+    return max(results, key=lambda r: (round(r.get(key, 0.0), 4), -r["tokens"]))
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='扫描切片参数，比较召回率、提示词token、入库耗时和检索耗时')
+    parser.add_argument('--source', type=str, nargs='+', default=['DATASET/*.md'], help='源文档（支持通配符）')
+    parser.add_argument('--questions', type=str, default='chunk_eval.json', help='带标注的问题集')
+    parser.add_argument('--strategies', type=str, default='section,langchain', help='分割策略，逗号分隔')
+    parser.add_argument('--sizes', type=_int_list, default=DEFAULT_SIZES, help='块大小（字符），逗号分隔')
+    parser.add_argument('--overlaps', type=_int_list, default=DEFAULT_OVERLAPS, help='块重叠（字符，仅langchain策略），逗号分隔')
+    parser.add_argument('--k', type=_int_list, default=DEFAULT_K, help='计算recall的k，逗号分隔')
+    parser.add_argument('--top-k', type=int, default=5, help='每次查询放入提示词的结果数')
+    parser.add_argument('--embedder', type=str, default='openai', choices=['openai', 'hashing'],
+                        help='openai（与upsert.py相同的嵌入模型）或 hashing（本地哈希嵌入，不调用API）')
+    parser.add_argument('--dedup-threshold', type=float, default=DEFAULT_THRESHOLD, help='近重复合并的相似度阈值，0表示不去重')
+    parser.add_argument('--no-expand', action='store_true', help='不把命中的段落扩展为父级section（对应 SECTION_EXPANSION=false）')
+    parser.add_argument('--keep-artifacts', type=str, default=None, help='把各配置的切片产物保留在该目录，默认用完即删')
+    parser.add_argument('--output', type=str, default=None, help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    strategies = [s.strip() for s in args.strategies.split(',') if s.strip()]
+    unknown = [s for s in strategies if s not in ('section', 'langchain')]
+    if unknown:
+        parser.error(f"未知的分割策略：{', '.join(unknown)}")
+
+    documents = load_documents(args.source)
+    questions = load_questions(args.questions)
+    embedder = OpenAIEmbedder() if args.embedder == 'openai' else HashingEmbedder()
+    query_vectors = embedder.embed([q["query"] for q in questions])
+    grid = build_grid(strategies, args.sizes, args.overlaps)
+    print(f"{len(documents)} 个文档，{len(questions)} 个问题，{len(grid)} 种配置，嵌入模型 {embedder.model}")
+
+    workdir = args.keep_artifacts or tempfile.mkdtemp(prefix="chunk-sweep-")
+    os.makedirs(workdir, exist_ok=True)
+    recall_columns = [f"recall@{k}" for k in args.k]
+    print(f"{'strategy':<10}{'size':>6}{'overlap':>8}{'chunks':>8}{'embed_tok':>11}{'index_mb':>9}{'ingest_s':>9}"
+          + "".join(f"{c:>11}" for c in recall_columns) + f"{'tokens':>8}{'p50_ms':>8}{'p95_ms':>8}")
+    results = []
+    try:
+        for config in grid:
+            result = run_config(config, documents, embedder, questions, query_vectors, workdir,
+                                args.k, args.top_k, args.dedup_threshold, not args.no_expand)
+            results.append(result)
+            print(f"{result['strategy']:<10}{result['size']:>6}{result['overlap']:>8}{result['chunks']:>8}"
+                  f"{result['embed_tokens']:>11}{result['index_mb']:>9.2f}{result['ingest_s']:>9.2f}"
+                  + "".join(f"{result[c]:>11.3f}" for c in recall_columns)
+                  + f"{result['tokens']:>8.0f}{result['p50_ms']:>8.2f}{result['p95_ms']:>8.2f}")
+    finally:
+        if not args.keep_artifacts:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    best = best_config(results, args.top_k) if f"recall@{args.top_k}" in recall_columns else None
+    if best:
+        print(f"recall@{args.top_k} 最高且提示词最少的配置：{best['strategy']} 策略，"
+              f"块大小 {best['size']}，重叠 {best['overlap']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"embedder": embedder.model, "questions": len(questions), "top_k": args.top_k,
+                       "results": results, "best": best}, f, ensure_ascii=False, indent=2)
+
+
+__all__ = ['build_grid', 'chunk_documents', 'evaluate', 'run_config', 'best_config', 'count_tokens', 'HashingEmbedder']
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,25 @@ import re
 from typing import List, Dict, Any, Tuple
 
 class Section:
-    def __init__(self, title: str = "", content: List[str] = None, subsections: List['Section'] = None):
+    def __init__(self, title: str = "", content: List[str] = None, subsections: List['Section'] = None,
+                 indented: bool = False):
         self.title = title
         self.content = content or []
         self.subsections = subsections or []
+        # 由缩进列表项生成的section（如武器名下的属性行），不是markdown标题
+        self.indented = indented
+        # 正文行与子section按原文顺序交错排列，如"武器名"行之后紧跟其缩进的属性行
+        self.children = list(self.content) + list(self.subsections)
+
+    def add_line(self, line: str):
+        """追加一行正文"""
+        self.content.append(line)
+        self.children.append(line)
+
+    def add_subsection(self, section: 'Section'):
+        """追加一个子section"""
+        self.subsections.append(section)
+        self.children.append(section)
 
     def to_dict(self) -> Dict[str, Any]:
         result = {
@@ -99,8 +114,9 @@ def parse_markdown(lines, level=1, start=0, end=None):
             i += 1
     return sections, i
 
-def Process_text(text: str) -> str:
-    # 按行分割并过滤空行
+def build_section_tree(text: str) -> List[Section]:
+    """按标题层级构建Section树，返回一级标题对应的区块列表"""
+    # 按行分割
     lines = [line for line in text.strip().split('\n')]
     
     # 存储所有区块
@@ -133,7 +149,7 @@ def Process_text(text: str) -> str:
                 # 添加到父级section，需保证栈不为空
                 if current_section_stack:
                     parent = current_section_stack[-1]
-                    parent.subsections.append(new_section)
+                    parent.add_subsection(new_section)
                     current_section_stack.append(new_section)
                 else:
                     # 没有父级，直接跳过或作为一级标题处理（可选）
@@ -145,16 +161,24 @@ def Process_text(text: str) -> str:
             # 处理缩进内容
             if current_section_stack:
                 current_indent = get_indent_level(line)
-                content, next_idx = process_indented_content(lines, i, current_indent)
+                if current_indent == 0:
+                    # 没有缩进的行直接添加到当前section
+                    if line.strip():
+                        current_section_stack[-1].add_line(line.strip())
+                    i += 1
+                    continue
+                # 以当前行为首行，收集同级及更深缩进的内容
+                content, next_idx = process_indented_content(lines, i, current_indent - 1)
                 
                 if content:
                     # 如果内容有缩进，创建新的子section
                     if current_indent > 0:
-                        new_section = Section(title=content[0], content=content[1:])
-                        current_section_stack[-1].subsections.append(new_section)
+                        new_section = Section(title=content[0], content=content[1:], indented=True)
+                        current_section_stack[-1].add_subsection(new_section)
                     else:
                         # 没有缩进的内容直接添加到当前section
-                        current_section_stack[-1].content.extend(content)
+                        for item in content:
+                            current_section_stack[-1].add_line(item)
                 
                 i = next_idx
             else:
@@ -163,9 +187,11 @@ def Process_text(text: str) -> str:
     # 添加最后一个区块
     if current_block:
         blocks.append(current_block)
-    
+    return blocks
+
+def Process_text(text: str) -> str:
     # 转换为JSON
-    result = [block.to_dict() for block in blocks]
+    result = [block.to_dict() for block in build_section_tree(text)]
     return json.dumps(result, ensure_ascii=False, indent=2)
 
 if __name__ == "__main__":
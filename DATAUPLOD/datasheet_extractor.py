@@ -0,0 +1,253 @@
+import json
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+# 武器分类标题
+RANGED_HEADERS = ("射击武器",)
+MELEE_HEADERS = ("近战武器", "格斗武器")
+
+# 格式一：**攻击范围:** 18 **A:** 1 **BS:** 2+ ...
+PROFILE_FIELD_PATTERN = re.compile(r'\*\*(攻击范围|A|BS|WS|S|AP|D|武器技能):\*\*\s*([^*]*)')
+# 格式二：范围 24, A 3, BS 2+, S 6, AP -2, D 2, 技能 ...
+INLINE_PROFILE_PATTERN = re.compile(
+    r'范围\s*([^,，]+)[,，]\s*A\s*([^,，]+)[,，]\s*(?:BS|WS)\s*([^,，]+)[,，]\s*S\s*([^,，]+)[,，]\s*'
+    r'AP\s*([^,，]+)[,，]\s*D\s*([^,，。]+)(?:[,，]\s*技能\s*(.*?))?。?$'
+)
+BULLET_FIELD_PATTERN = re.compile(r'^\*\*(.+?)[:：]\*\*\s*(.*)$')
+STAT_PATTERN = re.compile(r'^(M|T|SV|W|LD|OC)\s*(\S+)$')
+SINGLE_STAT_PATTERN = re.compile(r'^(M|T|SV|W|LD|OC)[:：]\s*(.+)$')
+# 属性值：数值加可选的模型说明，如"6+"、"1 (梦魇剑客), 2"；PDF转换时粘连在后面的正文不属于属性值
+_STAT_TOKEN = r'[\dD][\dD+"″]*(?:\s*[(（][^()（）]*[)）])?'
+STAT_VALUE_PATTERN = re.compile(rf'^{_STAT_TOKEN}(?:\s*[,，]\s*{_STAT_TOKEN})*')
+
+
+def _clean(text: str) -> str:
+    """去除markdown强调符号和多余空白"""
+    return re.sub(r'\s+', ' ', text.replace('**', '').replace('【', '').replace('】', '')).strip(' ，,。')
+
+
+def _strip_bullet(line: str) -> Tuple[int, str]:
+    """返回列表项的缩进级别和去掉项目符号后的内容"""
+    indent = len(line) - len(line.lstrip())
+    content = line.strip()
+    if content.startswith('*') and not content.startswith('**'):
+        content = content[1:].strip()
+    return indent, content
+
+
+def split_unit_title(title: str) -> Tuple[str, str, List[str]]:
+    """
+    拆分单位标题为中文名、英文名和别名
+
+    Args:
+        title: 形如"织夜者坦克 NIGHT SPINNER"或"独角 (SOLITAIRE)"的标题
+
+    Returns:
+        Tuple[str, str, List[str]]: 中文名、英文名、别名列表
+    """
+    last_non_ascii = max((i for i, ch in enumerate(title) if ord(ch) > 127), default=-1)
+    name_zh = title[:last_non_ascii + 1].strip()
+    name_en = title[last_non_ascii + 1:].strip()
+    if name_en.startswith('(') and name_en.endswith(')'):
+        name_en = name_en[1:-1].strip()
+
+    aliases = []
+    # 括号中的中文别名，如"音波炮平台（震击炮平台）"
+    bracket = re.match(r'^(.+?)[（(](.+?)[）)]$', name_zh)
+    if bracket:
+        name_zh = bracket.group(1).strip()
+        aliases.append(bracket.group(2).strip())
+    return name_zh, name_en, aliases
+
+
+def _stat_value(text: str) -> Tuple[str, str]:
+    """拆分属性行为属性值和粘连在后面的多余文本"""
+    text = text.replace('**', '').strip()
+    match = STAT_VALUE_PATTERN.match(text)
+    if not match:
+        return _clean(text), ''
+    return _clean(match.group(0)), text[match.end():].strip()
+
+
+def _weapon_category(current_weapon: Dict[str, str], profile: Dict[str, str]) -> str:
+    """武器分类；分类标题缺失时按攻击范围判断"""
+    if current_weapon.get("category"):
+        return current_weapon["category"]
+    return 'melee' if profile["range"] == '近战' else 'ranged'
+
+
+def _parse_profile_fields(text: str) -> Optional[Dict[str, str]]:
+    """解析格式一的武器属性行"""
+    fields = {k: _clean(v) for k, v in PROFILE_FIELD_PATTERN.findall(text)}
+    if '攻击范围' not in fields:
+        return None
+    return {
+        "range": fields.get('攻击范围', ''),
+        "attacks": fields.get('A', ''),
+        "skill": fields.get('BS', fields.get('WS', '')),
+        "strength": fields.get('S', ''),
+        "ap": fields.get('AP', ''),
+        "damage": fields.get('D', ''),
+        "abilities": fields.get('武器技能', '').strip('- ')
+    }
+
+
+def _parse_inline_profile(text: str) -> Optional[Dict[str, str]]:
+    """解析格式二的武器属性行"""
+    match = INLINE_PROFILE_PATTERN.search(text.replace('**', ''))
+    if not match:
+        return None
+    values = [_clean(v or '') for v in match.groups()]
+    return {
+        "range": values[0],
+        "attacks": values[1],
+        "skill": values[2],
+        "strength": values[3],
+        "ap": values[4],
+        "damage": values[5],
+        "abilities": values[6]
+    }
+
+
+def parse_datasheet(title: str, lines: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    解析单个单位的数据卡
+
+    Args:
+        title: 三级标题文本
+        lines: 标题下的正文行
+
+    Returns:
+        Optional[Dict[str, Any]]: 数据卡字典；若不含属性数据则返回None
+    """
+    name_zh, name_en, aliases = split_unit_title(title)
+    stats = {}
+    fields = {}
+    abilities = []
+    weapons = []
+
+    block = None            # 当前所处的区块：stats / abilities / ranged / melee / weapons / fields
+    current_weapon = None
+    last_field = None
+
+    for raw in lines:
+        if not raw.strip():
+            continue
+        indent, content = _strip_bullet(raw)
+
+        # 属性：兼容"**M:** 7"与"**M** 12, **T** 3, ..."两种写法
+        single_stat = SINGLE_STAT_PATTERN.match(content.replace('**', ''))
+        if single_stat:
+            stats[single_stat.group(1)], rest = _stat_value(single_stat.group(2))
+            if rest.endswith(':'):
+                # 后面的武器分类标题被并入了属性行，如"**W:** 1 (梦魇剑客), 2):**"，
+                # 分类在读到武器属性时按攻击范围判断
+                block, current_weapon = 'weapons', None
+            continue
+        stat_pieces = [STAT_PATTERN.match(_clean(p)) for p in re.split(r'[,，]', content.replace('**', ''))]
+        if all(stat_pieces):
+            stats.update({m.group(1): m.group(2) for m in stat_pieces})
+            continue
+
+        header = BULLET_FIELD_PATTERN.match(content)
+        key = _clean(header.group(1)).replace(' ', '') if header else ''
+        value = header.group(2).strip() if header else ''
+
+        # 区块标题：**属性:** / **技能 (Abilities):** / **射击武器 (Ranged Weapons):** 等
+        if header and key.startswith(RANGED_HEADERS):
+            block, current_weapon = 'ranged', None
+            continue
+        if header and key.startswith(MELEE_HEADERS):
+            block, current_weapon = 'melee', None
+            continue
+        if header and not value:
+            if key.startswith('属性'):
+                block = 'stats'
+            elif key.startswith('技能'):
+                block = 'abilities'
+            else:
+                block = 'fields'
+            continue
+
+        if key == '武器名' and block not in ('ranged', 'melee'):
+            # 缺少分类标题的武器
+            block = 'weapons'
+        if block in ('ranged', 'melee', 'weapons'):
+            if key == '武器名':
+                current_weapon = {"name": _clean(value), "category": block if block != 'weapons' else ''}
+                continue
+            profile = _parse_profile_fields(content)
+            if profile and current_weapon:
+                # 多模式武器，如"**击星弹头:** **攻击范围:** 48 ..."
+                mode = re.match(r'^\*\*([^*]+?)[:：]\*\*\s*\*\*攻击范围', content)
+                profile_name = _clean(mode.group(1)) if mode else ''
+                weapons.append({**current_weapon, "category": _weapon_category(current_weapon, profile),
+                                "profile": profile_name, **profile})
+                continue
+            inline = _parse_inline_profile(value) if header else None
+            if inline:
+                category = _weapon_category({"category": block if block != 'weapons' else ''}, inline)
+                weapons.append({"name": key, "category": category, "profile": "", **inline})
+            continue
+
+        if block == 'abilities':
+            abilities.append(f"{key}：{_clean(value)}" if header else _clean(content))
+            continue
+
+        if header:
+            last_field = key
+            fields.setdefault(key, _clean(value))
+        elif last_field and indent > 0:
+            # 字段的续行，如领袖能力下的补充说明
+            fields[last_field] = f"{fields[last_field]} {_clean(content)}"
+
+    if not stats:
+        return None
+
+    keywords = [k.strip() for k in re.split(r'[,，]', fields.get('关键词', '')) if k.strip()]
+    return {
+        "name_zh": name_zh,
+        "name_en": name_en,
+        "aliases": aliases,
+        "faction": fields.get('阵营关键词', ''),
+        "stats": stats,
+        "keywords": keywords,
+        "fields": fields,
+        "abilities": abilities,
+        "weapons": weapons,
+        "raw_text": f"### {title}\n" + "\n".join(l.rstrip() for l in lines if l.strip())
+    }
+
+
+def extract_datasheets(text: str) -> List[Dict[str, Any]]:
+    """
+    从codex markdown中提取所有单位数据卡
+
+    Args:
+        text: markdown全文
+
+    Returns:
+        List[Dict[str, Any]]: 数据卡列表
+    """
+    datasheets = []
+    title = None
+    body = []
+    for line in text.split('\n') + ['### ']:
+        header = re.match(r'^(#+)\s*(.*)', line)
+        if header:
+            if title:
+                sheet = parse_datasheet(title, body)
+                if sheet:
+                    datasheets.append(sheet)
+            title = header.group(2).strip() if len(header.group(1)) == 3 else None
+            body = []
+        elif title:
+            body.append(line)
+    return datasheets
+
+
+if __name__ == "__main__":
+    with open('DATASET/aeldaricodex.md', 'r', encoding='utf-8') as f:
+        sheets = extract_datasheets(f.read())
+    print(f"共提取 {len(sheets)} 张数据卡，{sum(len(s['weapons']) for s in sheets)} 条武器属性")
+    print(json.dumps(sheets[0], ensure_ascii=False, indent=2))
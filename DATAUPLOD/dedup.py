@@ -0,0 +1,159 @@
+import re
+import zlib
+from typing import List, Dict, Any, Tuple
+import numpy as np
+
+# MinHash 参数
+NUM_PERM = 128          # 签名长度
+LSH_BANDS = 32          # LSH 分段数，每段 NUM_PERM // LSH_BANDS 行
+SHINGLE_SIZE = 5        # 字符n-gram长度，中文文本按字符切分效果优于按词
+DEFAULT_THRESHOLD = 0.9
+
+# 数值和属性：数字、掷骰表达式（D6、2D3+1）、技巧值（3+）和距离（12"）；
+# 两个块中的数值不同时，即使文字几乎一样也是不同的规则或单位
+NUMERIC_TOKEN_PATTERN = re.compile(r'\d*D\d+(?:\+\d+)?|\d+(?:\.\d+)?\+?"?')
+
+# 大于2^32的素数；a、b均小于2^31，a*x+b 不会超出uint64
+_PRIME = np.uint64(4294967311)
+
+
+def _shingles(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """将文本切分为字符n-gram并哈希为uint32数组"""
+    normalized = re.sub(r'\s+', '', text)
+    if len(normalized) <= size:
+        grams = {normalized}
+    else:
+        grams = {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash_signatures(texts: List[str], num_perm: int = NUM_PERM, seed: int = 42) -> np.ndarray:
+    """
+    计算文本的MinHash签名
+
+    Args:
+        texts: 文本列表
+        num_perm: 签名长度
+        seed: 随机种子，保证多次运行结果一致
+
+    Returns:
+        np.ndarray: 形状为 (len(texts), num_perm) 的签名矩阵
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2 ** 31, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = _shingles(text)
+        signatures[i] = ((np.outer(a, hashes) + b[:, None]) % _PRIME).min(axis=1)
+    return signatures
+
+
+def chunk_header(text: str) -> str:
+    """块的标题路径，两种切分方式都把标题路径放在块的第一行"""
+    return text.split('\n', 1)[0].strip()
+
+
+def chunk_body(text: str) -> str:
+    """块去掉标题路径后的正文，只有一行时为整个块"""
+    header, newline, body = text.partition('\n')
+    return body if newline else header
+
+
+def numeric_tokens(text: str) -> Tuple[str, ...]:
+    """块中出现的数值和属性，按出现顺序排列"""
+    return tuple(NUMERIC_TOKEN_PATTERN.findall(text))
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def deduplicate_chunks(chunks: List[str], threshold: float = DEFAULT_THRESHOLD,
+                       num_perm: int = NUM_PERM, bands: int = LSH_BANDS) -> Tuple[List[str], List[List[int]], Dict[str, Any]]:
+    """
+    合并近重复的文本块
+
+    只比较正文，标题路径只表示块的位置：不同数据卡下重复的武器技能、关键词说明和共用的武器属性
+    正文相同而标题不同，应当合并。先用LSH分段找出候选对，再要求两个块的数值和属性完全一致，
+    不同单位的数据卡（如"司战"和"翔空司战"）文字高度相似但属性不同，不会合并；
+    最后用MinHash估计的Jaccard相似度确认，相似度不低于阈值的文本块归为一组，每组保留最长的一个。
+
+    Args:
+        chunks: 文本块列表
+        threshold: Jaccard相似度阈值
+        num_perm: MinHash签名长度
+        bands: LSH分段数
+
+    Returns:
+        Tuple[List[str], List[List[int]], Dict[str, Any]]:
+            去重后的文本块、每个文本块对应的原始块序号、去重统计
+    """
+    if not chunks:
+        return [], [], {"input": 0, "output": 0, "removed": 0, "reduction": 0.0}
+
+    bodies = [chunk_body(c) for c in chunks]
+    signatures = minhash_signatures(bodies, num_perm)
+    rows = num_perm // bands
+    parent = list(range(len(chunks)))
+
+    candidate_pairs = set()
+    for band in range(bands):
+        buckets = {}
+        band_sig = signatures[:, band * rows:(band + 1) * rows]
+        for i, key in enumerate(map(bytes, band_sig)):
+            buckets.setdefault(key, []).append(i)
+        for members in buckets.values():
+            for j in members[1:]:
+                candidate_pairs.add((members[0], j))
+
+    numbers = {}
+    for i, j in candidate_pairs:
+        for k in (i, j):
+            if k not in numbers:
+                numbers[k] = numeric_tokens(bodies[k])
+        if numbers[i] != numbers[j]:
+            continue
+        similarity = float(np.mean(signatures[i] == signatures[j]))
+        if similarity >= threshold:
+            root_i, root_j = _find(parent, i), _find(parent, j)
+            if root_i != root_j:
+                parent[root_j] = root_i
+
+    groups = {}
+    for i in range(len(chunks)):
+        groups.setdefault(_find(parent, i), []).append(i)
+
+    unique_chunks, sources = [], []
+    # 按组内首次出现的位置排序，保持原文顺序
+    for members in sorted(groups.values(), key=lambda m: m[0]):
+        representative = max(members, key=lambda i: len(chunks[i]))
+        unique_chunks.append(chunks[representative])
+        sources.append(members)
+
+    removed = len(chunks) - len(unique_chunks)
+    stats = {
+        "input": len(chunks),
+        "output": len(unique_chunks),
+        "removed": removed,
+        "reduction": removed / len(chunks),
+        "input_chars": sum(len(c) for c in chunks),
+        "output_chars": sum(len(c) for c in unique_chunks),
+    }
+    return unique_chunks, sources, stats
+
+
+if __name__ == "__main__":
+    from langchain_splitter import process_markdown_with_langchain
+
+    with open('DATASET/aeldaricodex.md', 'r', encoding='utf-8') as f:
+        content = f.read()
+    chunks = process_markdown_with_langchain(1500, 150, content, "result_dedup.txt")
+    unique, groups, stats = deduplicate_chunks(chunks)
+    print(f"去重前 {stats['input']} 块，去重后 {stats['output']} 块，减少 {stats['reduction']:.1%}")
+    for members in groups:
+        if len(members) > 1:
+            print(f"合并的块：{members}（{'、'.join(dict.fromkeys(chunk_header(chunks[i]) for i in members))}）")
@@ -0,0 +1,110 @@
+from typing import List, Dict, Any, Tuple
+from datachunk import Section, build_section_tree
+
+# 叶子段落的最大字符数，段落越小嵌入越精确
+MAX_PASSAGE_CHARS = 400
+# 父级section的最大字符数，超过时不作为检索扩展的目标，继续向下拆分
+MAX_PARENT_CHARS = 4000
+
+
+def _body_lines(section: Section) -> List[str]:
+    """按原文顺序展开section的正文及所有子section"""
+    lines = []
+    for child in section.children:
+        if isinstance(child, Section):
+            lines.append(child.title)
+            lines.extend(_body_lines(child))
+        else:
+            lines.append(child)
+    return lines
+
+
+def _split_passages(prefix: str, lines: List[str], max_chars: int) -> List[str]:
+    """把正文行合并为不超过max_chars的段落，每个段落都带上标题路径"""
+    budget = max(max_chars - len(prefix) - 1, 50)
+    passages, current, size = [], [], 0
+    for line in lines:
+        # 过长的单行按长度硬切
+        pieces = [line[i:i + budget] for i in range(0, len(line), budget)] or [line]
+        for piece in pieces:
+            if current and size + len(piece) + 1 > budget:
+                passages.append(f"{prefix}\n" + "\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        passages.append(f"{prefix}\n" + "\n".join(current))
+    return passages
+
+
+def section_passages(text: str, source_file: str, current_time: str,
+                     max_passage_chars: int = MAX_PASSAGE_CHARS,
+                     max_parent_chars: int = MAX_PARENT_CHARS) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    基于Section树生成叶子段落和它们所属的父级section
+
+    每个段落指向能完整容纳它的最高层section（不超过max_parent_chars），
+    检索命中段落后扩展为该section，多个段落共享同一个父级时只取一次。
+
+    Args:
+        text: markdown全文
+        source_file: 源文件路径，用于生成section ID
+        current_time: 入库时间，用于生成section ID
+        max_passage_chars: 段落最大字符数
+        max_parent_chars: 父级section最大字符数
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+            段落列表 [{"text", "parent_id"}] 和父级section列表 [{"id", "text", "metadata"}]
+    """
+    passages, parents = [], []
+
+    def walk(section: Section, path: List[str]):
+        path = path + [section.title]
+        prefix = " ".join(path)
+        lines = _body_lines(section)
+        rendered = "\n".join([prefix] + lines)
+
+        if len(rendered) <= max_parent_chars:
+            own_passages = _split_passages(prefix, lines, max_passage_chars)
+            # 没有正文的section不会被任何段落扩展到，不写入文档库
+            if not own_passages:
+                return
+            parent_id = f"sec_{source_file}_{len(parents)}_{current_time}"
+            parents.append({
+                "id": parent_id,
+                "text": rendered,
+                "metadata": {"kind": "section", "title_path": prefix, "source_file": source_file}
+            })
+            for passage in own_passages:
+                passages.append({"text": passage, "parent_id": parent_id})
+            return
+
+        # section过大：本级正文按原文顺序单独成段（不扩展），子标题继续拆分；
+        # 缩进的列表项与它前面的行按顺序合并成段，武器名和它的属性行留在一起
+        run = []
+        for child in section.children + [None]:
+            if isinstance(child, str):
+                run.append(child)
+                continue
+            if child is not None and child.indented:
+                run.extend([child.title] + _body_lines(child))
+                continue
+            for passage in _split_passages(prefix, run, max_passage_chars):
+                passages.append({"text": passage, "parent_id": None})
+            run = []
+            if child is not None:
+                walk(child, path)
+
+    for block in build_section_tree(text):
+        walk(block, [])
+    return passages, parents
+
+
+if __name__ == "__main__":
+    with open('DATASET/aeldaricodex.md', 'r', encoding='utf-8') as f:
+        content = f.read()
+    passages, parents = section_passages(content, 'aeldaricodex.md', 'preview')
+    with_parent = sum(1 for p in passages if p["parent_id"])
+    print(f"共 {len(passages)} 个段落（{with_parent} 个带父级），{len(parents)} 个父级section")
+    print(passages[0]["text"])
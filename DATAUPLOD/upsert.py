@@ -1,60 +1,182 @@
 import asyncio
+import sys
 from pinecone import Pinecone, Vector
 from langchain_splitter import process_markdown_with_langchain, recursive_to_txt
 from langchain_community.embeddings import OpenAIEmbeddings
+from datasheet_extractor import extract_datasheets
+from dedup import deduplicate_chunks, chunk_header, DEFAULT_THRESHOLD
+from section_chunker import section_passages
 import os
 from datetime import datetime
 import argparse
 
+# 复用仓库根目录下的模块（数据卡查询表等）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from datasheet_lookup import build_datasheet_db
+from chunk_artifact import ChunkArtifact, write_artifact
+from doc_store import build_doc_store
+from alias_lexicon import extract_header_aliases, update_lexicon_file
+from chunk_types import classify_chunk
+from index_alias import read_alias, versioned_path, seed_version_file, DEFAULT_VERSION
+
 # Pinecone 配置
 PINECONE_API_KEY = ""
 PINECONE_INDEX = "wh40kcodex"
 # OpenAI 配置
 OPENAI_API_KEY = ""
-async def upsert_to_pinecone(texts: list, faction: str, source_file: str = "content.md"):
-    # 初始化 OpenAI embeddings
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# 每批上传的向量数
+UPSERT_BATCH_SIZE = 100
+
+def build_chunk_records(texts: list, faction: str, source_file: str, sources: list = None, current_time: str = None,
+                        parent_ids: list = None, original_texts: list = None):
+    """
+    为每个块生成ID和metadata（metadata中不含文本，文本单独存放在产物中）
+    
+    Args:
+        texts (list): 文本块列表
+        faction (str): 派系名称
+        source_file (str): 源文件路径
+        sources (list): 近重复合并后每个块对应的原始块序号，用于记录合并的块及其位置
+        current_time (str): 入库时间
+        parent_ids (list): 每个块所属父级section的ID，没有父级时为None
+        original_texts (list): 去重前的文本块，sources 中的序号指向这里，为None时与texts相同
+        
+    Returns:
+        tuple: (ids, metadatas)
+    """
+    current_time = current_time or datetime.now().isoformat()
+    original_texts = original_texts or texts
+    ids, metadatas = [], []
+    for i, text in enumerate(texts):
+        # 构建丰富的 metadata
+        metadata = {
+            "source_file": source_file,
+            "chunk_index": i,
+            "faction": faction,
+            "total_chunks": len(texts),
+            "timestamp": current_time,
+            "content_type": "markdown",
+            # 按标题路径和内容模式判断的块类型，检索时可以按类型过滤
+            "chunk_type": classify_chunk(text, source_file),
+            # 块的第一行是标题路径
+            "title_path": chunk_header(text),
+            "chunk_size": len(text),
+            "language": "zh"  # 假设是中文内容
+        }
+        # 近重复合并的块可能来自不同的数据卡或章节，记录每个原始块的位置（Pinecone的列表只能是字符串）
+        if sources:
+            metadata["duplicate_count"] = len(sources[i])
+            metadata["source_chunks"] = [str(j) for j in sources[i]]
+            metadata["duplicate_title_paths"] = list(dict.fromkeys(chunk_header(original_texts[j]) for j in sources[i]))
+        if parent_ids and parent_ids[i]:
+            metadata["parent_id"] = parent_ids[i]
+        ids.append(f"doc_{source_file}_{i}_{current_time}")
+        metadatas.append(metadata)
+    return ids, metadatas
+
+async def embed_texts(texts: list) -> list:
+    # 批量获取文本的向量表示
+    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL)
+    return await embeddings.aembed_documents(texts)
+
+async def upsert_to_pinecone(artifact: ChunkArtifact, text_in_metadata: bool = False, namespace: str = ""):
+    """
+    从切片产物批量导入 Pinecone
     
+    Args:
+        artifact (ChunkArtifact): 切片产物
+        text_in_metadata (bool): 是否在metadata中保留文本；使用本地文档库时不需要
+        namespace (str): 写入的命名空间（索引版本），为空时写入默认命名空间
+    """
     # 初始化 Pinecone 客户端
     pc = Pinecone(api_key=PINECONE_API_KEY)
     
-    # 获取当前时间
-    current_time = datetime.now().isoformat()
-    
     async with pc.IndexAsyncio(PINECONE_INDEX) as idx:
-        # 准备向量数据
-        vectors = []
-        for i, text in enumerate(texts):
-            # 获取文本的向量表示
-            embedding = await embeddings.aembed_query(text)           
-            # 构建丰富的 metadata
-            metadata = {
-                "text": text,
-                "source_file": source_file,
-                "chunk_index": i,
-                "faction": faction,
-                "total_chunks": len(texts),
-                "timestamp": current_time,
-                "content_type": "markdown",
-                "chunk_size": len(text),
-                "language": "zh"  # 假设是中文内容
-            }
-            
-            vectors.append(Vector(
-                id=f"doc_{source_file}_{i}_{current_time}",
-                values=embedding,
-                metadata=metadata
-            ))
-        
-        # 上传向量
-        await idx.upsert(vectors=vectors)
-        print(f"成功上传 {len(vectors)} 个文档到 Pinecone！")
+        total = 0
+        for ids, vectors, metadatas in artifact.iter_batches(UPSERT_BATCH_SIZE):
+            # 旧产物中没有块类型，导入时补上
+            metadatas = [
+                m if "chunk_type" in m else {**m, "chunk_type": classify_chunk(m.get("text", ""), m.get("source_file", ""))}
+                for m in metadatas
+            ]
+            if not text_in_metadata:
+                metadatas = [{k: v for k, v in m.items() if k != "text"} for m in metadatas]
+            # 上传向量
+            await idx.upsert(vectors=[
+                Vector(id=chunk_id, values=vector.tolist(), metadata=metadata)
+                for chunk_id, vector, metadata in zip(ids, vectors, metadatas)
+            ], namespace=namespace)
+            total += len(ids)
+        print(f"成功上传 {total} 个文档到 Pinecone{f'（版本 {namespace}）' if namespace else ''}！")
         
         # 查看索引统计信息
         stats = await idx.describe_index_stats()
         print("索引统计信息：", stats)
 
-async def main(source_file: str, faction: str, chunk_size: int = 1500, chunk_overlap: int = 150, output_file: str = "result.txt"):
+def write_doc_store(artifact: ChunkArtifact, doc_store: str):
+    # 把产物中的文本和父级section写入本地文档库，检索时按ID读取
+    count = build_doc_store(doc_store, (
+        (record["id"], record["text"], record["metadata"])
+        for record in (artifact.get(i) for i in range(len(artifact)))
+    ))
+    sections = build_doc_store(doc_store, (
+        (section["id"], section["text"], section["metadata"]) for section in artifact.iter_sections()
+    ))
+    print(f"已写入 {count} 个块和 {sections} 个父级section到文档库 {doc_store}")
+
+def default_artifact_path(source_file: str) -> str:
+    # 产物默认放在仓库根目录的 artifacts/ 下，以源文件名命名
+    name = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "artifacts", name)
+
+def resolve_version(namespace: str = None, live: bool = False, alias: str = "../index_alias.json") -> tuple:
+    """
+    确定本次入库写入的版本
+
+    Args:
+        namespace (str): 指定的版本名（命名空间），为None时生成新的版本名
+        live (bool): 直接写入线上正在使用的版本
+        alias (str): 索引别名文件路径
+
+    Returns:
+        tuple: (写入的版本名, 线上版本名)
+    """
+    data = read_alias(alias)
+    live_version = data["current"]["version"] if data else DEFAULT_VERSION
+    if live:
+        if namespace:
+            raise ValueError("--live 与 --namespace 不能同时指定")
+        return live_version, live_version
+    if namespace is None:
+        return datetime.now().strftime("v%Y%m%d%H%M%S"), live_version
+    # 空字符串表示默认命名空间
+    version = namespace or DEFAULT_VERSION
+    if version == live_version:
+        raise ValueError(f"版本 {version} 正在线上使用，直接写入需要指定 --live")
+    return version, live_version
+
+def version_file(path: str, version: str, live_version: str) -> str:
+    """
+    版本对应的数据卡查询表或别名词表路径，新版本的文件不存在时从线上版本复制
+
+    Args:
+        path (str): 默认版本的文件路径，为空时返回空
+        version (str): 写入的版本名
+        live_version (str): 线上版本名
+    """
+    target = versioned_path(path, version)
+    if target and target != path:
+        live_path = versioned_path(path, live_version)
+        seed_version_file(live_path if os.path.exists(live_path) else path, target)
+    return target
+
+async def main(source_file: str, faction: str, chunk_size: int = 1500, chunk_overlap: int = 150, output_file: str = "result.txt",
+               datasheet_db: str = "../datasheets.db", dedup_threshold: float = DEFAULT_THRESHOLD,
+               artifact_path: str = None, from_artifact: str = None,
+               doc_store: str = "../docstore.db", text_in_metadata: bool = False, strategy: str = "section",
+               lexicon: str = "../lexicon.json", namespace: str = None, live: bool = False,
+               alias: str = "../index_alias.json"):
     """
     主函数
     
@@ -63,38 +185,160 @@ async def main(source_file: str, faction: str, chunk_size: int = 1500, chunk_ove
         faction (str): 派系名称
         chunk_size (int): 文本块大小
         chunk_overlap (int): 文本块重叠大小
-        output_file (str): 输出文件名
+        output_file (str): 可读文本导出文件名
+        datasheet_db (str): 数据卡查询表路径，为空时跳过数据卡提取
+        dedup_threshold (float): 近重复合并的相似度阈值，为0时不去重
+        artifact_path (str): 切片产物输出目录，默认 artifacts/<源文件名>
+        from_artifact (str): 直接从已有产物导入，跳过分割和嵌入
+        doc_store (str): 本地文档库路径，为空时不写文档库并在metadata中保留文本
+        text_in_metadata (bool): 写文档库的同时仍在metadata中保留文本
+        strategy (str): 分割策略，section（按Section树切分叶子段落）或 langchain（固定窗口）
+        lexicon (str): 别名词表路径，为空时跳过标题别名提取
+        namespace (str): 写入的索引版本，为空时生成新的版本名；新版本通过 index_alias.py promote 切换上线
+        live (bool): 直接写入线上正在使用的版本
+        alias (str): 索引别名文件路径，用于确定线上版本
     """
+    # 数据卡查询表和别名词表与索引按同一版本存放，回滚索引时一起回滚
+    version, live_version = resolve_version(namespace, live, alias)
+    namespace = "" if version == DEFAULT_VERSION else version
+    datasheet_db = version_file(datasheet_db, version, live_version)
+    lexicon = version_file(lexicon, version, live_version)
+    print(f"写入{'线上' if version == live_version else '新'}版本 {version}")
+
+    # 没有本地文档库时，检索只能从metadata读取文本
+    text_in_metadata = text_in_metadata or not doc_store
+    
+    if from_artifact:
+        artifact = ChunkArtifact(from_artifact)
+        print(f"从产物 {from_artifact} 导入 {len(artifact)} 个块（嵌入模型：{artifact.manifest['model']}）")
+        if doc_store:
+            write_doc_store(artifact, doc_store)
+        await upsert_to_pinecone(artifact, text_in_metadata, namespace)
+        artifact.close()
+        _print_next_step(version, live_version)
+        return
+    
     # 读取文档内容
     with open(source_file, 'r', encoding='utf-8') as f:
         content = f.read()
     
-    # 使用 LangChain 分割文本
-    chunks = process_markdown_with_langchain(chunk_size, chunk_overlap, content, output_file)
-    print(f"文本已分割为 {len(chunks)} 个块")
+    # 提取单位数据卡，写入结构化查询表
+    if datasheet_db:
+        datasheets = extract_datasheets(content)
+        if datasheets:
+            build_datasheet_db(datasheets, datasheet_db, source_file)
+            print(f"已提取 {len(datasheets)} 张数据卡到 {datasheet_db}")
+    
+    # 从标题中提取中英文名称，写入检索时使用的别名词表
+    if lexicon:
+        count = update_lexicon_file(lexicon, source_file, extract_header_aliases(content))
+        print(f"已提取 {count} 个标题别名到 {lexicon}")
+    
+    current_time = datetime.now().isoformat()
+    sections, parent_ids = [], None
+    if strategy == "section":
+        # 按Section树切分为叶子段落，每个段落指向所属的完整规则section
+        passages, sections = section_passages(content, source_file, current_time)
+        for section in sections:
+            section["metadata"]["chunk_type"] = classify_chunk(section["text"], source_file)
+        chunks = [p["text"] for p in passages]
+        parent_ids = [p["parent_id"] for p in passages]
+        print(f"文本已分割为 {len(chunks)} 个段落，{len(sections)} 个父级section")
+    else:
+        # 使用 LangChain 分割文本
+        chunks = process_markdown_with_langchain(chunk_size, chunk_overlap, content, output_file)
+        print(f"文本已分割为 {len(chunks)} 个块")
+    
+    # 合并近重复的块，减少嵌入调用和索引占用
+    sources, original = None, None
+    if dedup_threshold > 0:
+        original = chunks
+        chunks, sources, stats = deduplicate_chunks(chunks, dedup_threshold)
+        if parent_ids:
+            # 合并后的块沿用被保留的那个原始块的父级
+            parent_ids = [next(parent_ids[j] for j in members if original[j] == text)
+                          for text, members in zip(chunks, sources)]
+        print(f"近重复去重：{stats['input']} -> {stats['output']} 个块，减少 {stats['removed']} 个（{stats['reduction']:.1%}），"
+              f"字符数 {stats['input_chars']} -> {stats['output_chars']}")
     
     # 保存分割结果到文件
     recursive_to_txt(chunks, output_file)
     
+    # 嵌入并写入切片产物，之后重建索引或更换后端无需重新分割和嵌入
+    ids, metadatas = build_chunk_records(chunks, faction, source_file, sources, current_time, parent_ids, original)
+    vectors = await embed_texts(chunks)
+    artifact_path = artifact_path or default_artifact_path(source_file)
+    write_artifact(artifact_path, ids, chunks, metadatas, vectors, model=EMBEDDING_MODEL, sections=sections)
+    print(f"切片产物已写入 {artifact_path}")
+    
+    # 先写文档库再上传，保证索引中能检索到的块在本地都有文本
+    artifact = ChunkArtifact(artifact_path)
+    if doc_store:
+        write_doc_store(artifact, doc_store)
+    
     # 上传到 Pinecone
-    await upsert_to_pinecone(chunks, faction, source_file)
+    await upsert_to_pinecone(artifact, text_in_metadata, namespace)
+    artifact.close()
+    _print_next_step(version, live_version)
+
+def _print_next_step(version: str, live_version: str):
+    if version != live_version:
+        print(f"版本 {version} 已写入，其余文档用 --namespace {version} 写入同一版本，"
+              f"冒烟查询后在仓库根目录运行 python index_alias.py promote {version} 切换上线")
 
 if __name__ == "__main__":
     # 设置命令行参数
     parser = argparse.ArgumentParser(description='处理文档并上传到 Pinecone')
     parser.add_argument('--source', type=str, default='content.md', help='源文件路径')
-    parser.add_argument('--faction', type=str, required=True, help='派系名称')
-    parser.add_argument('--chunk-size', type=int, default=1500, help='文本块大小')
-    parser.add_argument('--chunk-overlap', type=int, default=150, help='文本块重叠大小')
-    parser.add_argument('--output', type=str, default='result.txt', help='输出文件名')
+    parser.add_argument('--faction', type=str, default='', help='派系名称（从产物导入时可省略）')
+    parser.add_argument('--strategy', type=str, default='section', choices=['section', 'langchain'],
+                        help='分割策略：section（按标题层级切分叶子段落并记录父级section）或 langchain（固定窗口）')
+    parser.add_argument('--chunk-size', type=int, default=1500, help='文本块大小（仅langchain策略）')
+    parser.add_argument('--chunk-overlap', type=int, default=150, help='文本块重叠大小（仅langchain策略）')
+    parser.add_argument('--output', type=str, default='result.txt', help='可读文本导出文件名')
+    parser.add_argument('--datasheet-db', type=str, default='../datasheets.db', help='数据卡查询表路径，传空字符串跳过')
+    parser.add_argument('--lexicon', type=str, default='../lexicon.json', help='别名词表路径，传空字符串跳过')
+    parser.add_argument('--dedup-threshold', type=float, default=DEFAULT_THRESHOLD, help='近重复合并的相似度阈值，0表示不去重')
+    parser.add_argument('--artifact', type=str, default=None, help='切片产物输出目录，默认 artifacts/<源文件名>')
+    parser.add_argument('--from-artifact', type=str, default=None, help='直接从已有切片产物导入 Pinecone，跳过分割和嵌入')
+    parser.add_argument('--doc-store', type=str, default='../docstore.db', help='本地文档库路径，传空字符串则不写文档库、文本保留在metadata中')
+    parser.add_argument('--namespace', type=str, default=None,
+                        help='写入的索引版本（命名空间），默认生成新的版本名，如 v20250101120000')
+    parser.add_argument('--live', action='store_true', help='直接写入线上正在使用的版本（不经过冒烟查询和切换）')
+    parser.add_argument('--alias', type=str, default='../index_alias.json', help='索引别名文件路径，用于确定线上版本')
+    parser.add_argument('--text-in-metadata', action='store_true', help='写文档库的同时仍在Pinecone metadata中保留文本')
+    parser.add_argument('--profile', action='store_true', help='采样分析整个入库过程，折叠栈文件写入 profiles/')
     
     args = parser.parse_args()
+    if not args.from_artifact and not args.faction:
+        parser.error('处理文档时必须指定 --faction')
+    if args.live and args.namespace:
+        parser.error('--live 与 --namespace 不能同时指定')
     
     # 运行主函数
-    asyncio.run(main(
+    run = main(
         source_file=args.source,
         faction=args.faction,
         chunk_size=args.chunk_size,
         chunk_overlap=args.chunk_overlap,
-        output_file=args.output
-    ))
+        output_file=args.output,
+        datasheet_db=args.datasheet_db,
+        dedup_threshold=args.dedup_threshold,
+        artifact_path=args.artifact,
+        from_artifact=args.from_artifact,
+        doc_store=args.doc_store,
+        text_in_metadata=args.text_in_metadata,
+        strategy=args.strategy,
+        lexicon=args.lexicon,
+        namespace=args.namespace,
+        live=args.live,
+        alias=args.alias
+    )
+    if args.profile:
+        # 只在分析时导入，入库脚本平时不依赖根目录的config
+        from request_profiler import profile_request
+        with profile_request(True, trace_id=f"upsert-{os.path.splitext(os.path.basename(args.source))[0]}") as profile:
+            asyncio.run(run)
+        print(f"分析结果已写入 {profile.output_dir}/{profile.trace_id}.wall.folded 和 .cpu.folded")
+    else:
+        asyncio.run(run)
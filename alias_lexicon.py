@@ -0,0 +1,237 @@
+"""
+别名词表：把查询中的英文名、缩写和俗称规范为规则文本中使用的中文术语
+
+词表由两部分组成：
+    aliases.json   人工整理的术语、属性缩写和俗称（随仓库提交）
+    lexicon.json   DATAUPLOD/upsert.py 从codex标题中提取的中英文名称（按源文件合并）
+所有别名编译为一个Aho-Corasick自动机，一次扫描即可找出查询中的全部别名。
+数据卡中的单位名和武器名作为受保护的术语一起编译，重叠时最长匹配优先，
+"灵族导弹发射器"这样的名称不会被其中较短的别名改写。
+"""
+
+import json
+import logging
+import os
+import re
+from collections import deque
+from typing import List, Dict, Any, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+# codex标题中的中英文名称，如"### 大先知 FARSEER"、"## 战火军阵 (WARHOST)"
+HEADER_PATTERN = re.compile(r'^#+\s*([一-鿿][一-鿿·・\s]*?)\s*[(（]?\s*([A-Z][A-Z\s\'\-]*[A-Z])\s*[)）]?\s*$')
+# 纯ASCII别名两侧不能紧接字母数字，避免"AP"匹配到"MAP"
+_ASCII_ALIAS = re.compile(r'^[a-z0-9\s\'\-]+$')
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+class AhoCorasick:
+    def __init__(self, patterns: Dict[str, Any]):
+        """
+        多模式匹配自动机
+
+        Args:
+            patterns: 模式串 -> 匹配时返回的值
+        """
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]  # 每个状态结束的模式：(长度, 值)
+        for pattern, value in patterns.items():
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append((len(pattern), value))
+
+        # 按层次遍历构造失败指针，并把后缀状态的输出合并进来
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, Any]]:
+        """
+        找出文本中所有（可能重叠的）匹配
+
+        Returns:
+            List[Tuple[int, int, Any]]: (起始位置, 结束位置, 值) 列表
+        """
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, value in self.output[state]:
+                matches.append((i + 1 - length, i + 1, value))
+        return matches
+
+    def find_longest(self, text: str) -> List[Tuple[int, int, Any]]:
+        """找出互不重叠的匹配，重叠时优先保留更靠前、更长的匹配"""
+        selected, end = [], 0
+        for match in sorted(self.find_all(text), key=lambda m: (m[0], m[0] - m[1])):
+            if match[0] >= end:
+                selected.append(match)
+                end = match[1]
+        return selected
+
+
+class AliasLexicon:
+    def __init__(self, entries: Dict[str, List[str]], protected: Iterable[str] = ()):
+        """
+        编译别名词表
+
+        Args:
+            entries: 规范术语 -> 别名列表
+            protected: 原样保留的名称（单位名、武器名），包含较短别名时按最长匹配保持不变
+        """
+        self.canonical = {}
+        for term, aliases in entries.items():
+            for alias in [term] + list(aliases):
+                key = alias.strip().lower()
+                if key:
+                    # 同一别名出现在多个术语下时保留先加载的
+                    self.canonical.setdefault(key, term)
+        for name in protected:
+            key = name.strip().lower()
+            if key:
+                self.canonical.setdefault(key, name.strip())
+        self.matcher = AhoCorasick({alias: alias for alias in self.canonical})
+        logger.info("别名词表已编译：%d 个术语，%d 个别名", len(entries), len(self.canonical))
+
+    @classmethod
+    def load(cls, *paths: str, protected: Iterable[str] = ()) -> "AliasLexicon":
+        """
+        从多个词表文件加载，不存在的文件会被跳过
+
+        词表文件可以是 {术语: [别名]}，也可以是 lexicon.json 的 {"sources": {源文件: {术语: [别名]}}}；
+        protected 见 __init__
+        """
+        entries = {}
+        for path in paths:
+            if not path or not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            groups = data["sources"].values() if "sources" in data else [data]
+            for group in groups:
+                for term, aliases in group.items():
+                    entries.setdefault(term, []).extend(aliases)
+        return cls(entries, protected)
+
+    def find(self, query: str) -> List[Dict[str, Any]]:
+        """
+        找出查询中的别名
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            List[Dict[str, Any]]: [{"start", "end", "alias", "canonical"}]，按出现位置排列
+        """
+        text = query.lower()
+        found = []
+        for start, end, alias in self.matcher.find_longest(text):
+            if _ASCII_ALIAS.match(alias):
+                before = text[start - 1] if start > 0 else ""
+                after = text[end] if end < len(text) else ""
+                if (before and _is_word_char(before)) or (after and _is_word_char(after)):
+                    continue
+            found.append({"start": start, "end": end, "alias": query[start:end], "canonical": self.canonical[alias]})
+        return found
+
+    def normalize(self, query: str) -> str:
+        """把别名替换为规范术语"""
+        return self._rewrite(query, lambda m: m["canonical"])
+
+    def expand(self, query: str) -> str:
+        """
+        规范化并保留原写法，如"OC是多少" -> "控制（OC）是多少"，规则原文中的两种写法都能命中
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            str: 扩展后的查询，没有别名时原样返回
+        """
+        return self._rewrite(query, lambda m: m["alias"] if m["alias"] == m["canonical"]
+                             else f"{m['canonical']}（{m['alias']}）")
+
+    def _rewrite(self, query: str, replace) -> str:
+        parts, last = [], 0
+        for match in self.find(query):
+            parts.append(query[last:match["start"]])
+            parts.append(replace(match))
+            last = match["end"]
+        parts.append(query[last:])
+        return "".join(parts)
+
+
+def extract_header_aliases(text: str) -> Dict[str, List[str]]:
+    """
+    从codex标题中提取中英文名称
+
+    Args:
+        text: markdown全文
+
+    Returns:
+        Dict[str, List[str]]: 中文名 -> [英文名]
+    """
+    entries = {}
+    for line in text.splitlines():
+        match = HEADER_PATTERN.match(line.strip())
+        if not match:
+            continue
+        name_zh = re.sub(r'\s+', '', match.group(1))
+        name_en = re.sub(r'\s+', ' ', match.group(2)).strip()
+        if len(name_zh) >= 2 and len(name_en) >= 2:
+            entries.setdefault(name_zh, [])
+            if name_en not in entries[name_zh]:
+                entries[name_zh].append(name_en)
+            # 带间隔号的名称同时收录原写法，如"埃尔德拉德 · 乌斯兰"
+            spaced = match.group(1).strip()
+            if spaced != name_zh and spaced not in entries[name_zh]:
+                entries[name_zh].append(spaced)
+    return entries
+
+
+def update_lexicon_file(path: str, source_file: str, entries: Dict[str, List[str]]) -> int:
+    """
+    写入生成的词表，同一源文件的旧词条会被替换
+
+    Args:
+        path: lexicon.json 路径
+        source_file: 源文件
+        entries: 术语 -> 别名列表
+
+    Returns:
+        int: 写入的术语数
+    """
+    data = {"sources": {}}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    data["sources"][os.path.basename(source_file)] = entries
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+__all__ = ['AhoCorasick', 'AliasLexicon', 'extract_header_aliases', 'update_lexicon_file']
@@ -3,72 +3,103 @@ import logging
 import os
 import argparse
 from query_expander import QueryExpander
-from vector_search import VectorSearch
+from query_router import QueryRouter, ROUTE_LOOKUP, ROUTE_VECTOR, ROUTE_EXPAND, ROUTE_DECOMPOSE
+from conversation import ConversationSession
+from logging_setup import setup_logging
+from usage_tracker import tracker as usage_tracker, track_request
+from hedging import hedger
+from request_profiler import profile_request, should_profile
+from query_cache import query_cache
 from config import (
     OPENAI_API_KEY,
-    PINECONE_API_KEY,
-    PINECONE_INDEX_NAME,
     DEFAULT_TEMPERATURE,
-    LOG_FORMAT,
-    LOG_FILE,
-    LOG_LEVEL,
     APP_TITLE,
     APP_ICON,
-    APP_HEADER
+    APP_HEADER,
+    SPECULATIVE_RETRIEVAL,
+    LEXICON_REPLACES_EXPANSION
 )
 
-# 配置日志
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=getattr(logging, LOG_LEVEL),
-    format=LOG_FORMAT
-)
 logger = logging.getLogger(__name__)
 
-# 初始化OpenAI客户端
-os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-
-# 解析命令行参数
-parser = argparse.ArgumentParser()
-parser.add_argument('--mode', type=str, default='expand',
-                    help='查询处理模式：expand（扩展）、enhance（增强）、decompose（分解）、vector（向量搜索）、normal（基础向量检索）')
-parser.add_argument('--top_k', type=int, default=5,
-                    help='返回结果数量（仅vector/normal模式有效）')
-args = parser.parse_args()
-
-# 获取模式（优先使用命令行参数，其次使用环境变量，最后使用默认值）
-MODE = args.mode or os.getenv('MODE', 'expand')
-TOP_K = args.top_k or int(os.getenv('TOP_K', 5))
-
-# 设置页面配置
-st.set_page_config(
-    page_title=APP_TITLE,
-    page_icon=APP_ICON,
-    layout="wide"
-)
 
-# 自定义CSS样式
-st.markdown("""
-    <style>
-    .stTextInput>div>div>input {
-        font-size: 18px;
-    }
-    .stButton>button {
-        width: 100%;
-        font-size: 18px;
-    }
-    </style>
-""", unsafe_allow_html=True)
+def parse_args() -> argparse.Namespace:
+    """解析命令行参数，忽略Streamlit传入的其他参数"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', type=str, default=None,
+                        help='查询处理模式：auto（本地路由自动选择）、expand（扩展）、enhance（增强）、decompose（分解）、vector（向量搜索）、normal（基础向量检索）')
+    parser.add_argument('--top_k', type=int, default=None,
+                        help='返回结果数量（仅vector/normal模式有效）')
+    parser.add_argument('--profile', action='store_true',
+                        help='采样分析每个请求，折叠栈文件写入 PROFILE_DIR')
+    args, _ = parser.parse_known_args()
+    # 优先使用命令行参数，其次使用环境变量，最后使用默认值
+    args.mode = args.mode or os.getenv('MODE', 'auto')
+    args.top_k = args.top_k or int(os.getenv('TOP_K', 5))
+    return args
+
+
+@st.cache_resource
+def get_pipeline():
+    """
+    创建查询处理流程，每个进程只创建一次
+
+    Streamlit每次交互都会重新执行脚本，缓存后不再重复初始化；
+    OpenAI和Pinecone客户端在第一次用到时才创建。
+    """
+    # LangChain从环境变量读取OpenAI密钥
+    os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+    return QueryExpander(temperature=DEFAULT_TEMPERATURE)
+
+
+def setup_page():
+    """页面配置和自定义CSS样式，必须在其他Streamlit调用之前执行"""
+    st.set_page_config(
+        page_title=APP_TITLE,
+        page_icon=APP_ICON,
+        layout="wide"
+    )
+    st.markdown("""
+        <style>
+        .stTextInput>div>div>input {
+            font-size: 18px;
+        }
+        .stButton>button {
+            width: 100%;
+            font-size: 18px;
+        }
+        </style>
+    """, unsafe_allow_html=True)
+
 
 def main():
     """主函数"""
+    setup_logging()
+    setup_page()
+    args = parse_args()
     st.title(APP_ICON+APP_TITLE)
     st.header(APP_HEADER)
     
     # 显示当前模式
-    mode_display = "查询扩展" if MODE == "expand" else "基础向量检索"
+    mode_display = {"auto": "自动路由", "expand": "查询扩展", "decompose": "查询分解"}.get(args.mode, "基础向量检索")
     st.sidebar.info(f"当前运行模式：{mode_display}")
-    processor = QueryExpander(temperature=DEFAULT_TEMPERATURE)
+    processor = get_pipeline()
+    # 数据卡查询表随索引版本切换，每次执行脚本时按当前版本创建路由器（只保存引用，开销很小）
+    router = QueryRouter(processor.vector_search.datasheet_lookup)
+    # 对话会话保存在session_state中，同一浏览器会话的追问复用之前的检索结果
+    if "conversation" not in st.session_state:
+        st.session_state.conversation = ConversationSession(processor.vector_search)
+    conversation = st.session_state.conversation
+    if st.sidebar.button("开始新对话"):
+        conversation.reset()
+    for turn in conversation.turns:
+        st.sidebar.caption(f"问：{turn['query']}")
+    with st.sidebar.expander("用量统计"):
+        st.json(usage_tracker.summary())
+    with st.sidebar.expander("延迟与对冲"):
+        st.json(hedger.metrics())
+    with st.sidebar.expander("缓存命中"):
+        st.json(query_cache.stats())
 
     # 创建输入框
     user_query = st.text_input("请输入您的规则查询：", placeholder="例如：载具在近战范围内可以使用警戒射击技能吗？")
@@ -77,14 +108,75 @@ def main():
     if st.button("提交问题"):
         if user_query:
             with st.spinner("机魂正在思索..."):
-                try:                        
-                    # 扩展查询
-                    expanded_query = processor.expand_query(user_query)
-                    # 对扩展查询进行搜索
+                try:
+                    # 按启动参数、URL参数 ?profile=1、请求头或抽样比例决定是否分析本次请求
+                    headers = getattr(getattr(st, "context", None), "headers", None)
+                    enabled = should_profile(args.profile or st.query_params.get("profile") in ("1", "true"), headers)
+                    with profile_request(enabled) as profile:
+                        # 问题单独记一条日志，cache_warmer.py 从中统计高频问题
+                        logger.info("收到查询：%s", user_query, extra={"query": user_query})
+                        # 选择处理流程：auto模式由本地路由决定，其余模式按指定流程处理
+                        if args.mode == "auto":
+                            route = router.route(user_query)["route"]
+                            if route == ROUTE_EXPAND and LEXICON_REPLACES_EXPANSION:
+                                # 词表扩展在检索时完成，不再调用LLM扩展
+                                route = ROUTE_VECTOR
+                        elif args.mode in ("vector", "normal"):
+                            route = ROUTE_VECTOR
+                        else:
+                            route = args.mode
+                        # 追问直接增量检索，不再重新扩展或拆解
+                        follow_up = conversation.is_follow_up(user_query)
+                        route = router.apply_budget(route, usage_tracker)
+                        with track_request("follow_up" if follow_up else route) as usage:
+                            recorded = False
+                            datasheet_text = ""
+                            # 追问依赖对话历史，不使用答案缓存；答案按索引版本和处理流程缓存
+                            version = processor.vector_search.index_version
+                            cached_answer = None if follow_up else query_cache.get_answer(version, user_query, route)
+                            if route == ROUTE_LOOKUP and not follow_up:
+                                # 数据卡精确查询，不调用LLM
+                                datasheet_text = processor.vector_search.lookup_datasheets(user_query)
+                            if datasheet_text:
+                                results = [{'text': datasheet_text, 'score': 1.0}]
+                            elif cached_answer:
+                                results = [{'text': cached_answer, 'score': 1.0}]
+                            elif follow_up:
+                                # 会话内增量检索，本轮会自动记入对话历史
+                                results = conversation.ask(user_query, top_k=args.top_k)
+                                recorded = True
+                            elif route in (ROUTE_LOOKUP, ROUTE_VECTOR):
+                                # 新问题走完整的检索流程（按块类型过滤和rerank），命中的段落和向量留给之后的追问复用
+                                results = processor.vector_search.search(user_query, top_k=args.top_k,
+                                                                         include_matches=True)
+                            elif route == ROUTE_DECOMPOSE:
+                                # 只有拆解流程需要LangChain，用到时才导入
+                                from query_processor import QueryProcessor
+                                answer = QueryProcessor(temperature=DEFAULT_TEMPERATURE,
+                                                        vector_search=processor.vector_search).process_query(user_query)
+                                results = [{'text': answer, 'score': 1.0}]
+                            elif SPECULATIVE_RETRIEVAL:
+                                # 查询扩展与原始查询的检索并行，扩展过慢时直接使用原始查询的结果
+                                results = processor.speculative_search(user_query)
+                            else:
+                                # 扩展查询
+                                expanded_query = processor.expand_query(user_query)
+                                # 对扩展查询进行搜索
+                                results = processor.vector_search.search(expanded_query)
+                            if results and not recorded:
+                                matches = results[0].get('matches', [])
+                                conversation.add_candidates(matches)
+                                conversation.record_turn(user_query, results[0]['text'], [m['id'] for m in matches])
+                            if results and not (follow_up or datasheet_text or cached_answer):
+                                query_cache.put_answer(version, user_query, results[0]['text'], route)
                     st.write("\n搜索结果：")
-                    results = processor.vector_search.search(expanded_query)
                     for i, result in enumerate(results, 1):
-                        st.write(f"{i}. {result['text']}")                            
+                        st.write(f"{i}. {result['text']}")
+                    st.caption(f"本次查询：{usage.totals['calls']} 次模型调用，"
+                               f"{usage.totals['prompt_tokens'] + usage.totals['completion_tokens']} token，"
+                               f"约 ${usage.cost:.4f}")
+                    if profile is not None:
+                        st.caption(f"请求分析：trace_id {profile.trace_id}，结果写入 {profile.output_dir}/")
                 except Exception as e:
                     st.error(f"处理查询时出错：{str(e)}")
         else:
@@ -94,6 +186,11 @@ def main():
     # 添加模式说明
     st.markdown("### 模式说明")
     st.markdown("""
+        **自动路由模式**：
+        - 本地判断查询类型，不额外调用LLM
+        - 单位/武器名查询直接返回数据卡
+        - 简单规则名直接检索，复杂判定题拆解处理
+
         **查询扩展模式**：
         - 生成多个相关问题
         - 扩大检索范围
@@ -0,0 +1,304 @@
+"""
+缓存预热：部署或重新入库后，把高频问题的嵌入和答案提前写入 query_cache
+
+问题来源：
+    app.log 及其轮转文件    同时支持旧的文本格式和现在的JSON行格式，用户问题来自JSON记录的 query 字段，
+                            没有该字段的日志中来自"开始扩展查询：…"、"原始查询：…"、"Query: …"，
+                            查询变体来自"处理第 N 个查询变体：…"、"扩展后的最优查询：…"
+    --history 文件          每行一个问题，或JSON数组（字符串或 {"query": ...}）
+
+按出现次数取前 --top 个问题，按应用的路由规则生成答案写入答案缓存（检索过程中嵌入也会写入）；
+查询变体只预热嵌入。预热以 --concurrency 个线程并行，累计费用达到 --max-cost 后不再开始新的问题。
+
+用法：
+    python cache_warmer.py                         # 从 app.log 预热当前版本
+    python cache_warmer.py --version v2 --dry-run  # 查看将要预热的问题
+    python cache_warmer.py --version v2            # 切换到 v2 之前先为它预热
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Iterable
+from config import (
+    LOG_FILE,
+    LOG_BACKUP_COUNT,
+    PINECONE_INDEX_NAME,
+    DEFAULT_TEMPERATURE,
+    SPECULATIVE_RETRIEVAL,
+    LEXICON_REPLACES_EXPANSION,
+    WARMUP_TOP,
+    WARMUP_CONCURRENCY,
+    WARMUP_MAX_COST_USD
+)
+from query_cache import query_cache
+from logging_setup import setup_logging
+from query_router import QueryRouter, ROUTE_LOOKUP, ROUTE_VECTOR, ROUTE_EXPAND, ROUTE_DECOMPOSE
+from usage_tracker import track_request
+
+logger = logging.getLogger(__name__)
+
+# 日志中记录用户原始问题的消息
+QUERY_PATTERNS = [
+    re.compile(r'收到查询[:：]\s*(.+)$'),
+    re.compile(r'开始扩展查询[:：]\s*(.+)$'),
+    re.compile(r'原始查询[:：]\s*(.+)$'),
+    re.compile(r'\bQuery:\s*(.+)$'),
+]
+# 日志中记录查询变体的消息
+VARIANT_PATTERNS = [
+    re.compile(r'处理第\s*\d+\s*个查询变体[:：]\s*(.+)$'),
+    re.compile(r'扩展后的最优查询[:：]\s*(.+)$'),
+]
+# 变体前的编号，如"1. "、"2、"
+_NUMBERING = re.compile(r'^\s*\d+\s*[.、)）]\s*')
+MIN_QUERY_LENGTH = 2
+MAX_QUERY_LENGTH = 200
+
+
+def _clean(text: str) -> str:
+    return _NUMBERING.sub('', text).strip().strip('"“”')
+
+
+def _match(message: str, patterns) -> str:
+    for pattern in patterns:
+        match = pattern.search(message)
+        if match:
+            text = _clean(match.group(1))
+            if MIN_QUERY_LENGTH <= len(text) <= MAX_QUERY_LENGTH:
+                return text
+    return ""
+
+
+def default_log_files(log_file: str = LOG_FILE, backups: int = LOG_BACKUP_COUNT) -> List[str]:
+    """当前日志及其轮转文件中存在的部分"""
+    paths = [log_file] + [f"{log_file}.{i}" for i in range(1, backups + 1)]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def mine_logs(paths: Iterable[str]) -> Tuple[Counter, Counter]:
+    """
+    从日志中统计用户问题和查询变体的出现次数
+
+    JSON日志中每个请求都有一条带 query 字段的"收到查询"记录，扩展流程还会记录"开始扩展查询：…"，
+    文件中有带 query 字段的记录时只统计这些记录，否则同一个问题会被计两次；
+    文本日志和更早的JSON日志没有 query 字段，按消息内容统计。
+    旧日志中同一条消息会被多个处理器重复写入，完全相同的行只计一次。
+
+    Args:
+        paths: 日志文件列表
+
+    Returns:
+        Tuple[Counter, Counter]: (问题 -> 次数, 查询变体 -> 次数)
+    """
+    queries, variants = Counter(), Counter()
+    for path in paths:
+        seen = set()
+        # 本文件JSON记录中的问题：query 字段 / 按消息内容匹配
+        json_queries, json_matched = Counter(), Counter()
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if not line or line in seen:
+                    continue
+                seen.add(line)
+                message, counter = line, queries
+                if line.startswith('{'):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("query"):
+                        json_queries[_clean(str(record["query"]))] += 1
+                        continue
+                    message, counter = str(record.get("message", "")), json_matched
+                query = _match(message, QUERY_PATTERNS)
+                if query:
+                    counter[query] += 1
+                    continue
+                variant = _match(message, VARIANT_PATTERNS)
+                if variant:
+                    variants[variant] += 1
+        queries.update(json_queries or json_matched)
+    return queries, variants
+
+
+def load_history(path: str) -> Counter:
+    """
+    读取显式的问题列表
+
+    Args:
+        path: 每行一个问题的文本文件，或JSON数组（字符串或 {"query": ...}）
+
+    Returns:
+        Counter: 问题 -> 次数
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if path.endswith('.json'):
+        items = [item["query"] if isinstance(item, dict) else item for item in json.loads(content)]
+    else:
+        items = content.splitlines()
+    return Counter(_clean(item) for item in items if _clean(item))
+
+
+class CacheWarmer:
+    def __init__(self, version: str = None, index_name: str = PINECONE_INDEX_NAME,
+                 concurrency: int = WARMUP_CONCURRENCY, max_cost: float = WARMUP_MAX_COST_USD, force: bool = False,
+                 top_k: int = 5):
+        """
+        初始化预热任务
+
+        Args:
+            version: 为该索引版本预热，默认为别名指向的当前版本
+            index_name: 版本所在的索引
+            concurrency: 并行预热的问题数
+            max_cost: 费用上限（美元），0为不限制
+            force: 已缓存的问题也重新生成答案
+            top_k: 检索结果数量，与应用的 TOP_K 保持一致
+        """
+        # 处理流程依赖langchain和各个客户端，--dry-run时不导入
+        from query_expander import QueryExpander
+        self.expander = QueryExpander(temperature=DEFAULT_TEMPERATURE)
+        self.vector_search = self.expander.vector_search
+        if version:
+            self.vector_search.pin(index_name, version)
+        self.version = self.vector_search.index_version
+        self.router = QueryRouter(self.vector_search.datasheet_lookup)
+        self.concurrency = concurrency
+        self.max_cost = max_cost
+        self.force = force
+        self.top_k = top_k
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.spent = 0.0
+        self.counts = Counter()
+
+    def _processor(self):
+        # 拆解流程每个线程一个处理器，共用已固定版本的VectorSearch
+        processor = getattr(self._local, "processor", None)
+        if processor is None:
+            from query_processor import QueryProcessor
+            processor = QueryProcessor(temperature=DEFAULT_TEMPERATURE, vector_search=self.vector_search)
+            self._local.processor = processor
+        processor.clear_cache()
+        return processor
+
+    def _over_budget(self) -> bool:
+        with self._lock:
+            return self.max_cost > 0 and self.spent >= self.max_cost
+
+    def _charge(self, name: str, cost: float = 0.0):
+        with self._lock:
+            self.spent += cost
+            self.counts[name] += 1
+
+    def route(self, query: str) -> str:
+        """与应用auto模式相同的处理流程，答案按流程缓存"""
+        route = self.router.route(query)["route"]
+        if route == ROUTE_EXPAND and LEXICON_REPLACES_EXPANSION:
+            route = ROUTE_VECTOR
+        return route
+
+    def answer(self, query: str, route: str) -> str:
+        """按应用中新问题的处理流程生成答案，数据卡能直接回答的问题返回空字符串"""
+        if route == ROUTE_LOOKUP and self.vector_search.lookup_datasheets(query):
+            return ""
+        if route in (ROUTE_LOOKUP, ROUTE_VECTOR):
+            results = self.vector_search.search(query, top_k=self.top_k)
+        elif route == ROUTE_DECOMPOSE:
+            results = [{'text': self._processor().process_query(query)}]
+        elif SPECULATIVE_RETRIEVAL:
+            results = self.expander.speculative_search(query)
+        else:
+            results = self.vector_search.search(self.expander.expand_query(query))
+        return results[0]['text'] if results else ""
+
+    def warm_query(self, query: str):
+        """预热一个问题的答案（及其嵌入）"""
+        route = self.route(query)
+        if not self.force and query_cache.get_answer(self.version, query, route) is not None:
+            self._charge("cached")
+            return
+        if self._over_budget():
+            self._charge("over_budget")
+            return
+        with track_request("warmup") as usage:
+            answer = self.answer(query, route)
+        if answer:
+            query_cache.put_answer(self.version, query, answer, route)
+        self._charge("answers" if answer else "skipped", usage.cost)
+
+    def warm_variant(self, variant: str):
+        """只预热查询变体的嵌入"""
+        if self._over_budget():
+            self._charge("over_budget")
+            return
+        with track_request("warmup") as usage:
+            self.vector_search.embed_query(variant)
+        self._charge("embeddings", usage.cost)
+
+    def run(self, queries: List[str], variants: List[str]) -> Dict[str, Any]:
+        """
+        并行预热，先问题后查询变体
+
+        Returns:
+            Dict[str, Any]: 各类计数、费用和耗时
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup") as executor:
+            futures = [executor.submit(self.warm_query, q) for q in queries]
+            futures += [executor.submit(self.warm_variant, v) for v in variants]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("预热出错：%s", e)
+                    self._charge("errors")
+        return {"version": self.version, **self.counts, "cost": self.spent, "seconds": time.monotonic() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='从历史查询预热嵌入与答案缓存')
+    parser.add_argument('--log', type=str, nargs='*', default=None, help='日志文件，默认为 app.log 及其轮转文件')
+    parser.add_argument('--history', type=str, default=None, help='显式的问题列表，与日志中的问题合并计数')
+    parser.add_argument('--top', type=int, default=WARMUP_TOP, help='预热答案的问题数')
+    parser.add_argument('--variants', type=int, default=WARMUP_TOP, help='预热嵌入的查询变体数')
+    parser.add_argument('--concurrency', type=int, default=WARMUP_CONCURRENCY, help='并行数')
+    parser.add_argument('--max-cost', type=float, default=WARMUP_MAX_COST_USD, help='费用上限（美元），0为不限制')
+    parser.add_argument('--version', type=str, default=None, help='为该索引版本预热，默认为当前版本')
+    parser.add_argument('--index', type=str, default=PINECONE_INDEX_NAME, help='版本所在的索引')
+    parser.add_argument('--force', action='store_true', help='已缓存的问题也重新生成答案')
+    parser.add_argument('--dry-run', action='store_true', help='只列出将要预热的问题')
+    parser.add_argument('--top-k', type=int, default=int(os.getenv('TOP_K', 5)), help='检索结果数量，与应用保持一致')
+    args = parser.parse_args()
+    # 预热流程的日志只输出到控制台，不写入应用的日志文件
+    setup_logging(log_file='', level='WARNING')
+
+    queries, variants = mine_logs(default_log_files() if args.log is None else args.log)
+    if args.history:
+        queries.update(load_history(args.history))
+    top_queries = [q for q, _ in queries.most_common(args.top)]
+    top_variants = [v for v, _ in variants.most_common(args.variants) if v not in queries]
+    print(f"日志中共 {len(queries)} 个不同的问题、{len(variants)} 个查询变体")
+    for query in top_queries:
+        print(f"{queries[query]:>5}  {query}")
+    if args.dry_run:
+        return
+
+    warmer = CacheWarmer(args.version, args.index, args.concurrency, args.max_cost, args.force, args.top_k)
+    result = warmer.run(top_queries, top_variants)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+__all__ = ['CacheWarmer', 'mine_logs', 'load_history', 'default_log_files']
+
+
+if __name__ == "__main__":
+    main()
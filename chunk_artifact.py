@@ -0,0 +1,177 @@
+"""
+切片+嵌入的二进制产物格式
+
+一个产物是一个目录：
+    manifest.json   格式版本、块数、向量维度、嵌入模型等元信息
+    embeddings.f32  float32 连续数组，形状 (count, dim)
+    chunks.jsonl    每行一个块：{"id", "text", "metadata"}
+    chunks.idx      uint64 偏移数组，长度 count+1，第 i 块位于 [idx[i], idx[i+1])
+    sections.jsonl  可选，不参与嵌入的父级section：{"id", "text", "metadata"}
+
+读取时嵌入和偏移通过 numpy.memmap 零拷贝映射，文本按需从 mmap 中解码，
+多个进程打开同一产物时共享操作系统的页缓存。
+"""
+
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Tuple
+import numpy as np
+
+ARTIFACT_FORMAT = "wh40k-chunks"
+ARTIFACT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "chunks.idx"
+SECTIONS_FILE = "sections.jsonl"
+
+
+def write_artifact(path: str, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                   embeddings, model: str = "", sections: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    写入切片产物，先写到临时目录再整体替换，读者不会看到写了一半的产物
+
+    Args:
+        path: 产物目录
+        ids: 块ID列表
+        texts: 块文本列表
+        metadatas: 块metadata列表（不含文本）
+        embeddings: 嵌入向量，形状 (count, dim)
+        model: 嵌入模型名称
+        sections: 父级section列表，检索命中块后按metadata中的parent_id扩展
+
+    Returns:
+        Dict[str, Any]: manifest内容
+    """
+    vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+    if not (len(ids) == len(texts) == len(metadatas) == len(vectors)):
+        raise ValueError("ids、texts、metadatas和embeddings的数量必须一致")
+    if vectors.ndim != 2:
+        raise ValueError("embeddings必须是二维数组")
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".artifact-", dir=parent)
+    try:
+        vectors.tofile(os.path.join(tmp_dir, EMBEDDINGS_FILE))
+
+        offsets = np.zeros(len(ids) + 1, dtype=np.uint64)
+        with open(os.path.join(tmp_dir, CHUNKS_FILE), 'wb') as f:
+            for i, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                line = json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False)
+                f.write(line.encode('utf-8') + b'\n')
+                offsets[i + 1] = f.tell()
+        offsets.tofile(os.path.join(tmp_dir, OFFSETS_FILE))
+        if sections:
+            with open(os.path.join(tmp_dir, SECTIONS_FILE), 'w', encoding='utf-8') as f:
+                for section in sections:
+                    f.write(json.dumps(section, ensure_ascii=False) + '\n')
+
+        manifest = {
+            "format": ARTIFACT_FORMAT,
+            "version": ARTIFACT_VERSION,
+            "count": len(ids),
+            "dim": int(vectors.shape[1]),
+            "dtype": "float32",
+            "model": model,
+            "sections": len(sections or []),
+            "created": datetime.now().isoformat(),
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        if os.path.exists(path):
+            backup = f"{path}.old"
+            shutil.rmtree(backup, ignore_errors=True)
+            os.replace(path, backup)
+            os.replace(tmp_dir, path)
+            shutil.rmtree(backup, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, path)
+        return manifest
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+class ChunkArtifact:
+    def __init__(self, path: str):
+        """
+        以只读内存映射方式打开切片产物
+
+        Args:
+            path: 产物目录
+        """
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"不是切片产物：{path}")
+        if self.manifest.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"不支持的产物版本：{self.manifest.get('version')}")
+
+        count, dim = self.manifest["count"], self.manifest["dim"]
+        if count:
+            self.embeddings = np.memmap(os.path.join(path, EMBEDDINGS_FILE), dtype=np.float32, mode='r', shape=(count, dim))
+        else:
+            self.embeddings = np.zeros((0, dim), dtype=np.float32)
+        self.offsets = np.memmap(os.path.join(path, OFFSETS_FILE), dtype=np.uint64, mode='r', shape=(count + 1,))
+        self._file = open(os.path.join(path, CHUNKS_FILE), 'rb')
+        self._chunks = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if count else b''
+        self._ids = None
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    @property
+    def dim(self) -> int:
+        return self.manifest["dim"]
+
+    def get(self, i: int) -> Dict[str, Any]:
+        """读取第 i 个块：{"id", "text", "metadata"}"""
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(self._chunks[start:end])
+
+    @property
+    def ids(self) -> List[str]:
+        """所有块ID，首次访问时解析并缓存"""
+        if self._ids is None:
+            self._ids = [self.get(i)["id"] for i in range(len(self))]
+        return self._ids
+
+    def iter_batches(self, batch_size: int = 100) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        """
+        按批次遍历产物，供各种索引后端批量导入
+
+        Yields:
+            Tuple[List[str], np.ndarray, List[Dict[str, Any]]]: 块ID、向量、带文本的metadata
+        """
+        for start in range(0, len(self), batch_size):
+            end = min(start + batch_size, len(self))
+            records = [self.get(i) for i in range(start, end)]
+            ids = [r["id"] for r in records]
+            metadatas = [{**r["metadata"], "text": r["text"]} for r in records]
+            yield ids, self.embeddings[start:end], metadatas
+
+    def iter_sections(self) -> Iterator[Dict[str, Any]]:
+        """遍历父级section：{"id", "text", "metadata"}"""
+        sections_path = os.path.join(self.path, SECTIONS_FILE)
+        if not os.path.exists(sections_path):
+            return
+        with open(sections_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def close(self):
+        if isinstance(self._chunks, mmap.mmap):
+            self._chunks.close()
+        self._file.close()
+
+
+__all__ = ['ChunkArtifact', 'write_artifact', 'ARTIFACT_VERSION']
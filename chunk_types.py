@@ -0,0 +1,120 @@
+"""
+块类型：入库时按标题路径和内容模式给每个块打上 chunk_type，检索时可以只在相关类型中查找
+
+    faq             FAQ、勘误与更新
+    stratagem       计谋 / 战略技能（时机、目标、效果）
+    enhancement     强化升级
+    weapon_profile  武器属性行
+    leader_ability  领袖能力、可加入的单位
+    unit_profile    单位数据卡（属性、关键词、单位构成、技能）
+    army_rule       军队规则与分队规则
+    core_rule       核心规则
+    other           以上都不匹配
+
+分类只用正则，不调用模型；规则按上面的顺序匹配，第一个命中的类型即为结果。
+"""
+
+import re
+from typing import List, Optional, Dict, Any
+
+FAQ = "faq"
+STRATAGEM = "stratagem"
+ENHANCEMENT = "enhancement"
+WEAPON_PROFILE = "weapon_profile"
+LEADER_ABILITY = "leader_ability"
+UNIT_PROFILE = "unit_profile"
+ARMY_RULE = "army_rule"
+CORE_RULE = "core_rule"
+OTHER = "other"
+
+CHUNK_TYPES = [FAQ, STRATAGEM, ENHANCEMENT, WEAPON_PROFILE, LEADER_ABILITY, UNIT_PROFILE, ARMY_RULE, CORE_RULE, OTHER]
+
+# (类型, 标题路径的模式, 正文的模式)，任意一个模式命中即可；
+# 核心规则中讲解武器、领袖和数据表的章节仍属于核心规则，这几类只按正文中的数据卡格式判断
+_RULES = [
+    (FAQ, re.compile(r'FAQ|勘误|更新|修改为|常见问题', re.I),
+     re.compile(r'^\s*(修改为|添加以下内容|问[:：])', re.M)),
+    (STRATAGEM, re.compile(r'计谋|战略技能|Stratagem', re.I),
+     re.compile(r'时机[:：].*\n(.*\n)*?.*效果[:：]|\d\s*CP\s*[,，(（]')),
+    (ENHANCEMENT, re.compile(r'强化升级|Enhancement', re.I), re.compile(r'[:：]\s*\d+\s*分\s*[,，]')),
+    (WEAPON_PROFILE, None,
+     re.compile(r'\*\*武器名:\*\*|\*\*攻击范围:\*\*.*\*\*(BS|WS):\*\*|范围\s*\S+\s*[,，]\s*A\s*\S+\s*[,，]\s*(BS|WS)')),
+    (LEADER_ABILITY, None, re.compile(r'领袖能力|作为领袖加入|可以加入以下单位')),
+    (UNIT_PROFILE, re.compile(r'单位数据'),
+     re.compile(r'\*\*(单位构成|关键词|属性|模型底盘大小):\*\*|\*\*[MT]:\*\*')),
+    (ARMY_RULE, re.compile(r'军队规则|分队规则|分队基础能力|军阵|Detachment', re.I), None),
+]
+# 源文件名中的标识，没有规则命中时决定默认类型
+_FAQ_SOURCE = re.compile(r'faq', re.I)
+_CORE_SOURCE = re.compile(r'core', re.I)
+
+
+def classify_chunk(text: str, source_file: str = "", title_path: Optional[str] = None) -> str:
+    """
+    判断一个块的类型
+
+    Args:
+        text: 块文本，切分时第一行为标题路径
+        source_file: 源文件路径
+        title_path: 标题路径，为None时取文本第一行
+
+    Returns:
+        str: CHUNK_TYPES 中的一个
+    """
+    if title_path is None:
+        title_path, _, body = text.partition("\n")
+    else:
+        body = text
+    # FAQ文档中的每一条都是对规则的修正，即使内容是计谋或武器
+    if _FAQ_SOURCE.search(source_file):
+        return FAQ
+    for chunk_type, title_pattern, body_pattern in _RULES:
+        if (title_pattern is not None and title_pattern.search(title_path)) or \
+                (body_pattern is not None and body_pattern.search(body)):
+            return chunk_type
+    return CORE_RULE if _CORE_SOURCE.search(source_file) else OTHER
+
+
+# 查询中的关键词 -> 需要检索的类型；FAQ可能修正任何规则，核心规则解释武器技能、关键词等术语，
+# 两者总是一起检索。军队规则（如"疾行如风"让移动属性增加）也会修改单位和武器的属性，
+# 与数据卡类型一起检索
+_QUERY_RULES = [
+    (re.compile(r'计谋|战略技能|[Ss]tratagem|(?<![A-Za-z])CP(?![A-Za-z])'), [STRATAGEM]),
+    (re.compile(r'强化|升级|enhancement', re.I), [ENHANCEMENT]),
+    (re.compile(r'武器|射程|攻击次数|(?<![A-Za-z])(BS|WS|AP)(?![A-Za-z])'), [WEAPON_PROFILE, UNIT_PROFILE, ARMY_RULE]),
+    (re.compile(r'领袖|加入.*单位|带队', re.I), [LEADER_ABILITY, UNIT_PROFILE, ARMY_RULE]),
+    (re.compile(r'属性|数据卡|单位构成|关键词|耐伤|豁免值', re.I),
+     [UNIT_PROFILE, WEAPON_PROFILE, LEADER_ABILITY, ARMY_RULE]),
+    (re.compile(r'分队|军阵|军队规则', re.I), [ARMY_RULE, ENHANCEMENT, STRATAGEM]),
+]
+
+
+def infer_chunk_types(query: str) -> Optional[List[str]]:
+    """
+    根据查询中的关键词推断需要检索的块类型
+
+    Args:
+        query: 查询文本
+
+    Returns:
+        Optional[List[str]]: 类型列表（总是包含faq和core_rule），没有明确线索时返回None，表示不限制类型
+    """
+    types = []
+    for pattern, matched in _QUERY_RULES:
+        if pattern.search(query):
+            types.extend(t for t in matched if t not in types)
+    if not types:
+        return None
+    return types + [t for t in (CORE_RULE, FAQ) if t not in types]
+
+
+def type_filter(chunk_types: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    """Pinecone的metadata过滤条件，不限制类型时返回None"""
+    if not chunk_types:
+        return None
+    return {"chunk_type": {"$in": list(chunk_types)}}
+
+
+__all__ = ['CHUNK_TYPES', 'classify_chunk', 'infer_chunk_types', 'type_filter',
+           'FAQ', 'STRATAGEM', 'ENHANCEMENT', 'WEAPON_PROFILE', 'LEADER_ABILITY', 'UNIT_PROFILE',
+           'ARMY_RULE', 'CORE_RULE', 'OTHER']
@@ -2,22 +2,12 @@
 配置文件，用于管理项目范围内的公有字段和API密钥
 """
 
-import logging
 import os
 from dotenv import load_dotenv
 
 # 加载.env文件
 load_dotenv()
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,  # 设置日志级别为INFO
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # 设置日志格式
-    handlers=[logging.StreamHandler()]  # 配置StreamHandler
-)
-
-logger = logging.getLogger(__name__)
-
 # OpenAI API配置
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
@@ -38,10 +28,102 @@ LLM_MODEL = "gpt-4o-mini"
 # rerank 模型
 RERANK_MODEL = "bge-reranker-v2-m3"
 
-# 日志配置
-LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# 推测检索：查询扩展进行的同时先用原始查询检索，
+# 扩展在期限（秒）内未完成或失败时直接使用原始查询的检索结果
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+SPECULATIVE_DEADLINE = float(os.getenv("SPECULATIVE_DEADLINE", "4.0"))
+
+# 索引版本别名（由 index_alias.py 管理）：不存在时使用 PINECONE_INDEX_NAME 的默认命名空间
+INDEX_ALIAS_PATH = os.getenv("INDEX_ALIAS_PATH", "index_alias.json")
+INDEX_ALIAS_CHECK_INTERVAL = float(os.getenv("INDEX_ALIAS_CHECK_INTERVAL", "2.0"))  # 检查别名文件变化的间隔（秒）
+INDEX_ALIAS_HISTORY = 3  # 保留可回滚的旧版本数
+
+# 各阶段的截止时间（秒）：embed/retrieve为单次嵌入/索引查询，rerank超时后改用未重排的检索结果，
+# generate为单次LLM调用（每次重试单独计时）
+STAGE_DEADLINES = {
+    "embed": float(os.getenv("EMBED_DEADLINE", "3.0")),
+    "retrieve": float(os.getenv("RETRIEVE_DEADLINE", "3.0")),
+    "rerank": float(os.getenv("RERANK_DEADLINE", "4.0")),
+    "generate": float(os.getenv("GENERATE_DEADLINE", "30.0")),
+}
+# 对冲请求：嵌入和索引查询超过近期延迟的百分位后再发一个相同的请求，取先返回的结果
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = 0.2       # 对冲延迟下限（秒）
+HEDGE_DEFAULT_DELAY = 1.0   # 延迟样本不足时的对冲延迟（秒）
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MAX_WORKERS = 32
+
+# 数据卡查询表（由 DATAUPLOD/upsert.py 生成）
+DATASHEET_DB_PATH = os.getenv("DATASHEET_DB_PATH", "datasheets.db")
+
+# 本地文档库（由 DATAUPLOD/upsert.py 生成）：存在时检索只向Pinecone请求ID和分数，文本从本地读取
+DOC_STORE_PATH = os.getenv("DOC_STORE_PATH", "docstore.db")
+DOC_STORE_CACHE_SIZE = int(os.getenv("DOC_STORE_CACHE_SIZE", "1024"))
+# 命中的段落扩展为所属的完整规则section（需要以section策略入库）
+SECTION_EXPANSION = os.getenv("SECTION_EXPANSION", "true").lower() == "true"
+# 按查询中的关键词推断块类型（chunk_types.py），只在相关类型中检索；限定类型后没有结果时回退到不限类型
+CHUNK_TYPE_FILTER = os.getenv("CHUNK_TYPE_FILTER", "false").lower() == "true"
+
+# 检索后端：pinecone 或 local（直接在 artifacts/ 下的切片产物上计算相似度，不依赖Pinecone）
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "artifacts")
+# local后端的工作进程数：各进程内存映射同一组产物，0为在当前进程内打分
+SERVING_WORKERS = int(os.getenv("SERVING_WORKERS", "0"))
+
+# 嵌入与答案缓存（SQLite，应用和 cache_warmer.py 共享），路径为空时不启用
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "query_cache.db")
+QUERY_CACHE_MEMORY_SIZE = int(os.getenv("QUERY_CACHE_MEMORY_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", str(7 * 24 * 3600)))  # 答案有效期（秒），0为不过期
+# 缓存预热：从日志中取出现次数最多的问题，并发数和费用上限（美元）
+WARMUP_TOP = int(os.getenv("WARMUP_TOP", "50"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+WARMUP_MAX_COST_USD = float(os.getenv("WARMUP_MAX_COST_USD", "1.0"))
+
+# 别名词表：检索前把英文名、缩写和俗称规范为中文术语（lexicon.json 由 DATAUPLOD/upsert.py 生成）
+ALIAS_LEXICON_PATH = os.getenv("ALIAS_LEXICON_PATH", "aliases.json")
+LEXICON_PATH = os.getenv("LEXICON_PATH", "lexicon.json")
+# 为true时auto模式不再调用LLM查询扩展，只使用词表扩展后直接检索
+LEXICON_REPLACES_EXPANSION = os.getenv("LEXICON_REPLACES_EXPANSION", "false").lower() == "true"
+
+# MMR多样性选择（默认不启用）：先rerank出MMR_POOL_SIZE个候选并取回它们的向量，再选出兼顾相关性与差异的top_k
+# MMR_LAMBDA为相关性权重，1.0或MMR_POOL_SIZE不大于top_k时不启用；候选池越大，每次查询传输的向量越多
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "1.0"))
+MMR_POOL_SIZE = int(os.getenv("MMR_POOL_SIZE", "20"))
+
+# 多轮对话：追问复用之前轮次检索到的块，只补取缺少的块
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "5"))  # 提示中保留的历史轮数
+CONVERSATION_MAX_CANDIDATES = int(os.getenv("CONVERSATION_MAX_CANDIDATES", "50"))  # 缓存的候选块数
+CONVERSATION_HISTORY_CHARS = int(os.getenv("CONVERSATION_HISTORY_CHARS", "500"))  # 每轮历史回答保留的字符数
+
+# 模型价格（美元/百万token）：(输入, 输出)，按最长前缀匹配带日期后缀的模型名
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+    "text-embedding-ada-002": (0.10, 0.0),
+}
+# 费用预算（美元），0表示不限制；超出时降级到更便宜的处理流程
+BUDGET_PER_QUERY_USD = float(os.getenv("BUDGET_PER_QUERY_USD", "0"))
+BUDGET_PER_MINUTE_USD = float(os.getenv("BUDGET_PER_MINUTE_USD", "0"))
+
+# 按请求采样分析（由 request_profiler.py 执行）：启动参数 --profile、URL参数 ?profile=1、请求头 X-Profile 或按比例抽样开启
+# 每个被分析的请求在 PROFILE_DIR 下写入 <trace_id>.wall.folded 和 <trace_id>.cpu.folded（折叠栈格式，可直接生成火焰图）
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # 采样间隔（秒）
+PROFILE_HEADER = "X-Profile"
+
+# 日志配置（由 logging_setup.setup_logging 统一配置，控制台为文本格式，日志文件为JSON行）
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 LOG_FILE = 'app.log'
-LOG_LEVEL = 'INFO'
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = 5 * 1024 * 1024  # 单个日志文件上限，超过后轮转
+LOG_BACKUP_COUNT = 3
+LOG_MAX_MESSAGE_LENGTH = int(os.getenv("LOG_MAX_MESSAGE_LENGTH", "1000"))  # 单条日志最大字符数，超出部分截断
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # INFO及以下级别日志的采样比例
 
 # 应用配置
 APP_TITLE = "战锤40K规则助手"
@@ -0,0 +1,198 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+import numpy as np
+from vector_search import VectorSearch
+from mmr import mmr_select
+from config import (
+    CONVERSATION_MAX_TURNS,
+    CONVERSATION_MAX_CANDIDATES,
+    CONVERSATION_HISTORY_CHARS,
+    SECTION_EXPANSION,
+    MMR_LAMBDA
+)
+
+logger = logging.getLogger(__name__)
+
+# 依赖上一轮内容的追问标志词：句首的承接词和指代词；不含标志词的问题（即使很短）都是新问题
+FOLLOW_UP_MARKERS = re.compile(r'^(那|那么|还有|另外|同样|而且|并且)|它|他们|它们|这个|那个|这种|这样|该单位|上面|刚才|之前|同上')
+
+
+class ConversationSession:
+    def __init__(self, vector_search: VectorSearch, max_turns: int = CONVERSATION_MAX_TURNS,
+                 max_candidates: int = CONVERSATION_MAX_CANDIDATES,
+                 history_chars: int = CONVERSATION_HISTORY_CHARS):
+        """
+        多轮对话会话，缓存之前轮次的检索结果和向量
+
+        追问时跳过查询扩展和rerank，只向索引请求ID、分数和向量，
+        已缓存的块不再读取文本，所有候选块用本地向量重新打分。
+
+        Args:
+            vector_search: 向量搜索实例
+            max_turns: 提示中保留的历史轮数
+            max_candidates: 缓存的候选块数，超出时淘汰最久未命中的块
+            history_chars: 每轮历史回答保留的字符数
+        """
+        self.vector_search = vector_search
+        self.max_turns = max_turns
+        self.max_candidates = max_candidates
+        self.history_chars = history_chars
+        self.turns = []  # [{"query", "answer", "chunk_ids"}]
+        self.candidates = OrderedDict()  # 块ID -> {"id", "text", "metadata", "values"}
+        self.reused = 0
+        self.fetched = 0
+
+    def is_follow_up(self, query: str) -> bool:
+        """判断问题是否是对上一轮的追问：含有追问标志词，且没有提到上一轮之外的单位或武器"""
+        if not self.turns:
+            return False
+        text = query.strip()
+        if not FOLLOW_UP_MARKERS.search(text):
+            return False
+        new_entities = self._entities(text) - self._entities(self.turns[-1]['query'])
+        if new_entities:
+            logger.info("问题提到了新的单位或武器 %s，不视为追问", sorted(new_entities))
+        return not new_entities
+
+    def _entities(self, text: str) -> set:
+        # 数据卡查询表识别出的单位和武器名；未启用查询表时为空
+        lookup = self.vector_search.datasheet_lookup
+        if not lookup:
+            return set()
+        matches = lookup.match_query(text)
+        return {u["name_zh"] for u in matches["units"]} | {w["name"] for w in matches["weapons"]}
+
+    def ask(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        检索并回答，追问时带上上一轮的问题和对话历史
+
+        Args:
+            query: 用户问题
+            top_k: 用于生成答案的块数
+
+        Returns:
+            List[Dict[str, Any]]: 搜索结果列表
+        """
+        try:
+            follow_up = self.is_follow_up(query)
+            # 追问往往省略主语，和上一轮问题拼接后再嵌入
+            search_text = f"{self.turns[-1]['query']}\n{query}" if follow_up else query
+            matches = self.retrieve(search_text, top_k)
+            answer_query = self._with_history(query) if follow_up else query
+            context = self.vector_search.expand_to_sections(matches) \
+                if SECTION_EXPANSION and self.vector_search.doc_store else matches
+            answer = self.vector_search.synthesize(answer_query, context)
+            self.record_turn(query, answer, [m['id'] for m in matches])
+            return [{'text': answer, 'score': 1.0}]
+        except Exception as e:
+            logger.error("对话检索时出错：%s", e)
+            return []
+
+    def retrieve(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        增量检索：只补取缓存中没有的块，再与缓存的候选块一起按余弦相似度排序
+
+        Args:
+            query: 用于嵌入的查询文本
+            top_k: 返回结果数量
+
+        Returns:
+            List[Dict[str, Any]]: 包含id、text、score和metadata的切片列表
+        """
+        start = time.monotonic()
+        embedding = np.asarray(self.vector_search.embed_query(query), dtype=np.float32)
+        hits = self.vector_search.query_index(embedding.tolist(), top_k, include_values=True, rerank=False)
+
+        new_hits = [hit for hit in hits if hit['id'] not in self.candidates]
+        self._add(dict(doc, values=hit['values']) for doc, hit in zip(self._materialize(new_hits), new_hits))
+        self.reused += len(hits) - len(new_hits)
+        self.fetched += len(new_hits)
+
+        ranked = self._rescore(embedding, top_k)
+        for match in ranked:
+            self.candidates.move_to_end(match['id'])
+        self._evict()
+        logger.info("增量检索：复用 %d 个缓存块，新取 %d 个，耗时 %.2f 秒",
+                    len(hits) - len(new_hits), len(new_hits), time.monotonic() - start)
+        return ranked
+
+    def add_candidates(self, matches: List[Dict[str, Any]]):
+        """
+        把新问题完整检索命中的段落加入候选缓存，之后的追问不再读取这些块
+
+        Args:
+            matches: VectorSearch.search(include_matches=True) 返回的段落，没有values的段落跳过
+        """
+        self._add(match for match in matches if match.get('values') is not None)
+        self._evict()
+
+    def _add(self, docs):
+        for doc in docs:
+            self.candidates[doc['id']] = {'id': doc['id'], 'text': doc['text'], 'metadata': doc['metadata'],
+                                          'values': np.asarray(doc['values'], dtype=np.float32)}
+            self.candidates.move_to_end(doc['id'])
+
+    def _evict(self):
+        # 超出容量时淘汰最久未命中的块
+        while len(self.candidates) > self.max_candidates:
+            self.candidates.popitem(last=False)
+
+    def _materialize(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # 只为新块读取文本
+        if not hits:
+            return []
+        if self.vector_search.doc_store is None:
+            return [{'id': hit['id'], 'text': hit['metadata'].get('text', ''), 'score': hit['score'],
+                     'metadata': hit['metadata']} for hit in hits]
+        return self.vector_search.hydrate([(hit['id'], hit['score']) for hit in hits])
+
+    def _rescore(self, embedding: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        # 缓存的候选块与新取的块统一用余弦相似度打分，再用MMR选出互不重复的top_k
+        candidates = list(self.candidates.values())
+        if not candidates:
+            return []
+        vectors = np.stack([c['values'] for c in candidates])
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(embedding) or 1.0)
+        scores = vectors @ embedding / np.where(norms == 0, 1.0, norms)
+        if MMR_LAMBDA < 1.0:
+            order = mmr_select(embedding, vectors, top_k, MMR_LAMBDA)
+        else:
+            order = np.argsort(-scores)[:top_k]
+        return [{'id': candidates[i]['id'], 'text': candidates[i]['text'], 'score': float(scores[i]),
+                 'metadata': candidates[i]['metadata']} for i in order]
+
+    def _with_history(self, query: str) -> str:
+        # 把最近几轮问答拼接到问题前，让模型理解追问中的指代
+        lines = ["对话历史："]
+        for turn in self.turns[-self.max_turns:]:
+            answer = turn['answer']
+            if len(answer) > self.history_chars:
+                answer = answer[:self.history_chars] + "..."
+            lines.append(f"问：{turn['query']}")
+            lines.append(f"答：{answer}")
+        lines.append(f"当前问题：{query}")
+        return "\n".join(lines)
+
+    def record_turn(self, query: str, answer: str, chunk_ids: Optional[List[str]] = None):
+        """
+        记录一轮问答，其他流程（数据卡、查询扩展、拆解）回答的问题也通过它进入对话历史
+
+        Args:
+            query: 用户问题
+            answer: 回答
+            chunk_ids: 本轮使用的块ID
+        """
+        self.turns.append({'query': query, 'answer': answer, 'chunk_ids': chunk_ids or []})
+
+    def reset(self):
+        """清空对话历史和候选块缓存"""
+        self.turns.clear()
+        self.candidates.clear()
+        self.reused = 0
+        self.fetched = 0
+
+
+__all__ = ['ConversationSession']
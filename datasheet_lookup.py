@@ -0,0 +1,256 @@
+import json
+import logging
+import re
+import sqlite3
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    name_zh TEXT NOT NULL,
+    name_en TEXT,
+    faction TEXT,
+    source_file TEXT,
+    stats TEXT,
+    keywords TEXT,
+    fields TEXT,
+    abilities TEXT,
+    raw_text TEXT
+);
+CREATE TABLE IF NOT EXISTS weapons (
+    id INTEGER PRIMARY KEY,
+    unit_id INTEGER NOT NULL REFERENCES units(id),
+    name TEXT NOT NULL,
+    profile TEXT,
+    category TEXT,
+    range TEXT,
+    attacks TEXT,
+    skill TEXT,
+    strength TEXT,
+    ap TEXT,
+    damage TEXT,
+    abilities TEXT
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    PRIMARY KEY (alias, kind, ref)
+);
+CREATE INDEX IF NOT EXISTS idx_weapons_unit ON weapons(unit_id);
+CREATE INDEX IF NOT EXISTS idx_weapons_name ON weapons(name);
+"""
+
+# 别名最短长度，过短的名称容易在查询中误匹配
+MIN_ALIAS_LENGTH = 2
+
+
+def normalize_name(name: str) -> str:
+    """统一名称格式：小写、去除空白和间隔符"""
+    return re.sub(r'[\s·・•]+', '', name).lower()
+
+
+def build_datasheet_db(datasheets: List[Dict[str, Any]], db_path: str, source_file: str = ""):
+    """
+    将数据卡写入SQLite查询表，同一来源文件的旧数据会被替换
+
+    Args:
+        datasheets: datasheet_extractor提取的数据卡列表
+        db_path: SQLite数据库路径
+        source_file: 数据卡来源文件
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+        old_ids = [row[0] for row in conn.execute("SELECT id FROM units WHERE source_file = ?", (source_file,))]
+        for unit_id in old_ids:
+            conn.execute("DELETE FROM weapons WHERE unit_id = ?", (unit_id,))
+            conn.execute("DELETE FROM aliases WHERE kind = 'unit' AND ref = ?", (str(unit_id),))
+        conn.execute("DELETE FROM units WHERE source_file = ?", (source_file,))
+
+        for sheet in datasheets:
+            cursor = conn.execute(
+                "INSERT INTO units (name_zh, name_en, faction, source_file, stats, keywords, fields, abilities, raw_text) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    sheet["name_zh"], sheet["name_en"], sheet["faction"], source_file,
+                    json.dumps(sheet["stats"], ensure_ascii=False),
+                    json.dumps(sheet["keywords"], ensure_ascii=False),
+                    json.dumps(sheet["fields"], ensure_ascii=False),
+                    json.dumps(sheet["abilities"], ensure_ascii=False),
+                    sheet["raw_text"]
+                )
+            )
+            unit_id = cursor.lastrowid
+            for alias in [sheet["name_zh"], sheet["name_en"]] + sheet["aliases"]:
+                if alias and len(normalize_name(alias)) >= MIN_ALIAS_LENGTH:
+                    conn.execute("INSERT OR IGNORE INTO aliases VALUES (?, 'unit', ?)",
+                                 (normalize_name(alias), str(unit_id)))
+            for weapon in sheet["weapons"]:
+                conn.execute(
+                    "INSERT INTO weapons (unit_id, name, profile, category, range, attacks, skill, strength, ap, damage, abilities) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (unit_id, weapon["name"], weapon["profile"], weapon["category"], weapon["range"],
+                     weapon["attacks"], weapon["skill"], weapon["strength"], weapon["ap"],
+                     weapon["damage"], weapon["abilities"])
+                )
+                if len(normalize_name(weapon["name"])) >= MIN_ALIAS_LENGTH:
+                    conn.execute("INSERT OR IGNORE INTO aliases VALUES (?, 'weapon', ?)",
+                                 (normalize_name(weapon["name"]), weapon["name"]))
+        conn.execute("DELETE FROM aliases WHERE kind = 'weapon' AND ref NOT IN (SELECT name FROM weapons)")
+        conn.commit()
+        logger.info("数据卡查询表已写入 %s：%d 个单位", db_path, len(datasheets))
+    finally:
+        conn.close()
+
+
+class DatasheetLookup:
+    def __init__(self, db_path: str):
+        """
+        初始化数据卡查询表
+
+        Args:
+            db_path: build_datasheet_db生成的SQLite数据库路径
+        """
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # 别名表很小，常驻内存以便在查询文本中做子串匹配
+        self.aliases = {}
+        for row in self.conn.execute("SELECT alias, kind, ref FROM aliases"):
+            self.aliases.setdefault(row["alias"], []).append((row["kind"], row["ref"]))
+        self._sorted_aliases = sorted(self.aliases, key=len, reverse=True)
+        logger.info("DatasheetLookup初始化完成，共 %d 个别名", len(self.aliases))
+
+    def _unit_row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        unit = {
+            "id": row["id"],
+            "name_zh": row["name_zh"],
+            "name_en": row["name_en"],
+            "faction": row["faction"],
+            "source_file": row["source_file"],
+            "stats": json.loads(row["stats"]),
+            "keywords": json.loads(row["keywords"]),
+            "fields": json.loads(row["fields"]),
+            "abilities": json.loads(row["abilities"]),
+        }
+        unit["weapons"] = [dict(w) for w in self.conn.execute(
+            "SELECT name, profile, category, range, attacks, skill, strength, ap, damage, abilities "
+            "FROM weapons WHERE unit_id = ? ORDER BY id", (row["id"],))]
+        return unit
+
+    def get_unit(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        按单位名称或别名查询数据卡
+
+        Args:
+            name: 单位中文名、英文名或别名
+
+        Returns:
+            Optional[Dict[str, Any]]: 单位数据卡，未找到时返回None
+        """
+        for kind, ref in self.aliases.get(normalize_name(name), []):
+            if kind == 'unit':
+                row = self.conn.execute("SELECT * FROM units WHERE id = ?", (int(ref),)).fetchone()
+                if row:
+                    return self._unit_row_to_dict(row)
+        return None
+
+    def get_weapon(self, name: str) -> List[Dict[str, Any]]:
+        """
+        按武器名称查询武器属性，同名武器可能出现在多个单位上
+
+        Args:
+            name: 武器名称
+
+        Returns:
+            List[Dict[str, Any]]: 武器属性列表，附带所属单位名称
+        """
+        refs = [ref for kind, ref in self.aliases.get(normalize_name(name), []) if kind == 'weapon']
+        if not refs:
+            return []
+        rows = self.conn.execute(
+            "SELECT w.name, w.profile, w.category, w.range, w.attacks, w.skill, w.strength, w.ap, w.damage, "
+            "w.abilities, u.name_zh AS unit_name FROM weapons w JOIN units u ON w.unit_id = u.id "
+            "WHERE w.name = ? ORDER BY w.id", (refs[0],))
+        return [dict(row) for row in rows]
+
+    def names(self) -> List[str]:
+        """全部单位中文名和武器名，别名词表把它们作为受保护的术语"""
+        rows = self.conn.execute("SELECT name_zh FROM units UNION SELECT name FROM weapons")
+        return [row[0] for row in rows if row[0]]
+
+    def match_query(self, query: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        在查询文本中识别单位名和武器名，返回对应的精确数据
+
+        Args:
+            query: 用户查询
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: {"units": [...], "weapons": [...]}
+        """
+        text = normalize_name(query)
+        units, weapons = {}, {}
+        for alias in self._sorted_aliases:
+            if alias not in text:
+                continue
+            # 已被更长别名覆盖的部分不再匹配，如"天行者大先知"中的"大先知"
+            text = text.replace(alias, "\0")
+            for kind, ref in self.aliases[alias]:
+                if kind == 'unit' and ref not in units:
+                    row = self.conn.execute("SELECT * FROM units WHERE id = ?", (int(ref),)).fetchone()
+                    if row:
+                        units[ref] = self._unit_row_to_dict(row)
+                elif kind == 'weapon' and ref not in weapons:
+                    weapons[ref] = self.get_weapon(ref)
+        matched_units = {unit["name_zh"] for unit in units.values()}
+        return {
+            "units": list(units.values()),
+            # 已随单位数据卡返回的武器不再重复列出
+            "weapons": [w for rows in weapons.values() for w in rows if w["unit_name"] not in matched_units]
+        }
+
+    @staticmethod
+    def format_rows(matches: Dict[str, List[Dict[str, Any]]]) -> str:
+        """
+        将查询结果格式化为可直接注入提示词的文本
+
+        Args:
+            matches: match_query的返回值
+
+        Returns:
+            str: 数据卡文本，无匹配时为空字符串
+        """
+        lines = []
+        for unit in matches.get("units", []):
+            stats = " ".join(f"{k} {v}" for k, v in unit["stats"].items())
+            lines.append(f"【数据卡】{unit['name_zh']} {unit['name_en']}（{unit['faction']}）")
+            lines.append(f"属性：{stats}")
+            if unit["keywords"]:
+                lines.append(f"关键词：{'，'.join(unit['keywords'])}")
+            for key in ("单位构成", "单位装备", "核心技能", "领袖能力"):
+                if unit["fields"].get(key):
+                    lines.append(f"{key}：{unit['fields'][key]}")
+            for ability in unit["abilities"]:
+                lines.append(f"技能：{ability}")
+            for weapon in unit["weapons"]:
+                lines.append(DatasheetLookup._format_weapon(weapon))
+        for weapon in matches.get("weapons", []):
+            lines.append(DatasheetLookup._format_weapon(weapon, with_unit=True))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _format_weapon(weapon: Dict[str, Any], with_unit: bool = False) -> str:
+        name = f"{weapon['name']}（{weapon['profile']}）" if weapon["profile"] else weapon["name"]
+        skill_label = "BS" if weapon["category"] == "ranged" else "WS"
+        owner = f"[{weapon['unit_name']}] " if with_unit and weapon.get("unit_name") else ""
+        return (f"武器：{owner}{name} 范围 {weapon['range']} A {weapon['attacks']} {skill_label} {weapon['skill']} "
+                f"S {weapon['strength']} AP {weapon['ap']} D {weapon['damage']} 技能 {weapon['abilities'] or '-'}")
+
+    def close(self):
+        self.conn.close()
+
+
+__all__ = ['DatasheetLookup', 'build_datasheet_db', 'normalize_name']
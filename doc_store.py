@@ -0,0 +1,107 @@
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    metadata TEXT
+);
+"""
+
+# SQLite 单条语句的参数上限
+_MAX_VARIABLES = 900
+
+
+def build_doc_store(db_path: str, records: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+    """
+    写入本地文档库，已存在的ID会被覆盖
+
+    Args:
+        db_path: SQLite数据库路径
+        records: (块ID, 文本, metadata) 序列
+
+    Returns:
+        int: 写入的块数
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA)
+        count = 0
+        for chunk_id, text, metadata in records:
+            conn.execute("INSERT OR REPLACE INTO docs VALUES (?, ?, ?)",
+                         (chunk_id, text, json.dumps(metadata, ensure_ascii=False)))
+            count += 1
+        conn.commit()
+        logger.info("文档库已写入 %s：%d 个块", db_path, count)
+        return count
+    finally:
+        conn.close()
+
+
+class DocStore:
+    def __init__(self, db_path: str, cache_size: int = 1024):
+        """
+        按块ID读取文本的本地文档库，热点块缓存在内存LRU中
+
+        Args:
+            db_path: build_doc_store生成的SQLite数据库路径
+            cache_size: LRU缓存的块数
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量读取块
+
+        Args:
+            ids: 块ID列表
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 块ID -> {"text", "metadata"}，库中不存在的ID不会出现在结果中
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for chunk_id in ids:
+                if chunk_id in self._cache:
+                    self._cache.move_to_end(chunk_id)
+                    found[chunk_id] = self._cache[chunk_id]
+                else:
+                    missing.append(chunk_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+
+            for start in range(0, len(missing), _MAX_VARIABLES):
+                batch = missing[start:start + _MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(f"SELECT id, text, metadata FROM docs WHERE id IN ({placeholders})", batch)
+                for chunk_id, text, metadata in rows:
+                    doc = {"text": text, "metadata": json.loads(metadata) if metadata else {}}
+                    found[chunk_id] = doc
+                    self._cache[chunk_id] = doc
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return found
+
+    def get(self, chunk_id: str) -> Dict[str, Any]:
+        """读取单个块，不存在时返回None"""
+        return self.get_many([chunk_id]).get(chunk_id)
+
+    def close(self):
+        self.conn.close()
+
+
+__all__ = ['DocStore', 'build_doc_store']
@@ -0,0 +1,187 @@
+"""
+对冲请求与分阶段截止时间
+
+幂等调用（嵌入、索引查询）由 Hedger 在线程池中执行：超过该阶段近期延迟的百分位后
+再发出一个相同的请求，取先完成的结果；超过截止时间仍未完成时抛出 StageTimeout。
+每个阶段的调用数、对冲率、对冲胜出率、超时数和延迟百分位通过 hedger.metrics() 获取。
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Callable
+import numpy as np
+from request_profiler import traced
+from config import (
+    STAGE_DEADLINES,
+    HEDGE_ENABLED,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_DELAY,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MAX_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+# 每个阶段保留的最近延迟样本数
+LATENCY_WINDOW = 500
+
+
+class StageTimeout(TimeoutError):
+    """某个阶段超过截止时间"""
+
+
+class StageMetrics:
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def percentile(self, p: float) -> float:
+        with self.lock:
+            samples = list(self.latencies)
+        return float(np.percentile(samples, p)) if samples else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            samples = list(self.latencies)
+            counters = {"calls": self.calls, "hedged": self.hedged, "hedge_wins": self.hedge_wins,
+                        "timeouts": self.timeouts, "errors": self.errors}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if samples else (0.0, 0.0, 0.0)
+        return {
+            **counters,
+            "hedge_rate": counters["hedged"] / counters["calls"] if counters["calls"] else 0.0,
+            "hedge_win_rate": counters["hedge_wins"] / counters["hedged"] if counters["hedged"] else 0.0,
+            "p50": float(p50), "p95": float(p95), "p99": float(p99),
+        }
+
+
+class Hedger:
+    def __init__(self, enabled: bool = HEDGE_ENABLED, percentile: float = HEDGE_PERCENTILE,
+                 min_delay: float = HEDGE_MIN_DELAY, default_delay: float = HEDGE_DEFAULT_DELAY,
+                 min_samples: int = HEDGE_MIN_SAMPLES, max_workers: int = HEDGE_MAX_WORKERS):
+        """
+        初始化对冲执行器
+
+        Args:
+            enabled: 是否发出对冲请求，关闭时仍然执行截止时间
+            percentile: 对冲延迟取该阶段延迟的百分位
+            min_delay: 对冲延迟下限（秒）
+            default_delay: 样本不足时的对冲延迟（秒）
+            min_samples: 使用百分位前需要的最少样本数
+            max_workers: 线程池大小，卡住的请求会占用线程直到返回
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def _metrics(self, stage: str) -> StageMetrics:
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = StageMetrics()
+            return self._stages[stage]
+
+    def hedge_delay(self, stage: str) -> float:
+        """发出对冲请求前的等待时间"""
+        metrics = self._metrics(stage)
+        if len(metrics.latencies) < self.min_samples:
+            return self.default_delay
+        return max(metrics.percentile(self.percentile), self.min_delay)
+
+    def _submit(self, metrics: StageMetrics, fn: Callable, args, kwargs):
+        submitted = time.monotonic()
+
+        def record(future):
+            # 每个请求成功返回时都记录延迟，被放弃的慢请求也计入尾部延迟
+            if not future.cancelled() and future.exception() is None:
+                with metrics.lock:
+                    metrics.latencies.append(time.monotonic() - submitted)
+
+        # 在调用方的上下文中执行，用量统计、请求分析等上下文变量对后台线程同样有效
+        future = self.executor.submit(contextvars.copy_context().run, traced(fn), *args, **kwargs)
+        future.add_done_callback(record)
+        return future
+
+    def call(self, stage: str, fn: Callable, *args, deadline: float = None, hedge: bool = True, **kwargs):
+        """
+        在截止时间内执行调用，必要时发出一个对冲请求
+
+        Args:
+            stage: 阶段名称，用于统计和查找默认截止时间
+            fn: 要执行的调用，对冲时会被执行两次，只能用于幂等调用
+            deadline: 截止时间（秒），默认取 STAGE_DEADLINES[stage]
+            hedge: 是否允许对冲
+
+        Returns:
+            调用的返回值
+
+        Raises:
+            StageTimeout: 超过截止时间
+        """
+        metrics = self._metrics(stage)
+        with metrics.lock:
+            metrics.calls += 1
+        deadline = STAGE_DEADLINES.get(stage) if deadline is None else deadline
+        delay = self.hedge_delay(stage) if hedge and self.enabled else None
+        start = time.monotonic()
+        primary = self._submit(metrics, fn, args, kwargs)
+        is_hedge = {primary: False}
+        pending = {primary}
+
+        while True:
+            elapsed = time.monotonic() - start
+            remaining = deadline - elapsed if deadline else None
+            if remaining is not None and remaining <= 0:
+                with metrics.lock:
+                    metrics.timeouts += 1
+                logger.warning("%s 阶段超过截止时间 %.1f 秒", stage, deadline)
+                raise StageTimeout(f"{stage} 阶段超过截止时间 {deadline} 秒")
+            timeout = remaining
+            if delay is not None and len(is_hedge) == 1:
+                timeout = max(delay - elapsed, 0) if timeout is None else min(timeout, max(delay - elapsed, 0))
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if is_hedge[future]:
+                        with metrics.lock:
+                            metrics.hedge_wins += 1
+                    return future.result()
+            if not pending:
+                # 所有已发出的请求都失败了：对冲不是重试，直接抛出错误
+                with metrics.lock:
+                    metrics.errors += 1
+                raise next(iter(done)).exception()
+
+            if delay is not None and len(is_hedge) == 1 and time.monotonic() - start >= delay:
+                hedged = self._submit(metrics, fn, args, kwargs)
+                is_hedge[hedged] = True
+                pending.add(hedged)
+                with metrics.lock:
+                    metrics.hedged += 1
+                logger.debug("%s 阶段 %.2f 秒未返回，发出对冲请求", stage, delay)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """各阶段的调用数、对冲率、对冲胜出率、超时数和延迟百分位（秒）"""
+        with self._lock:
+            stages = dict(self._stages)
+        return {stage: metrics.to_dict() for stage, metrics in stages.items()}
+
+
+hedger = Hedger()
+
+
+__all__ = ['hedger', 'Hedger', 'StageTimeout']
@@ -0,0 +1,300 @@
+"""
+索引版本别名：blue/green 方式切换检索使用的索引版本
+
+每个版本是 Pinecone 中的一个命名空间（也可以是另一个索引），入库时写入新版本，
+不影响线上正在使用的版本。新版本通过冒烟查询后，原子地改写 index_alias.json：
+
+    {
+      "current": {"version": "v2", "index": "wh40kcodex", "namespace": "v2"},
+      "history": [{"version": "v1", ...}],
+      "updated": "..."
+    }
+
+VectorSearch 每次查询前检查别名文件的修改时间，运行中的进程无需重启即可切换；
+history 中保留的旧版本可以立即回滚。
+
+入库时与索引一起重建的数据卡查询表和别名词表也按版本存放（如 datasheets.v2.db、lexicon.v2.json），
+切换或回滚版本时随索引一起切换，见 versioned_path。
+
+用法：
+    python index_alias.py status
+    python index_alias.py promote v2 --smoke smoke_queries.json
+    python index_alias.py rollback
+    python index_alias.py drop v1
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from config import (
+    INDEX_ALIAS_PATH,
+    INDEX_ALIAS_CHECK_INTERVAL,
+    INDEX_ALIAS_HISTORY,
+    PINECONE_INDEX_NAME
+)
+
+logger = logging.getLogger(__name__)
+
+# 没有别名文件时使用的版本：配置中的索引和默认命名空间
+DEFAULT_VERSION = "default"
+
+
+def versioned_path(path: str, version: str) -> str:
+    """
+    版本对应的数据文件路径：默认版本使用原路径，其他版本在扩展名前加上版本名
+
+    Args:
+        path: 默认版本的文件路径，如 datasheets.db
+        version: 版本名
+
+    Returns:
+        str: 如 datasheets.v2.db；path为空时原样返回
+    """
+    if not path or not version or version == DEFAULT_VERSION:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{version}{ext}"
+
+
+def seed_version_file(source: str, target: str) -> bool:
+    """
+    新版本的数据文件不存在时从线上版本复制一份，本次没有重新入库的来源文件的数据随之保留
+
+    Args:
+        source: 线上版本的文件路径
+        target: 新版本的文件路径
+
+    Returns:
+        bool: 是否复制了文件
+    """
+    if not source or source == target or os.path.exists(target) or not os.path.exists(source):
+        return False
+    if source.endswith('.db'):
+        # 用SQLite的备份接口复制，线上进程正在读写时也能得到一致的副本
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    else:
+        shutil.copyfile(source, target)
+    logger.info("从 %s 复制 %s", source, target)
+    return True
+
+
+def read_alias(path: str = INDEX_ALIAS_PATH) -> Optional[Dict[str, Any]]:
+    """读取别名文件，不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_alias(data: Dict[str, Any], path: str = INDEX_ALIAS_PATH):
+    """先写临时文件再替换，读者只会看到完整的旧文件或新文件"""
+    data = {**data, "updated": datetime.now().isoformat()}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _default_target(index_name: str = PINECONE_INDEX_NAME) -> Dict[str, str]:
+    return {"version": DEFAULT_VERSION, "index": index_name, "namespace": ""}
+
+
+def promote(version: str, index_name: str = PINECONE_INDEX_NAME, namespace: str = None,
+            path: str = INDEX_ALIAS_PATH, keep: int = INDEX_ALIAS_HISTORY) -> Dict[str, Any]:
+    """
+    把别名指向新版本，当前版本移入history
+
+    Args:
+        version: 版本名
+        index_name: 版本所在的索引
+        namespace: 版本所在的命名空间，默认与版本名相同
+        path: 别名文件路径
+        keep: history中保留的旧版本数
+
+    Returns:
+        Dict[str, Any]: 新的别名内容
+    """
+    data = read_alias(path) or {"current": _default_target(index_name), "history": []}
+    target = {"version": version, "index": index_name, "namespace": version if namespace is None else namespace}
+    history = [h for h in [data["current"]] + data["history"] if h["version"] != version][:keep]
+    data = {"current": target, "history": history}
+    write_alias(data, path)
+    logger.info("索引别名已切换到 %s（%s/%s）", version, target["index"], target["namespace"])
+    return data
+
+
+def rollback(path: str = INDEX_ALIAS_PATH) -> Dict[str, Any]:
+    """
+    回滚到history中最近的旧版本，当前版本放回history末尾以便再次切换
+
+    Returns:
+        Dict[str, Any]: 新的别名内容
+    """
+    data = read_alias(path)
+    if not data or not data["history"]:
+        raise ValueError("没有可回滚的旧版本")
+    previous, *rest = data["history"]
+    data = {"current": previous, "history": rest + [data["current"]]}
+    write_alias(data, path)
+    logger.warning("索引别名已回滚到 %s", previous["version"])
+    return data
+
+
+class IndexAlias:
+    def __init__(self, path: str = INDEX_ALIAS_PATH, default_index: str = PINECONE_INDEX_NAME,
+                 check_interval: float = INDEX_ALIAS_CHECK_INTERVAL):
+        """
+        解析当前版本，别名文件变化时自动重新加载
+
+        Args:
+            path: 别名文件路径
+            default_index: 没有别名文件时使用的索引
+            check_interval: 检查文件修改时间的最小间隔（秒）
+        """
+        self.path = path
+        self.default_index = default_index
+        self.check_interval = check_interval
+        self._target = _default_target(default_index)
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def resolve(self) -> Tuple[str, str]:
+        """
+        当前版本所在的索引和命名空间
+
+        Returns:
+            Tuple[str, str]: (索引名, 命名空间)
+        """
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            with self._lock:
+                self._checked = now
+                self._reload()
+        target = self._target
+        return target["index"], target["namespace"]
+
+    @property
+    def version(self) -> str:
+        return self._target["version"]
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            data = read_alias(self.path)
+        except (OSError, ValueError) as e:
+            # 文件损坏时继续使用已加载的版本
+            logger.error("读取索引别名出错，继续使用版本 %s：%s", self._target["version"], e)
+            return
+        target = data["current"] if data else _default_target(self.default_index)
+        if target != self._target:
+            logger.info("索引版本切换：%s -> %s", self._target["version"], target["version"])
+            self._target = target
+
+
+def run_smoke_queries(vector_search, queries: List[Dict[str, Any]], top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    在指定版本上执行冒烟查询
+
+    Args:
+        vector_search: 已通过pin固定到待检查版本的VectorSearch
+        queries: [{"query": 查询, "expect": [至少出现其一的文本]}]
+        top_k: 每个查询检查的结果数
+
+    Returns:
+        List[Dict[str, Any]]: 未通过的查询及原因
+    """
+    failures = []
+    for item in queries:
+        try:
+            matches = vector_search.retrieve(item["query"], top_k)
+        except Exception as e:
+            failures.append({"query": item["query"], "reason": f"检索出错：{e}"})
+            continue
+        if not matches:
+            failures.append({"query": item["query"], "reason": "没有结果"})
+            continue
+        expect = item.get("expect") or []
+        texts = "\n".join(m["text"] for m in matches)
+        if expect and not any(term in texts for term in expect):
+            failures.append({"query": item["query"], "reason": f"结果中没有 {expect}"})
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='管理检索使用的索引版本')
+    parser.add_argument('--alias', type=str, default=INDEX_ALIAS_PATH, help='别名文件路径')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='查看当前版本和可回滚的版本')
+    promote_parser = sub.add_parser('promote', help='冒烟查询通过后切换到新版本')
+    promote_parser.add_argument('version', help='版本名（入库时 --namespace 的值）')
+    promote_parser.add_argument('--index', type=str, default=PINECONE_INDEX_NAME, help='版本所在的索引')
+    promote_parser.add_argument('--smoke', type=str, default='smoke_queries.json', help='冒烟查询文件')
+    promote_parser.add_argument('--force', action='store_true', help='跳过冒烟查询')
+    sub.add_parser('rollback', help='回滚到上一个版本')
+    drop_parser = sub.add_parser('drop', help='删除不再需要的旧版本')
+    drop_parser.add_argument('version', help='版本名')
+    drop_parser.add_argument('--index', type=str, default=PINECONE_INDEX_NAME, help='版本所在的索引')
+    args = parser.parse_args()
+
+    data = read_alias(args.alias)
+    if args.command == 'status':
+        print(json.dumps(data or {"current": _default_target()}, ensure_ascii=False, indent=2))
+    elif args.command == 'promote':
+        if not args.force:
+            # 只在需要时导入，避免VectorSearch与别名模块循环依赖
+            from vector_search import VectorSearch
+            from config import PINECONE_API_KEY
+            with open(args.smoke, 'r', encoding='utf-8') as f:
+                queries = json.load(f)
+            vector_search = VectorSearch(pinecone_api_key=PINECONE_API_KEY, index_name=args.index)
+            vector_search.pin(args.index, args.version)
+            stats = vector_search.index.describe_index_stats()
+            namespace = (stats.namespaces or {}).get(args.version)
+            if not namespace or not namespace.vector_count:
+                parser.exit(1, f"版本 {args.version} 中没有向量，未切换\n")
+            failures = run_smoke_queries(vector_search, queries)
+            for failure in failures:
+                print(f"未通过：{failure['query']}（{failure['reason']}）")
+            if failures:
+                parser.exit(1, f"{len(failures)}/{len(queries)} 个冒烟查询未通过，未切换\n")
+            print(f"{len(queries)} 个冒烟查询全部通过，版本中共 {namespace.vector_count} 个向量")
+        data = promote(args.version, args.index, path=args.alias)
+        print(f"已切换到 {args.version}，可回滚版本：{[h['version'] for h in data['history']]}")
+    elif args.command == 'rollback':
+        data = rollback(args.alias)
+        print(f"已回滚到 {data['current']['version']}")
+    elif args.command == 'drop':
+        in_use = [data["current"]] + data["history"] if data else [_default_target()]
+        if any(t["version"] == args.version for t in in_use):
+            parser.exit(1, f"版本 {args.version} 是当前版本或可回滚版本，不能删除\n")
+        from pinecone import Pinecone
+        from config import PINECONE_API_KEY
+        Pinecone(api_key=PINECONE_API_KEY).Index(args.index).delete(delete_all=True, namespace=args.version)
+        print(f"已删除版本 {args.version}")
+
+
+__all__ = ['IndexAlias', 'promote', 'rollback', 'read_alias', 'run_smoke_queries', 'versioned_path',
+           'seed_version_file', 'DEFAULT_VERSION']
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""
+并发虚拟用户压测：估算单个部署能同时服务多少玩家
+
+压测使用真实的 QueryExpander、VectorSearch 和 QueryProcessor，只把 OpenAI、Pinecone 和 ChatOpenAI
+客户端替换为本地替身：替身按配置的延迟（对数正态分布）等待后返回结构相同的响应，
+可以限制并发数来模拟服务商的限流。对冲、推测检索线程池、MMR、提示拼接等本地开销全部保留。
+
+两种到达模型：
+    closed  N 个虚拟用户各自循环：提问、等待回答、思考（指数分布）后再提问，逐级增加 N
+    open    请求按泊松过程到达，与响应快慢无关，逐级提高到达速率；延迟从计划到达时间算起
+
+每一级输出吞吐量和 p50/p95/p99 延迟，最后给出饱和点：
+    closed  吞吐量不再随并发增长（增幅低于 --saturation-gain）之前的并发数
+    open    实际吞吐低于到达速率的95%，或p95超过最低一级的 --latency-factor 倍之前的速率
+
+用法：
+    python load_test.py closed --users 1,2,4,8,16,32 --duration 30
+    python load_test.py open --rates 0.5,1,2,4,8 --duration 60 --llm-latency 1.5
+    python load_test.py closed --mix load_profile.json --llm-concurrency 16 --output curve.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import List, Dict, Any, Callable
+
+import numpy as np
+
+# 替身不需要真实的密钥，但客户端构造时会检查
+os.environ.setdefault("OPENAI_API_KEY", "load-test")
+os.environ.setdefault("PINECONE_API_KEY", "load-test")
+
+from query_expander import QueryExpander  # noqa: E402
+from query_processor import QueryProcessor  # noqa: E402
+from logging_setup import setup_logging  # noqa: E402
+from query_cache import QueryCache  # noqa: E402
+from hedging import hedger  # noqa: E402
+from config import DEFAULT_TEMPERATURE, LLM_MODEL, EMBADDING_MODEL, QUERY_CACHE_PATH  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# 默认的查询构成：处理流程 -> 权重
+DEFAULT_MIX = {"vector": 0.5, "expand": 0.2, "speculative": 0.1, "decompose": 0.2}
+# 默认的思考时间（秒，指数分布的均值）
+DEFAULT_THINK_TIME = 5.0
+EMBEDDING_DIM = 1536
+
+
+class LatencyModel:
+    def __init__(self, median: float, jitter: float = 0.3, concurrency: int = 0):
+        """
+        替身后端的延迟
+
+        Args:
+            median: 延迟中位数（秒）
+            jitter: 对数正态分布的sigma，0为固定延迟
+            concurrency: 同时处理的请求上限，超出时排队，0为不限制
+        """
+        self.median = median
+        self.jitter = jitter
+        self.semaphore = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+
+    def wait(self):
+        delay = self.median * float(np.exp(random.gauss(0, self.jitter))) if self.jitter else self.median
+        if self.semaphore is None:
+            time.sleep(delay)
+            return
+        with self.semaphore:
+            time.sleep(delay)
+
+
+def _tokens(text: str) -> int:
+    # 中文大约每字一个token，替身只需要数量级正确
+    return max(len(text), 1)
+
+
+class StubOpenAI:
+    def __init__(self, llm: LatencyModel, embed: LatencyModel, answer_chars: int = 800):
+        """OpenAI客户端替身：chat.completions.create 和 embeddings.create"""
+        self.llm = llm
+        self.embed = embed
+        self.answer_chars = answer_chars
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _chat(self, model: str = LLM_MODEL, messages: List[Dict[str, str]] = None, **kwargs):
+        self.llm.wait()
+        prompt = "\n".join(m["content"] for m in messages or [])
+        if "请选择最契合" in prompt:
+            content = "替身选择的查询变体"
+        elif "变体" in prompt:
+            content = "\n".join(f"{i}. 替身生成的查询变体{i}" for i in range(1, 5))
+        else:
+            content = "回答：" + "规则文本" * (self.answer_chars // 4)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=_tokens(prompt), completion_tokens=_tokens(content))
+        )
+
+    def _embed(self, model: str = EMBADDING_MODEL, input=None, **kwargs):
+        self.embed.wait()
+        vector = np.random.default_rng().standard_normal(EMBEDDING_DIM).astype(np.float32)
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(embedding=vector.tolist())],
+            usage=SimpleNamespace(prompt_tokens=_tokens(str(input)), completion_tokens=0)
+        )
+
+
+class StubIndex:
+    def __init__(self, latency: LatencyModel, corpus_size: int = 2000, chunk_chars: int = 600):
+        """
+        Pinecone索引替身：返回随机的块，metadata中带文本，向量按需返回
+
+        Args:
+            latency: 查询延迟
+            corpus_size: 替身语料的块数
+            chunk_chars: 每个块的字符数
+        """
+        self.latency = latency
+        rng = np.random.default_rng(0)
+        self.vectors = rng.standard_normal((corpus_size, EMBEDDING_DIM)).astype(np.float32)
+        self.texts = [f"块{i}：" + "规则原文" * (chunk_chars // 4) for i in range(corpus_size)]
+
+    def _match(self, i: int, score: float, include_metadata: bool, include_values: bool):
+        return SimpleNamespace(
+            id=f"stub-{i}", score=score,
+            metadata={"text": self.texts[i], "source": "stub"} if include_metadata else None,
+            # Pinecone SDK返回的向量是列表，保留转换开销
+            values=self.vectors[i].tolist() if include_values else []
+        )
+
+    def query(self, vector=None, namespace: str = "", top_k: int = 5, include_metadata: bool = True,
+              include_values: bool = False, rerank_config: Dict[str, Any] = None, **kwargs):
+        self.latency.wait()
+        ids = random.sample(range(len(self.texts)), min(top_k, len(self.texts)))
+        scores = sorted((random.uniform(0.6, 0.9) for _ in ids), reverse=True)
+        return SimpleNamespace(matches=[self._match(i, s, include_metadata, include_values)
+                                        for i, s in zip(ids, scores)])
+
+    def fetch(self, ids: List[str] = None, namespace: str = "", **kwargs):
+        self.latency.wait()
+        vectors = {}
+        for chunk_id in ids or []:
+            i = int(chunk_id.split("-")[-1])
+            vectors[chunk_id] = SimpleNamespace(metadata={"text": self.texts[i], "source": "stub"})
+        return SimpleNamespace(vectors=vectors)
+
+
+class StubChatModel:
+    def __init__(self, llm: LatencyModel, answer_chars: int = 800):
+        """ChatOpenAI替身：invoke返回带usage_metadata的消息"""
+        self.llm = llm
+        self.answer_chars = answer_chars
+
+    def invoke(self, messages):
+        self.llm.wait()
+        prompt = "\n".join(str(getattr(m, "content", m)) for m in messages)
+        if "只返回JSON" in prompt:
+            content = json.dumps({"core_concepts": ["警戒射击", "载具"], "analysis_steps": ["判断是否在交战范围内"],
+                                  "key_rules": ["警戒射击"]}, ensure_ascii=False)
+        else:
+            content = "回答：" + "规则文本" * (self.answer_chars // 4)
+        return SimpleNamespace(
+            content=content,
+            usage_metadata={"input_tokens": _tokens(prompt), "output_tokens": _tokens(content)},
+            response_metadata={"model_name": LLM_MODEL}
+        )
+
+
+class LoadHarness:
+    def __init__(self, llm: LatencyModel, embed: LatencyModel, index: LatencyModel, corpus_size: int = 2000,
+                 cache_path: str = ""):
+        """
+        构造真实的处理流程并替换外部客户端
+
+        Args:
+            llm: LLM调用的延迟
+            embed: 嵌入调用的延迟
+            index: 索引查询的延迟
+            corpus_size: 替身语料的块数
+            cache_path: 嵌入缓存的路径，默认不启用缓存；替身的随机向量不能写入线上的缓存，
+                缓存命中也会掩盖嵌入调用的延迟
+        """
+        self.cache = QueryCache(path=cache_path)
+        self.openai = StubOpenAI(llm, embed)
+        self.index = StubIndex(index, corpus_size)
+        self.chat_model = StubChatModel(llm)
+        self.expander = QueryExpander(temperature=DEFAULT_TEMPERATURE)
+        self.expander.client = self.openai
+        self.vector_search = self.expander.vector_search
+        self._stub_vector_search(self.vector_search)
+        self._local = threading.local()
+
+    def _stub_vector_search(self, vector_search):
+        vector_search.client = self.openai
+        vector_search.query_cache = self.cache
+        vector_search.pc = SimpleNamespace(Index=lambda name: self.index)
+        vector_search._indexes = {}
+        vector_search.pin("load-test", "")
+        # 替身的块只在metadata中
+        vector_search.doc_store = None
+        vector_search.local_index = None
+
+    def _processor(self) -> QueryProcessor:
+        # 与应用一致，每次拆解使用没有缓存的处理器；每个线程复用一个实例以免重复构造客户端
+        processor = getattr(self._local, "processor", None)
+        if processor is None:
+            processor = QueryProcessor(temperature=DEFAULT_TEMPERATURE, vector_search=self.vector_search)
+            processor.llm = self.chat_model
+            self._local.processor = processor
+        processor.clear_cache()
+        return processor
+
+    def run(self, path: str, query: str):
+        """按处理流程执行一次查询"""
+        if path == "vector":
+            return self.vector_search.search(query)
+        if path == "expand":
+            return self.vector_search.search(self.expander.expand_query(query))
+        if path == "speculative":
+            return self.expander.speculative_search(query)
+        if path == "decompose":
+            return self._processor().process_query(query)
+        raise ValueError(f"未知的处理流程：{path}")
+
+
+class QueryMix:
+    def __init__(self, mix: Dict[str, float], queries: List[str], think_time: float):
+        """
+        查询构成：按权重选择处理流程，随机选择问题
+
+        Args:
+            mix: 处理流程 -> 权重
+            queries: 问题列表
+            think_time: 虚拟用户两次提问之间的平均思考时间（秒）
+        """
+        self.paths = list(mix)
+        self.weights = [mix[path] for path in self.paths]
+        self.queries = queries
+        self.think_time = think_time
+
+    @classmethod
+    def load(cls, path: str = None, queries_path: str = "smoke_queries.json",
+             think_time: float = None) -> "QueryMix":
+        """
+        从文件加载查询构成
+
+        文件格式：{"think_time": 5.0, "mix": {"vector": 0.5, ...}, "queries": ["..."]}，
+        缺少的字段使用默认值，问题默认取冒烟查询。
+        """
+        profile = {}
+        if path:
+            with open(path, 'r', encoding='utf-8') as f:
+                profile = json.load(f)
+        queries = profile.get("queries")
+        if not queries:
+            with open(queries_path, 'r', encoding='utf-8') as f:
+                queries = [item["query"] for item in json.load(f)]
+        if think_time is None:
+            think_time = profile.get("think_time", DEFAULT_THINK_TIME)
+        return cls(profile.get("mix", DEFAULT_MIX), queries, think_time)
+
+    def next(self):
+        return random.choices(self.paths, self.weights)[0], random.choice(self.queries)
+
+    def think(self) -> float:
+        return random.expovariate(1 / self.think_time) if self.think_time > 0 else 0.0
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.by_path = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, path: str, latency: float, error: bool = False):
+        with self._lock:
+            if error:
+                self.errors += 1
+                return
+            self.latencies.append(latency)
+            self.by_path.setdefault(path, []).append(latency)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self.latencies)
+            by_path = {path: list(values) for path, values in self.by_path.items()}
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+            **_percentiles(latencies),
+            "by_path": {path: {"requests": len(values), **_percentiles(values)} for path, values in by_path.items()},
+        }
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def _timed(run: Callable, recorder: Recorder, path: str, query: str, started: float):
+    try:
+        run(path, query)
+        recorder.record(path, time.monotonic() - started)
+    except Exception as e:
+        logger.error("压测请求出错：%s", e)
+        recorder.record(path, 0.0, error=True)
+
+
+def run_closed(harness: LoadHarness, mix: QueryMix, users: int, duration: float) -> Dict[str, Any]:
+    """
+    闭环：users个虚拟用户在duration秒内循环提问
+
+    Returns:
+        Dict[str, Any]: 本级的吞吐量、延迟百分位和错误数
+    """
+    recorder = Recorder()
+    start = time.monotonic()
+    end = start + duration
+
+    def user():
+        # 错开各用户的第一次提问
+        time.sleep(random.uniform(0, min(mix.think_time, duration / 10)))
+        while time.monotonic() < end:
+            path, query = mix.next()
+            _timed(harness.run, recorder, path, query, time.monotonic())
+            time.sleep(mix.think())
+
+    threads = [threading.Thread(target=user, name=f"vu-{i}", daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"users": users, **recorder.summary(time.monotonic() - start)}
+
+
+def run_open(harness: LoadHarness, mix: QueryMix, rate: float, duration: float,
+             max_in_flight: int = 256) -> Dict[str, Any]:
+    """
+    开环：请求按泊松过程以rate（次/秒）到达，持续duration秒
+
+    延迟从计划到达时间算起，排队等待也计入，避免协调遗漏低估延迟。
+
+    Returns:
+        Dict[str, Any]: 本级的到达速率、实际吞吐量、延迟百分位和错误数
+    """
+    recorder = Recorder()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="arrival") as executor:
+        scheduled = start
+        while True:
+            scheduled += random.expovariate(rate)
+            if scheduled >= start + duration:
+                break
+            time.sleep(max(scheduled - time.monotonic(), 0))
+            path, query = mix.next()
+            executor.submit(_timed, harness.run, recorder, path, query, scheduled)
+    return {"rate": rate, **recorder.summary(time.monotonic() - start)}
+
+
+def find_saturation(steps: List[Dict[str, Any]], mode: str, saturation_gain: float = 0.1,
+                    latency_factor: float = 3.0) -> Dict[str, Any]:
+    """
+    找出饱和点
+
+    Args:
+        steps: 各级结果，按并发数或到达速率递增
+        mode: closed 或 open
+        saturation_gain: 闭环中吞吐量的最小相对增幅
+        latency_factor: 开环中p95相对最低一级的最大倍数
+
+    Returns:
+        Dict[str, Any]: 饱和点所在的级别和原因，未饱和时level为None
+    """
+    key = "users" if mode == "closed" else "rate"
+    for previous, step in zip(steps, steps[1:]):
+        if mode == "closed":
+            if step["throughput"] < previous["throughput"] * (1 + saturation_gain):
+                return {"level": previous[key], "reason": f"{key}={step[key]} 时吞吐量不再增长"}
+        else:
+            if step["throughput"] < step["rate"] * 0.95:
+                return {"level": previous[key], "reason": f"{key}={step[key]} 时吞吐量跟不上到达速率"}
+            if steps[0]["p95"] and step["p95"] > steps[0]["p95"] * latency_factor:
+                return {"level": previous[key], "reason": f"{key}={step[key]} 时p95超过 {latency_factor} 倍"}
+    return {"level": None, "reason": "测试范围内未饱和"}
+
+
+def _levels(text: str) -> List[float]:
+    return [float(value) for value in text.split(",") if value.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以并发虚拟用户压测查询流程，输出延迟-并发曲线和饱和点')
+    parser.add_argument('mode', choices=['closed', 'open'], help='到达模型：closed（虚拟用户循环）或 open（泊松到达）')
+    parser.add_argument('--users', type=str, default='1,2,4,8,16,32', help='closed模式逐级的虚拟用户数')
+    parser.add_argument('--rates', type=str, default='0.5,1,2,4,8', help='open模式逐级的到达速率（次/秒）')
+    parser.add_argument('--duration', type=float, default=30.0, help='每一级的持续时间（秒）')
+    parser.add_argument('--mix', type=str, default=None, help='查询构成文件，默认按内置比例使用冒烟查询')
+    parser.add_argument('--think-time', type=float, default=None, help='平均思考时间（秒），覆盖查询构成文件')
+    parser.add_argument('--llm-latency', type=float, default=1.0, help='LLM调用的延迟中位数（秒）')
+    parser.add_argument('--embed-latency', type=float, default=0.1, help='嵌入调用的延迟中位数（秒）')
+    parser.add_argument('--index-latency', type=float, default=0.05, help='索引查询的延迟中位数（秒）')
+    parser.add_argument('--jitter', type=float, default=0.3, help='替身延迟的对数正态sigma')
+    parser.add_argument('--llm-concurrency', type=int, default=0, help='LLM替身的并发上限，0为不限制')
+    parser.add_argument('--corpus-size', type=int, default=2000, help='替身语料的块数')
+    parser.add_argument('--saturation-gain', type=float, default=0.1, help='闭环中判断饱和的吞吐量最小增幅')
+    parser.add_argument('--latency-factor', type=float, default=3.0, help='开环中判断饱和的p95倍数')
+    parser.add_argument('--output', type=str, default=None, help='把曲线和饱和点写入JSON文件')
+    parser.add_argument('--cache-path', type=str, default='',
+                        help='嵌入缓存的路径（使用独立的文件），默认不启用缓存，每次都计入嵌入延迟')
+    parser.add_argument('--log-level', type=str, default='WARNING', help='流程日志级别')
+    args = parser.parse_args()
+    if args.cache_path and os.path.abspath(args.cache_path) == os.path.abspath(QUERY_CACHE_PATH):
+        parser.error('--cache-path 不能使用线上的查询缓存')
+
+    # 压测流程的日志只输出到控制台，不写入应用的日志文件
+    setup_logging(log_file='', level=args.log_level)
+    harness = LoadHarness(
+        llm=LatencyModel(args.llm_latency, args.jitter, args.llm_concurrency),
+        embed=LatencyModel(args.embed_latency, args.jitter),
+        index=LatencyModel(args.index_latency, args.jitter),
+        corpus_size=args.corpus_size,
+        cache_path=args.cache_path
+    )
+    mix = QueryMix.load(args.mix, think_time=args.think_time)
+
+    steps = []
+    key = "users" if args.mode == "closed" else "rate"
+    print(f"{key:>8} {'请求数':>6} {'错误':>4} {'吞吐/秒':>8} {'p50':>7} {'p95':>7} {'p99':>7}")
+    for level in _levels(args.users if args.mode == "closed" else args.rates):
+        if args.mode == "closed":
+            step = run_closed(harness, mix, int(level), args.duration)
+        else:
+            step = run_open(harness, mix, level, args.duration)
+        steps.append(step)
+        print(f"{step[key]:>8} {step['requests']:>6} {step['errors']:>4} {step['throughput']:>8.2f} "
+              f"{step['p50']:>7.2f} {step['p95']:>7.2f} {step['p99']:>7.2f}")
+
+    saturation = find_saturation(steps, args.mode, args.saturation_gain, args.latency_factor)
+    print(f"饱和点：{key}={saturation['level']}（{saturation['reason']}）")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"mode": args.mode, "args": vars(args), "steps": steps, "saturation": saturation,
+                       "stages": hedger.metrics()}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+__all__ = ['LoadHarness', 'LatencyModel', 'QueryMix', 'run_closed', 'run_open', 'find_saturation']
+
+
+if __name__ == "__main__":
+    main()
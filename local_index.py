@@ -0,0 +1,176 @@
+"""
+基于切片产物的本地只读向量索引
+
+LocalVectorIndex 以内存映射方式打开 artifacts/ 下的切片产物，暴力计算余弦相似度。
+IndexWorkerPool 启动多个工作进程，每个进程映射同一组文件：嵌入矩阵和块文本由操作系统
+页缓存共享，进程数增加时内存基本不变，打分等CPU密集的工作不再受单个进程GIL的限制。
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
+import numpy as np
+from chunk_artifact import ChunkArtifact, MANIFEST_FILE
+
+logger = logging.getLogger(__name__)
+
+
+def find_artifacts(root: str) -> List[str]:
+    """列出目录下的所有切片产物"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        os.path.join(root, name) for name in os.listdir(root)
+        if os.path.exists(os.path.join(root, name, MANIFEST_FILE))
+    )
+
+
+class LocalVectorIndex:
+    def __init__(self, artifact_paths: List[str]):
+        """
+        打开一组切片产物作为只读索引
+
+        Args:
+            artifact_paths: 切片产物目录列表，向量维度必须一致
+        """
+        self.artifacts = [ChunkArtifact(path) for path in artifact_paths]
+        dims = {artifact.dim for artifact in self.artifacts if len(artifact)}
+        if len(dims) > 1:
+            raise ValueError(f"切片产物的向量维度不一致：{sorted(dims)}")
+        # 每个进程只保存范数和ID到位置的映射，嵌入矩阵本身保持内存映射
+        self.norms = [np.linalg.norm(artifact.embeddings, axis=1) for artifact in self.artifacts]
+        self.positions = {
+            chunk_id: (a, i)
+            for a, artifact in enumerate(self.artifacts)
+            for i, chunk_id in enumerate(artifact.ids)
+        }
+        self._chunk_types = None
+        logger.info("本地索引已加载：%d 个产物，%d 个块", len(self.artifacts), len(self.positions))
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def _types(self, a: int) -> np.ndarray:
+        """第a个产物中每个块的chunk_type，第一次按类型过滤时读取"""
+        if self._chunk_types is None:
+            self._chunk_types = [
+                np.array([artifact.get(i)["metadata"].get("chunk_type", "") for i in range(len(artifact))], dtype=object)
+                for artifact in self.artifacts
+            ]
+        return self._chunk_types[a]
+
+    def _hit(self, a: int, i: int, score: float, include_values: bool) -> Dict[str, Any]:
+        record = self.artifacts[a].get(i)
+        hit = {'id': record["id"], 'score': score, 'metadata': {**record["metadata"], "text": record["text"]}}
+        if include_values:
+            hit['values'] = np.array(self.artifacts[a].embeddings[i])
+        return hit
+
+    def query(self, vector, top_k: int = 5, include_values: bool = False,
+              chunk_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        按余弦相似度返回top_k个块
+
+        Args:
+            vector: 查询向量
+            top_k: 返回结果数量
+            include_values: 是否同时返回块的向量
+            chunk_types: 只在这些类型的块中检索，None为不限制
+
+        Returns:
+            List[Dict[str, Any]]: 与 VectorSearch.query_index 相同格式的结果，metadata中包含文本
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+        candidates = []
+        for a, artifact in enumerate(self.artifacts):
+            if not len(artifact):
+                continue
+            norms = np.where(self.norms[a] == 0, 1.0, self.norms[a])
+            if chunk_types:
+                # 只对选中类型的块打分
+                rows = np.flatnonzero(np.isin(self._types(a), chunk_types))
+                if not len(rows):
+                    continue
+                scores = artifact.embeddings[rows] @ query / (norms[rows] * query_norm)
+            else:
+                rows = None
+                scores = artifact.embeddings @ query / (norms * query_norm)
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates.extend((float(scores[i]), a, int(i if rows is None else rows[i])) for i in top)
+        candidates.sort(reverse=True)
+        return [self._hit(a, i, score, include_values) for score, a, i in candidates[:top_k]]
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        按块ID读取文本
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 块ID -> {"text", "metadata"}
+        """
+        docs = {}
+        for chunk_id in ids:
+            if chunk_id in self.positions:
+                a, i = self.positions[chunk_id]
+                record = self.artifacts[a].get(i)
+                docs[chunk_id] = {"text": record["text"], "metadata": record["metadata"]}
+        return docs
+
+    def close(self):
+        for artifact in self.artifacts:
+            artifact.close()
+
+
+# 工作进程中的索引，由 _init_worker 在进程启动时打开
+_worker_index = None
+
+
+def _init_worker(artifact_paths: List[str]):
+    global _worker_index
+    _worker_index = LocalVectorIndex(artifact_paths)
+
+
+def _worker_query(vector, top_k: int, include_values: bool, chunk_types: Optional[List[str]]) -> List[Dict[str, Any]]:
+    return _worker_index.query(vector, top_k, include_values, chunk_types)
+
+
+def _worker_fetch(ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    return _worker_index.fetch(ids)
+
+
+class IndexWorkerPool:
+    def __init__(self, artifact_paths: List[str], workers: int):
+        """
+        多进程本地索引，请求分发到各个工作进程
+
+        Args:
+            artifact_paths: 切片产物目录列表
+            workers: 工作进程数
+        """
+        # Streamlit等宿主进程中有多个线程，使用spawn避免fork继承锁的状态
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(list(artifact_paths),)
+        )
+        self.workers = workers
+        logger.info("本地索引工作进程池已启动：%d 个进程", workers)
+
+    def query(self, vector, top_k: int = 5, include_values: bool = False,
+              chunk_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """与 LocalVectorIndex.query 相同，在工作进程中执行"""
+        return self.executor.submit(_worker_query, list(vector), top_k, include_values, chunk_types).result()
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """与 LocalVectorIndex.fetch 相同，在工作进程中执行"""
+        return self.executor.submit(_worker_fetch, list(ids)).result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+__all__ = ['LocalVectorIndex', 'IndexWorkerPool', 'find_artifacts']
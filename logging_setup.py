@@ -0,0 +1,136 @@
+"""
+统一的日志配置：调用方线程只把日志记录放入队列，格式化和写入由后台线程完成
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from config import (
+    LOG_FORMAT,
+    LOG_FILE,
+    LOG_LEVEL,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_MAX_MESSAGE_LENGTH,
+    LOG_SAMPLE_RATE
+)
+
+# 日志记录中的标准属性，其余属性视为extra字段写入JSON
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+def truncate(text: str, limit: int = LOG_MAX_MESSAGE_LENGTH) -> str:
+    """截断过长的日志内容，保留开头并标注原始长度"""
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}...（已截断，共 {len(text)} 字符）"
+
+
+class JsonFormatter(logging.Formatter):
+    """将日志记录格式化为单行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": truncate(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                if isinstance(value, (int, float, bool, dict, list)) or value is None:
+                    payload[key] = value
+                else:
+                    payload[key] = truncate(str(value))
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TruncatingFormatter(logging.Formatter):
+    """控制台使用的文本格式，同样截断过长的内容"""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = truncate(record.message)
+        return super().formatMessage(record)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    不在调用方线程中格式化日志
+
+    标准QueueHandler在入队前就会拼接消息参数，这里把拼接推迟到后台线程，
+    调用方只承担一次入队的开销。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """按比例采样INFO及以下级别的日志，WARNING及以上级别全部保留"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+def setup_logging(log_file: str = LOG_FILE, level: str = LOG_LEVEL, console: bool = True):
+    """
+    配置根日志记录器，重复调用时不会重复添加处理器
+
+    Args:
+        log_file: JSON日志文件路径，为空时不写文件
+        level: 日志级别
+        console: 是否同时输出到控制台
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handlers = []
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(TruncatingFormatter(LOG_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    # 移除第三方库或basicConfig留下的处理器，避免同一条日志输出多次
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台写日志线程，并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+__all__ = ['setup_logging', 'shutdown_logging', 'truncate']
@@ -0,0 +1,48 @@
+from typing import List
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(query_vector, candidate_vectors, k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    最大边际相关性（MMR）选择：兼顾与查询的相关性和已选结果之间的差异
+
+    每一步选择 lambda * sim(查询, 候选) - (1 - lambda) * max sim(候选, 已选) 最大的候选，
+    与已选结果的最大相似度逐步增量更新，每步只做一次矩阵向量乘法。
+
+    Args:
+        query_vector: 查询向量，形状 (dim,)
+        candidate_vectors: 候选向量，形状 (n, dim)
+        k: 选择数量
+        lambda_mult: 相关性权重，1.0为只按相关性排序，0.0为只考虑差异
+
+    Returns:
+        List[int]: 选中的候选序号，按选择顺序排列
+    """
+    candidates = _normalize(np.asarray(candidate_vectors, dtype=np.float32))
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    query = _normalize(np.asarray(query_vector, dtype=np.float32))
+    relevance = candidates @ query
+    k = min(k, n)
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = candidates @ candidates[selected[0]]
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, candidates @ candidates[best], out=max_similarity)
+    return selected
+
+
+__all__ = ['mmr_select']
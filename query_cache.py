@@ -0,0 +1,185 @@
+"""
+嵌入与答案缓存
+
+缓存保存在SQLite文件中，多个进程（应用、预热任务）共享；每个进程前面各有一层内存LRU。
+    embeddings  (嵌入模型及接口地址, 文本) -> float32向量，嵌入是确定的，不过期
+    answers     (索引版本, 处理流程, 规范化的问题) -> 答案，超过 QUERY_CACHE_TTL 后失效
+
+答案按索引版本区分，切换版本后自然不再命中旧答案；同一个问题在不同处理流程（如拆解和向量检索）下的答案不同，
+也分别缓存。cache_warmer.py 可以在切换前为新版本预热。
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any
+import numpy as np
+from config import QUERY_CACHE_PATH, QUERY_CACHE_MEMORY_SIZE, QUERY_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, text)
+);
+CREATE TABLE IF NOT EXISTS answers (
+    version TEXT NOT NULL,
+    query TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    route TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (version, route, query)
+);
+"""
+
+# 出错时返回的提示不写入缓存
+_ERROR_PREFIXES = ("抱歉", "错误：", "处理查询时出现错误")
+_TRAILING_PUNCTUATION = re.compile(r'[\s?？。!！.]+$')
+
+
+def normalize_query(query: str) -> str:
+    """答案缓存的键：去掉首尾空白和句末标点，合并连续空白"""
+    return _TRAILING_PUNCTUATION.sub('', re.sub(r'\s+', ' ', query.strip()))
+
+
+def is_cacheable(answer: str) -> bool:
+    """出错提示和空回答不缓存"""
+    return bool(answer and answer.strip()) and not answer.startswith(_ERROR_PREFIXES)
+
+
+class QueryCache:
+    def __init__(self, path: str = QUERY_CACHE_PATH, memory_size: int = QUERY_CACHE_MEMORY_SIZE,
+                 answer_ttl: float = QUERY_CACHE_TTL):
+        """
+        嵌入与答案缓存，首次使用时才打开数据库
+
+        Args:
+            path: SQLite数据库路径，为空时不启用缓存
+            memory_size: 每类缓存在内存LRU中保留的条数
+            answer_ttl: 答案的有效期（秒），0为不过期
+        """
+        self.path = path
+        self.memory_size = memory_size
+        self.answer_ttl = answer_ttl
+        self._conn = None
+        self._memory = {"embeddings": OrderedDict(), "answers": OrderedDict()}
+        self._lock = threading.Lock()
+        self.hits = {"embeddings": 0, "answers": 0}
+        self.misses = {"embeddings": 0, "answers": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            # WAL模式下预热任务写入时应用仍可读取
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # 旧版本的答案表不按处理流程区分，其中的答案无法确定流程，直接丢弃
+            keys = [row[1] for row in self._conn.execute("PRAGMA table_info(answers)") if row[5]]
+            if keys and "route" not in keys:
+                logger.warning("答案缓存的表结构已变化，清空旧的答案缓存")
+                self._conn.execute("DROP TABLE answers")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _remember(self, table: str, key, value):
+        memory = self._memory[table]
+        memory[key] = value
+        memory.move_to_end(key)
+        while len(memory) > self.memory_size:
+            memory.popitem(last=False)
+
+    def _lookup(self, table: str, key, sql: str, params) -> Optional[tuple]:
+        memory = self._memory[table]
+        with self._lock:
+            if key in memory:
+                memory.move_to_end(key)
+                return memory[key]
+            try:
+                row = self._connection().execute(sql, params).fetchone()
+            except sqlite3.Error as e:
+                logger.error("读取查询缓存出错：%s", e)
+                row = None
+            if row is not None:
+                self._remember(table, key, row)
+            return row
+
+    def _count(self, table: str, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits[table] += 1
+            else:
+                self.misses[table] += 1
+
+    def _store(self, table: str, key, row: tuple, sql: str, params):
+        with self._lock:
+            self._remember(table, key, row)
+            try:
+                conn = self._connection()
+                conn.execute(sql, params)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error("写入查询缓存出错：%s", e)
+
+    def get_embedding(self, model: str, text: str) -> Optional[List[float]]:
+        """读取缓存的嵌入，未命中时返回None；model应能区分产生向量的服务（见 VectorSearch.embedding_cache_key）"""
+        if not self.enabled:
+            return None
+        row = self._lookup("embeddings", (model, text),
+                           "SELECT vector FROM embeddings WHERE model = ? AND text = ?", (model, text))
+        self._count("embeddings", row is not None)
+        return np.frombuffer(row[0], dtype=np.float32).tolist() if row else None
+
+    def put_embedding(self, model: str, text: str, vector: List[float]):
+        """写入嵌入"""
+        if not self.enabled:
+            return
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        self._store("embeddings", (model, text), (blob,),
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", (model, text, blob))
+
+    def get_answer(self, version: str, query: str, route: str) -> Optional[str]:
+        """读取某个索引版本和处理流程下缓存的答案，未命中或已过期时返回None"""
+        if not self.enabled:
+            return None
+        key = normalize_query(query)
+        row = self._lookup("answers", (version, route, key),
+                           "SELECT answer, created FROM answers WHERE version = ? AND route = ? AND query = ?",
+                           (version, route, key))
+        if row is not None and self.answer_ttl and time.time() - row[1] > self.answer_ttl:
+            row = None
+        self._count("answers", row is not None)
+        return row[0] if row else None
+
+    def put_answer(self, version: str, query: str, answer: str, route: str):
+        """写入答案，出错提示不写入"""
+        if not self.enabled or not is_cacheable(answer):
+            return
+        key = normalize_query(query)
+        created = time.time()
+        self._store("answers", (version, route, key), (answer, created),
+                    "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)", (version, key, answer, route, created))
+
+    def stats(self) -> Dict[str, Any]:
+        """各类缓存的命中数、未命中数和命中率"""
+        with self._lock:
+            return {
+                table: {"hits": self.hits[table], "misses": self.misses[table],
+                        "hit_rate": self.hits[table] / (self.hits[table] + self.misses[table])
+                        if self.hits[table] + self.misses[table] else 0.0}
+                for table in self.hits
+            }
+
+
+query_cache = QueryCache()
+
+
+__all__ = ['query_cache', 'QueryCache', 'normalize_query', 'is_cacheable']
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import logging
 from vector_search import VectorSearch
 from config import (
@@ -6,31 +6,22 @@ from config import (
     OPENAI_API_KEY,
     PINECONE_API_KEY,
     PINECONE_INDEX_NAME,
-    LOG_FORMAT,
-    LOG_LEVEL,
     LLM_MODEL,
-    RERANK_MODEL
+    RERANK_MODEL,
+    SPECULATIVE_DEADLINE,
+    STAGE_DEADLINES
 )
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import os
-from openai import OpenAI
+import threading
+import time
+from functools import cached_property
+import contextvars
+from usage_tracker import record_openai
+from request_profiler import traced
 
-# 配置日志记录器
 logger = logging.getLogger(__name__)
-logger.setLevel(LOG_LEVEL)
-
-# 创建控制台处理器
-console_handler = logging.StreamHandler()
-console_handler.setLevel(LOG_LEVEL)
-
-# 设置日志格式
-formatter = logging.Formatter(LOG_FORMAT)
-console_handler.setFormatter(formatter)
-
-# 添加处理器到日志记录器
-logger.addHandler(console_handler)
 
 class QueryExpander:
     def __init__(self, openai_api_key=OPENAI_API_KEY, temperature=0.7):
@@ -41,7 +32,7 @@ class QueryExpander:
             openai_api_key: OpenAI API key
             temperature: LLM的温度参数
         """
-        self.client = OpenAI(api_key=openai_api_key)
+        self._openai_api_key = openai_api_key
         self.temperature = temperature
         self.vector_search = VectorSearch(
             pinecone_api_key=PINECONE_API_KEY,
@@ -49,64 +40,50 @@ class QueryExpander:
         )
         logger.info("QueryExpander初始化完成")
         self.cache = {}  # 用于缓存查询结果
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")  # 推测检索线程池
+
+    @cached_property
+    def client(self):
+        """OpenAI客户端，首次扩展查询时创建"""
+        from openai import OpenAI
+        return OpenAI(api_key=self._openai_api_key, timeout=STAGE_DEADLINES["generate"])
         
-    def expand_query(self, query: str) -> str:
+    def expand_query(self, query: str, cancel: Optional[threading.Event] = None) -> str:
         """
         扩展查询并选择最契合用户意图的查询
         
         Args:
             query: 原始查询
+            cancel: 取消标志，被设置后不再发起后续的LLM调用（推测检索超时时使用）
             
         Returns:
-            str: 最契合用户意图的扩展查询
+            str: 最契合用户意图的扩展查询；出错或被取消时返回原始查询
         """
         try:
             if not query.strip():
                 return ""
                 
-            logger.info(f"开始扩展查询：{query}")
+            logger.info("开始扩展查询：%s", query)
+            # 先用词表把别名规范为规则原文的术语，LLM生成的变体也会沿用这些写法
+            normalized = self.vector_search.lexicon.expand(query)
             
             # 第一步：生成多个查询变体
-            expand_prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是一个专业的战锤40K规则专家。请根据用户的查询生成多个相关的查询变体。
-                要求：
-                1. 每个变体应该关注查询的不同方面
-                2. 变体之间应该相互独立
-                3. 变体应该足够具体，便于检索
-                4. 保持原始查询的意图
-                5. 返回3-5个变体
-                6. 每个变体应该是一个完整的问句"""),
-                ("user", f"请为以下查询生成多个变体：{query}")
-            ])
-            
             expand_response = self.client.chat.completions.create(
                 model=LLM_MODEL,
-                messages=[{"role": "user", "content": f"请为以下查询生成多个变体：{query}"}],
+                messages=[{"role": "user", "content": f"请为以下查询生成多个变体：{normalized}"}],
                 temperature=self.temperature
             )
+            record_openai("expand", expand_response, LLM_MODEL)
             expanded_queries = [q.strip() for q in expand_response.choices[0].message.content.split('\n') if q.strip()]
-            logger.info(f"生成的查询变体：{expanded_queries}")
+            logger.info("生成的查询变体：%s", expanded_queries)
+            if cancel is not None and cancel.is_set():
+                logger.info("查询扩展已取消，跳过变体选择")
+                return query
             
             # 第二步：选择最契合用户意图的查询
-            select_prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是一个专业的战锤40K规则专家。请从多个查询变体中选择最契合用户原始意图的一个。
-                要求：
-                1. 仔细分析原始查询的意图
-                2. 评估每个变体与原始意图的契合度
-                3. 选择最准确、最全面的变体
-                4. 如果变体都不够理想，可以适当修改选中的变体
-                5. 只返回最终选择的查询，不要包含其他内容"""),
-                ("user", f"""原始查询：{query}
-
-查询变体：
-{chr(10).join([f"{i+1}. {q}" for i, q in enumerate(expanded_queries)])}
-
-请选择最契合原始查询意图的变体，并返回。""")
-            ])
-            
             select_response = self.client.chat.completions.create(
                 model=LLM_MODEL,
-                messages=[{"role": "user", "content": f"""原始查询：{query}
+                messages=[{"role": "user", "content": f"""原始查询：{normalized}
 
 查询变体：
 {chr(10).join([f"{i+1}. {q}" for i, q in enumerate(expanded_queries)])}
@@ -114,14 +91,98 @@ class QueryExpander:
 请选择最契合原始查询意图的变体，并返回。"""}],
                 temperature=self.temperature
             )
+            record_openai("select", select_response, LLM_MODEL)
             selected_query = select_response.choices[0].message.content.strip()
-            logger.info(f"选择的最契合查询：{selected_query}")
+            logger.info("选择的最契合查询：%s", selected_query)
             
             return selected_query
             
         except Exception as e:
-            logger.error(f"查询扩展出错：{str(e)}")
-            return query  # 如果出错，返回原始查询
+            logger.error("查询扩展出错：%s", e)
+            return query  # 如果出错，返回原始查询（未经词表规范），推测检索据此跳过二次检索
+
+    def speculative_search(self, query: str, top_k: int = 5, deadline: float = SPECULATIVE_DEADLINE) -> List[Dict[str, Any]]:
+        """
+        推测检索：查询扩展与原始查询的检索并行进行
+        
+        扩展在期限内完成时，用扩展查询再检索一次并与原始查询的结果合并；
+        扩展超时或失败时，直接用原始查询的结果生成答案，不再等待。
+        
+        Args:
+            query: 原始查询
+            top_k: 返回结果数量
+            deadline: 检索阶段的延迟期限（秒）
+            
+        Returns:
+            List[Dict[str, Any]]: 搜索结果列表
+        """
+        if not query.strip():
+            return []
+            
+        start = time.monotonic()
+        # 在当前上下文中执行，后台线程的调用也计入本次查询的用量和请求分析
+        raw_future = self.executor.submit(contextvars.copy_context().run, traced(self.vector_search.retrieve), query, top_k)
+        cancel = threading.Event()
+        expand_future = self.executor.submit(contextvars.copy_context().run, traced(self.expand_query), query, cancel)
+        
+        expanded_query = None
+        try:
+            expanded_query = expand_future.result(timeout=deadline)
+        except FutureTimeoutError:
+            # 尚未开始的扩展直接取消，已经开始的在第一次LLM调用返回后停止，不再产生费用
+            cancel.set()
+            expand_future.cancel()
+            logger.warning("查询扩展超过 %s 秒，使用原始查询的检索结果", deadline)
+            
+        try:
+            raw_matches = raw_future.result()
+        except Exception as e:
+            logger.error("原始查询检索出错：%s", e)
+            raw_matches = []
+            
+        matches = raw_matches
+        answer_query = query
+        # expand_query出错时返回原始查询，此时无需再检索
+        if expanded_query and expanded_query.strip() != query.strip():
+            expanded_future = self.executor.submit(contextvars.copy_context().run,
+                                                   traced(self.vector_search.retrieve), expanded_query, top_k)
+            # 原始查询没有结果时只能等待扩展查询的结果
+            remaining = max(deadline - (time.monotonic() - start), 0) if raw_matches else None
+            try:
+                expanded_matches = expanded_future.result(timeout=remaining)
+                matches = self._merge_matches(expanded_matches, raw_matches, top_k)
+                answer_query = expanded_query
+            except FutureTimeoutError:
+                logger.warning("扩展查询的检索超过期限，使用原始查询的检索结果")
+            except Exception as e:
+                logger.error("扩展查询检索出错：%s", e)
+        logger.info("推测检索完成，耗时 %.2f 秒，使用查询：%s", time.monotonic() - start, answer_query)
+        
+        try:
+            integrated_answer = self.vector_search.synthesize(answer_query, matches)
+            return [{'text': integrated_answer, 'score': 1.0}]
+        except Exception as e:
+            logger.error("生成答案时出错：%s", e)
+            return []
+
+    @staticmethod
+    def _merge_matches(primary: List[Dict[str, Any]], secondary: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        合并两组检索结果，primary优先，按id去重
+        
+        Args:
+            primary: 优先保留的结果
+            secondary: 用于补足数量的结果
+            top_k: 合并后的结果数量
+            
+        Returns:
+            List[Dict[str, Any]]: 合并后的结果
+        """
+        merged = {}
+        for match in primary + secondary:
+            if match['id'] not in merged:
+                merged[match['id']] = match
+        return list(merged.values())[:top_k]
 
     def rerank_results(self, query: str, results: List[Dict[str, Any]], top_k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -179,19 +240,19 @@ class QueryExpander:
                     "integrated_answer": "请输入有效的查询。"
                 }
                 
-            logger.info(f"开始处理查询：{query}")
+            logger.info("开始处理查询：%s", query)
             
             # 扩展查询
             expanded_query = self.expand_query(query)
-            logger.info(f"扩展后的查询：{expanded_query}")
+            logger.info("扩展后的查询：%s", expanded_query)
             
             # 执行向量搜索
             results = self.vector_search.search(expanded_query)
-            logger.info(f"向量搜索结果数量：{len(results)}")
+            logger.info("向量搜索结果数量：%s", len(results))
             
             # 重排序结果
             reranked_results = self.rerank_results(expanded_query, results)
-            logger.info(f"重排序后结果数量：{len(reranked_results)}")
+            logger.info("重排序后结果数量：%s", len(reranked_results))
             
             # 整合结果
             integrated_answer = self.vector_search.integrate_results(query, reranked_results)
@@ -203,7 +264,7 @@ class QueryExpander:
             }
             
         except Exception as e:
-            logger.error(f"处理查询时出错：{str(e)}")
+            logger.error("处理查询时出错：%s", e)
             return {
                 "results": [],
                 "integrated_answer": f"处理查询时出错：{str(e)}"
@@ -225,7 +286,7 @@ class QueryExpander:
             
             # 验证搜索结果
             if not search_results:
-                logger.warning(f"未找到与查询 '{sub_query}' 相关的资料")
+                logger.warning("未找到与查询 '%s' 相关的资料", sub_query)
                 return "未找到相关规则信息"
             
             # 准备参考资料文本
@@ -235,22 +296,16 @@ class QueryExpander:
                     reference_text += f"- {result['text']}\n"
             
             if not reference_text.strip():
-                logger.warning(f"搜索结果中没有有效的文本内容: {search_results}")
+                logger.warning("搜索结果中没有有效的文本内容: %s", search_results)
                 return "未找到相关规则信息"
             
             # 使用LLM生成回答
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是一个专业的战锤40K规则分析专家。请根据提供的参考资料，回答用户的问题。
-                回答要准确、专业，并引用相关的规则来源。
-                如果参考资料中没有相关信息，请直接说明"未找到相关规则信息"。"""),
-                ("user", f"问题：{sub_query}\n\n参考资料：\n{reference_text}")
-            ])
-            
             response = self.client.chat.completions.create(
                 model=LLM_MODEL,
                 messages=[{"role": "user", "content": f"问题：{sub_query}\n\n参考资料：\n{reference_text}"}],
                 temperature=self.temperature
             )
+            record_openai("sub_query", response, LLM_MODEL)
             return response.choices[0].message.content
             
         except Exception as e:
@@ -269,28 +324,16 @@ class QueryExpander:
         Returns:
             str: 最终答案
         """
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """你是一个专业的战锤40K规则分析专家。请根据提供的查询结果，合成一个完整的答案。
-            答案应该：
-            1. 直接回答用户的问题
-            2. 整合所有相关的信息，用具体的结果而不是模糊的概述来回答
-            3. 保持逻辑性和连贯性
-            4. 引用相关的规则来源
-            5. 保持专业性和准确性"""),
-            ("user", f"""原始问题：{original_query}
-
-查询结果：
-{chr(10).join([f"问题：{query}\n回答：{result}\n" for query, result in query_results.items()])}""")
-        ])
-        
+        results_text = chr(10).join([f"问题：{query}{chr(10)}回答：{result}{chr(10)}" for query, result in query_results.items()])
         response = self.client.chat.completions.create(
             model=LLM_MODEL,
             messages=[{"role": "user", "content": f"""原始问题：{original_query}
 
 查询结果：
-{chr(10).join([f"问题：{query}\n回答：{result}\n" for query, result in query_results.items()])}"""}],
+{results_text}"""}],
             temperature=self.temperature
         )
+        record_openai("final_synthesis", response, LLM_MODEL)
         return response.choices[0].message.content
     
     def clear_cache(self):
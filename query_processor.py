@@ -1,34 +1,51 @@
 from typing import Dict, List, Optional
 from vector_search import VectorSearch
+import json
 import logging
+from functools import cached_property
 from config import (
     DEFAULT_TEMPERATURE,
     OPENAI_API_KEY,
     PINECONE_API_KEY,
-    PINECONE_INDEX_NAME
+    PINECONE_INDEX_NAME,
+    STAGE_DEADLINES
 )
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from usage_tracker import record_langchain, query_budget_exceeded
 
 logger = logging.getLogger(__name__)
 
+
+def _chat_prompt(messages):
+    # langchain只在拆解流程中使用，第一次拆解时才导入
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages(messages)
+
+
 class QueryProcessor:
-    def __init__(self, temperature: float = DEFAULT_TEMPERATURE):
+    def __init__(self, temperature: float = DEFAULT_TEMPERATURE, vector_search: Optional[VectorSearch] = None):
         """
         初始化查询处理器
         
         Args:
             temperature: 生成温度参数
+            vector_search: 复用已有的向量搜索实例，默认新建
         """
-        self.vector_search = VectorSearch(
+        self.vector_search = vector_search or VectorSearch(
             pinecone_api_key=PINECONE_API_KEY,
             index_name=PINECONE_INDEX_NAME
         )
-        self.llm = ChatOpenAI(
-            temperature=temperature,
-            openai_api_key=OPENAI_API_KEY
-        )
+        self.temperature = temperature
         self.cache = {}  # 用于缓存子查询结果
+
+    @cached_property
+    def llm(self):
+        """ChatOpenAI实例，首次拆解时创建"""
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            temperature=self.temperature,
+            openai_api_key=OPENAI_API_KEY,
+            timeout=STAGE_DEADLINES["generate"]
+        )
         
     def process_query(self, query: str) -> str:
         """
@@ -46,8 +63,8 @@ class QueryProcessor:
                 return "错误：请输入有效的查询内容"
             
             # 1. 拆解查询
-            decomposition = self.decomposer.decompose_query(query)
-            logger.info(f"查询拆解结果: {decomposition}")
+            decomposition = self.decompose_query(query)
+            logger.info("查询拆解结果: %s", decomposition)
             
             # 检查拆解结果是否为空
             if not any(decomposition.values()):
@@ -58,32 +75,32 @@ class QueryProcessor:
             
             # 处理核心概念
             for concept in decomposition['core_concepts']:
-                if concept not in self.cache:
+                if concept not in self.cache and not self._budget_exhausted(concept):
                     result = self._process_sub_query(concept)
                     if result:
                         self.cache[concept] = result
                     else:
-                        logger.warning(f"无法获取概念 '{concept}' 的结果")
+                        logger.warning("无法获取概念 '%s' 的结果", concept)
                 sub_results[concept] = self.cache.get(concept, "未找到相关信息")
             
             # 处理分析步骤
             for step in decomposition['analysis_steps']:
-                if step not in self.cache:
+                if step not in self.cache and not self._budget_exhausted(step):
                     result = self._process_sub_query(step)
                     if result:
                         self.cache[step] = result
                     else:
-                        logger.warning(f"无法获取步骤 '{step}' 的结果")
+                        logger.warning("无法获取步骤 '%s' 的结果", step)
                 sub_results[step] = self.cache.get(step, "未找到相关信息")
             
             # 处理关键规则
             for rule in decomposition['key_rules']:
-                if rule not in self.cache:
+                if rule not in self.cache and not self._budget_exhausted(rule):
                     result = self._process_sub_query(rule)
                     if result:
                         self.cache[rule] = result
                     else:
-                        logger.warning(f"无法获取规则 '{rule}' 的结果")
+                        logger.warning("无法获取规则 '%s' 的结果", rule)
                 sub_results[rule] = self.cache.get(rule, "未找到相关信息")
             
             # 3. 合成最终答案
@@ -95,6 +112,44 @@ class QueryProcessor:
             logger.error(error_msg)
             return error_msg
     
+    def decompose_query(self, query: str) -> Dict[str, List[str]]:
+        """
+        将复杂查询拆解为核心概念、分析步骤和关键规则
+        
+        Args:
+            query: 用户输入的查询
+            
+        Returns:
+            Dict[str, List[str]]: 包含core_concepts、analysis_steps、key_rules的字典
+        """
+        decomposition = {"core_concepts": [], "analysis_steps": [], "key_rules": []}
+        prompt = _chat_prompt([
+            ("system", """你是一个专业的战锤40K规则分析专家。请把用户的问题拆解为可以单独检索的子查询。
+            只返回JSON，格式为：
+            {{"core_concepts": ["..."], "analysis_steps": ["..."], "key_rules": ["..."]}}
+            core_concepts 为问题涉及的单位、武器或术语；analysis_steps 为按顺序判定所需的步骤；key_rules 为需要查阅的规则名称。"""),
+            ("user", "{query}")
+        ])
+        try:
+            response = self.llm.invoke(prompt.format_messages(query=query))
+            record_langchain("decompose", response)
+            content = response.content.strip()
+            # 去掉可能包裹JSON的代码块标记
+            content = content[content.find('{'):content.rfind('}') + 1]
+            parsed = json.loads(content)
+            for key in decomposition:
+                decomposition[key] = [str(item).strip() for item in parsed.get(key, []) if str(item).strip()]
+        except Exception as e:
+            logger.error("拆解查询时出错: %s", e)
+        return decomposition
+    
+    def _budget_exhausted(self, sub_query: str) -> bool:
+        # 本次查询已超出预算时跳过剩余子查询，直接用已有结果合成答案
+        if query_budget_exceeded():
+            logger.warning("查询费用已超出预算，跳过子查询：%s", sub_query)
+            return True
+        return False
+    
     def _process_sub_query(self, sub_query: str) -> str:
         """
         处理单个子查询
@@ -114,7 +169,7 @@ class QueryProcessor:
             
             # 验证搜索结果
             if not search_results:
-                logger.warning(f"未找到与查询 '{cleaned_query}' 相关的资料")
+                logger.warning("未找到与查询 '%s' 相关的资料", cleaned_query)
                 return "未找到相关规则信息"
             
             # 准备参考资料文本
@@ -126,11 +181,11 @@ class QueryProcessor:
                     reference_text += f"- {cleaned_text}\n"
             
             if not reference_text.strip():
-                logger.warning(f"搜索结果中没有有效的文本内容: {search_results}")
+                logger.warning("搜索结果中没有有效的文本内容: %s", search_results)
                 return "未找到相关规则信息"
             
             # 使用LLM生成回答
-            prompt = ChatPromptTemplate.from_messages([
+            prompt = _chat_prompt([
                 ("system", """你是一个专业的战锤40K规则分析专家。请根据提供的参考资料，回答用户的问题。
                 回答要准确、专业，并引用相关的规则来源。
                 如果参考资料中没有相关信息，请直接说明"未找到相关规则信息"。"""),
@@ -138,6 +193,7 @@ class QueryProcessor:
             ])
             
             response = self.llm.invoke(prompt.format_messages())
+            record_langchain("sub_query", response)
             return response.content
             
         except Exception as e:
@@ -157,7 +213,7 @@ class QueryProcessor:
         Returns:
             str: 最终答案
         """
-        prompt = ChatPromptTemplate.from_messages([
+        prompt = _chat_prompt([
             ("system", """你是一个专业的战锤40K规则分析专家。请根据提供的子查询结果，合成一个完整的答案。
             答案应该：
             1. 直接回答用户的问题
@@ -178,6 +234,7 @@ class QueryProcessor:
         ])
         
         response = self.llm.invoke(prompt.format_messages())
+        record_langchain("final_synthesis", response)
         return response.content
     
     def clear_cache(self):
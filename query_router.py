@@ -0,0 +1,105 @@
+import logging
+import re
+from typing import Dict, Any, Optional
+from datasheet_lookup import DatasheetLookup
+from usage_tracker import UsageTracker
+
+logger = logging.getLogger(__name__)
+
+# 路由结果
+ROUTE_LOOKUP = "lookup"        # 直接查数据卡，不调用LLM
+ROUTE_VECTOR = "vector"        # 原始查询直接向量检索
+ROUTE_EXPAND = "expand"        # LLM查询扩展后检索
+ROUTE_DECOMPOSE = "decompose"  # QueryProcessor拆解为子查询
+
+# 询问数据卡内容的关键词
+LOOKUP_KEYWORDS = re.compile(r'属性|数据卡|数据|武器|装备|关键词|技能|能力|分数|多少分|点数|profile|stats?', re.IGNORECASE)
+# 需要规则推理的标志词；问号和"什么"出现在大多数查询中，不作为推理的依据
+REASONING_MARKERS = re.compile(r'如果|假如|当[^，,。？?]*时|能否|能不能|可不可以|是否|会不会|为什么|怎么|怎样|如何|吗')
+# 需要多步计算或多条规则联合判定的标志词
+DECOMPOSE_MARKERS = re.compile(r'多少个|几个|几次|计算|期望|同时|并且|然后|之后|联合单位|对比|比较|分别')
+# 子句分隔符
+CLAUSE_SEPARATORS = re.compile(r'[，,；;。]')
+
+# 超出预算时的降级顺序
+CHEAPER_ROUTE = {ROUTE_DECOMPOSE: ROUTE_EXPAND, ROUTE_EXPAND: ROUTE_VECTOR}
+
+# 规则名查询的最大长度（字符）
+SHORT_QUERY_LENGTH = 12
+# 拆解查询的最小长度（字符）
+LONG_QUERY_LENGTH = 40
+
+
+class QueryRouter:
+    def __init__(self, datasheet_lookup: Optional[DatasheetLookup] = None):
+        """
+        初始化查询路由器，只使用本地启发式规则和词表匹配，不调用LLM
+
+        Args:
+            datasheet_lookup: 数据卡查询表，用于识别查询中的单位和武器
+        """
+        self.datasheet_lookup = datasheet_lookup
+
+    def route(self, query: str) -> Dict[str, Any]:
+        """
+        为查询选择处理流程
+
+        Args:
+            query: 用户查询
+
+        Returns:
+            Dict[str, Any]: {"route": 路由结果, "reason": 判定依据, "entities": 识别出的单位/武器名}
+        """
+        text = query.strip()
+        entities = []
+        if self.datasheet_lookup:
+            matches = self.datasheet_lookup.match_query(text)
+            entities = [u["name_zh"] for u in matches["units"]] + list({w["name"] for w in matches["weapons"]})
+
+        reasoning = REASONING_MARKERS.search(text)
+        decompose_hits = len(DECOMPOSE_MARKERS.findall(text))
+        clauses = len([c for c in CLAUSE_SEPARATORS.split(text) if c.strip()])
+
+        # 剔除实体名后剩余的文本越短，越像单纯的数据卡查询
+        remainder = text
+        for name in sorted(entities, key=len, reverse=True):
+            remainder = remainder.replace(name, "")
+        remainder = re.sub(r'[\s的是有哪些什么]', '', remainder)
+
+        if entities and not reasoning and (len(remainder) <= 4 or LOOKUP_KEYWORDS.search(remainder)):
+            decision = (ROUTE_LOOKUP, "数据卡实体且无推理")
+        elif decompose_hits and (len(entities) >= 2 or clauses >= 3 or len(text) >= LONG_QUERY_LENGTH):
+            decision = (ROUTE_DECOMPOSE, f"多步判定（标志词{decompose_hits}个，子句{clauses}个，实体{len(entities)}个）")
+        elif clauses >= 3 and len(text) >= LONG_QUERY_LENGTH:
+            decision = (ROUTE_DECOMPOSE, f"长查询（子句{clauses}个）")
+        elif len(text) <= SHORT_QUERY_LENGTH and not reasoning:
+            decision = (ROUTE_VECTOR, "短规则名查询")
+        else:
+            decision = (ROUTE_EXPAND, "默认扩展")
+
+        result = {"route": decision[0], "reason": decision[1], "entities": entities}
+        logger.info("查询路由：route=%s reason=%s entities=%s query=%s",
+                    result["route"], result["reason"], entities, text)
+        return result
+
+    @staticmethod
+    def apply_budget(route: str, usage_tracker: UsageTracker) -> str:
+        """
+        按预算降级处理流程：decompose -> expand -> vector
+
+        Args:
+            route: 选定的处理流程
+            usage_tracker: 用量统计
+
+        Returns:
+            str: 预算内的处理流程，最低降级到vector
+        """
+        original = route
+        while route in CHEAPER_ROUTE and not usage_tracker.within_budget(route):
+            route = CHEAPER_ROUTE[route]
+        if route != original:
+            logger.warning("超出费用预算，处理流程从 %s 降级为 %s", original, route)
+        return route
+
+
+__all__ = ['QueryRouter', 'ROUTE_LOOKUP', 'ROUTE_VECTOR', 'ROUTE_EXPAND', 'ROUTE_DECOMPOSE']
@@ -0,0 +1,223 @@
+"""
+按请求开启的采样分析
+
+被分析的请求在 profile_request 中执行：后台线程按固定间隔读取参与该请求的线程的调用栈，
+把采样间隔记为墙钟时间、把两次采样之间线程消耗的CPU时间记为CPU时间，分别累计到各自的调用栈上。
+等待网络的时间只出现在墙钟分析中，Python端的提示拼接、响应解析等同时出现在两份分析中。
+
+对冲执行器和推测检索的线程池通过 traced 包装任务，在调用方的上下文中运行时自动加入同一次分析。
+结果以折叠栈格式（"帧1;帧2;帧3 微秒数"）写入 PROFILE_DIR/<trace_id>.wall.folded 和 .cpu.folded，
+可以直接交给 flamegraph.pl、speedscope 或 inferno 生成火焰图。
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Callable
+from config import PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL, PROFILE_HEADER
+
+logger = logging.getLogger(__name__)
+
+_current_profile = contextvars.ContextVar("request_profile", default=None)
+
+
+def _cpu_clock(ident: int) -> Optional[int]:
+    # 其他线程的CPU时间只能通过线程时钟读取，不支持的平台只输出墙钟分析
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfile:
+    def __init__(self, trace_id: str, interval: float = PROFILE_INTERVAL, output_dir: str = PROFILE_DIR):
+        """
+        一次请求的采样分析
+
+        Args:
+            trace_id: 请求的追踪ID，用作输出文件名
+            interval: 采样间隔（秒）
+            output_dir: 输出目录
+        """
+        self.trace_id = trace_id
+        self.interval = interval
+        self.output_dir = output_dir
+        self.wall = Counter()  # 调用栈 -> 微秒
+        self.cpu = Counter()
+        self.samples = 0
+        self._threads = {}  # 线程ident -> [线程名, CPU时钟, 上次CPU时间, 引用计数]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{trace_id}", daemon=True)
+        self._last = None
+
+    def add_thread(self):
+        """把当前线程加入分析"""
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._threads:
+                self._threads[ident][3] += 1
+                return
+            clock = _cpu_clock(ident)
+            cpu = time.clock_gettime(clock) if clock is not None else 0.0
+            self._threads[ident] = [threading.current_thread().name, clock, cpu, 1]
+
+    def remove_thread(self):
+        """当前线程不再参与这次请求"""
+        ident = threading.get_ident()
+        with self._lock:
+            entry = self._threads.get(ident)
+            if entry is not None:
+                entry[3] -= 1
+                if entry[3] == 0:
+                    del self._threads[ident]
+
+    def start(self):
+        self._last = time.perf_counter()
+        self._sampler.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """读取一次所有参与线程的调用栈"""
+        now = time.perf_counter()
+        elapsed, self._last = now - self._last, now
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, entry in self._threads.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = f"{entry[0]};{_collapse(frame)}"
+                self.wall[stack] += int(elapsed * 1_000_000)
+                if entry[1] is not None:
+                    try:
+                        cpu = time.clock_gettime(entry[1])
+                    except OSError:
+                        continue
+                    self.cpu[stack] += int((cpu - entry[2]) * 1_000_000)
+                    entry[2] = cpu
+            self.samples += 1
+
+    def stop(self) -> Dict[str, Any]:
+        """
+        停止采样并写入折叠栈文件
+
+        Returns:
+            Dict[str, Any]: trace_id、采样数、墙钟/CPU总时间（秒）和输出文件路径
+        """
+        self._stop.set()
+        self._sampler.join()
+        self.sample()
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = {}
+        for kind, counter in (("wall", self.wall), ("cpu", self.cpu)):
+            path = os.path.join(self.output_dir, f"{self.trace_id}.{kind}.folded")
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, micros in counter.most_common():
+                    if micros > 0:
+                        f.write(f"{stack} {micros}\n")
+            paths[kind] = path
+        return {
+            "trace_id": self.trace_id,
+            "samples": self.samples,
+            "wall_seconds": sum(self.wall.values()) / 1_000_000,
+            "cpu_seconds": sum(self.cpu.values()) / 1_000_000,
+            "files": paths,
+        }
+
+
+def should_profile(flag: bool = False, headers: Optional[Dict[str, str]] = None,
+                   sample_rate: float = PROFILE_SAMPLE_RATE) -> bool:
+    """
+    判断这次请求是否需要分析
+
+    Args:
+        flag: 显式开启，如启动参数或URL参数
+        headers: 请求头，PROFILE_HEADER 为 1/true 时开启
+        sample_rate: 未显式开启时按该比例抽样
+
+    Returns:
+        bool: 是否分析
+    """
+    if flag:
+        return True
+    if headers and str(headers.get(PROFILE_HEADER, "")).lower() in ("1", "true", "yes"):
+        return True
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """当前请求的分析，未开启时返回None"""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_request(enabled: bool, trace_id: str = None):
+    """
+    在分析中执行一次请求，未开启时不产生任何开销
+
+    Args:
+        enabled: 是否分析，通常由 should_profile 决定
+        trace_id: 追踪ID，默认随机生成
+
+    Yields:
+        Optional[RequestProfile]: 本次请求的分析，未开启时为None
+    """
+    if not enabled or _current_profile.get() is not None:
+        yield _current_profile.get()
+        return
+    profile = RequestProfile(trace_id or uuid.uuid4().hex[:16])
+    token = _current_profile.set(profile)
+    profile.add_thread()
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.remove_thread()
+        _current_profile.reset(token)
+        result = profile.stop()
+        logger.info("请求分析 %s：墙钟 %.2f 秒，CPU %.2f 秒，%d 次采样，已写入 %s",
+                    result["trace_id"], result["wall_seconds"], result["cpu_seconds"],
+                    result["samples"], result["files"]["wall"], extra={"profile": result})
+
+
+def traced(fn: Callable) -> Callable:
+    """
+    包装提交到线程池的任务：在被分析请求的上下文中运行时，把执行任务的线程加入分析
+
+    需要与 contextvars.copy_context().run 一起使用，任务才能看到调用方的分析。
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        profile.add_thread()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.remove_thread()
+    return wrapper
+
+
+__all__ = ['profile_request', 'should_profile', 'current_profile', 'traced', 'RequestProfile']
@@ -0,0 +1,148 @@
+"""
+启动耗时基准：在全新的子进程中分别导入各个模块，测量导入耗时并检查加载了哪些重量级依赖
+
+应用、向量检索和查询扩展模块在导入和初始化时不应加载 langchain、openai 和 pinecone，
+这些依赖只在第一次真正调用模型或索引时才导入。每个目标重复测量 --repeat 次取中位数，
+超出 --budget 给定的毫秒数或加载了不该加载的依赖时以非零状态退出，可以放在CI中防止回退。
+
+用法：
+    python startup_benchmark.py
+    python startup_benchmark.py --repeat 10 --budget app=1500 --budget pipeline=2000
+    python startup_benchmark.py --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Dict, Any
+
+# 导入或初始化时不应加载的依赖
+HEAVY_MODULES = ["langchain_openai", "langchain_core", "langchain", "openai", "pinecone"]
+
+# 目标名 -> (子进程中执行的代码, 是否检查重量级依赖)
+TARGETS = {
+    "config": ("import config", False),
+    "vector_search": ("import vector_search", True),
+    "query_expander": ("import query_expander", True),
+    "query_processor": ("import query_processor", True),
+    "conversation": ("import conversation", True),
+    "app": ("import app", True),
+    # 创建处理流程（应用第一次请求前的初始化），客户端应推迟到第一次调用时才创建
+    "pipeline": ("from query_expander import QueryExpander\n"
+                 "from query_router import QueryRouter\n"
+                 "processor = QueryExpander()\n"
+                 "QueryRouter(processor.vector_search.datasheet_lookup)", True),
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec(compile({code!r}, "<startup>", "exec"))
+seconds = time.perf_counter() - start
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+def measure(target: str, repeat: int = 5) -> Dict[str, Any]:
+    """
+    在全新的子进程中测量一个目标
+
+    Args:
+        target: TARGETS 中的目标名
+        repeat: 重复次数
+
+    Returns:
+        Dict[str, Any]: 中位数/最小/最大耗时（毫秒）、加载的重量级依赖和错误信息
+    """
+    code, check_heavy = TARGETS[target]
+    probe = _PROBE.format(code=code, heavy=HEAVY_MODULES)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    timings, heavy = [], set()
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", probe], cwd=cwd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {"target": target, "error": lines[-1] if lines else f"退出状态 {proc.returncode}"}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"] * 1000)
+        heavy.update(result["heavy"])
+    return {
+        "target": target,
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+        "heavy": sorted(heavy) if check_heavy else [],
+    }
+
+
+def check(results: List[Dict[str, Any]], budgets: Dict[str, float]) -> List[str]:
+    """
+    检查测量结果，返回所有违规项
+
+    Args:
+        results: measure 的结果列表
+        budgets: 目标名 -> 毫秒上限
+    """
+    problems = []
+    for result in results:
+        target = result["target"]
+        if "error" in result:
+            problems.append(f"{target}：导入失败（{result['error']}）")
+            continue
+        if result["heavy"]:
+            problems.append(f"{target}：加载了 {', '.join(result['heavy'])}")
+        budget = budgets.get(target)
+        if budget is not None and result["median_ms"] > budget:
+            problems.append(f"{target}：{result['median_ms']:.0f} ms 超出预算 {budget:.0f} ms")
+    return problems
+
+
+def _parse_budget(value: str):
+    target, _, ms = value.partition("=")
+    if target not in TARGETS or not ms:
+        raise argparse.ArgumentTypeError(f"预算格式为 目标=毫秒，目标为 {', '.join(TARGETS)} 之一")
+    return target, float(ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量各模块的导入耗时并检查重量级依赖')
+    parser.add_argument('targets', nargs='*', default=list(TARGETS), help='要测量的目标，默认全部')
+    parser.add_argument('--repeat', type=int, default=5, help='每个目标的重复次数')
+    parser.add_argument('--budget', type=_parse_budget, action='append', default=[],
+                        help='耗时上限，如 app=1500（毫秒），可以指定多次')
+    parser.add_argument('--output', type=str, default=None, help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    unknown = [target for target in args.targets if target not in TARGETS]
+    if unknown:
+        parser.error(f"未知的目标：{', '.join(unknown)}")
+
+    results = []
+    for target in args.targets:
+        result = measure(target, args.repeat)
+        results.append(result)
+        if "error" in result:
+            print(f"{target:<16} 失败：{result['error']}")
+        else:
+            heavy = f"  加载了 {', '.join(result['heavy'])}" if result["heavy"] else ""
+            print(f"{target:<16} {result['median_ms']:>8.1f} ms  "
+                  f"({result['min_ms']:.1f} - {result['max_ms']:.1f}){heavy}")
+
+    problems = check(results, dict(args.budget))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"results": results, "problems": problems}, f, ensure_ascii=False, indent=2)
+    for problem in problems:
+        print(f"回退：{problem}")
+    sys.exit(1 if problems else 0)
+
+
+__all__ = ['measure', 'check', 'TARGETS', 'HEAVY_MODULES']
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATAUPLOD = os.path.join(ROOT, "DATAUPLOD")
+
+# 根目录的模块和 DATAUPLOD 下的脚本都按顶层模块导入
+for path in (ROOT, DATAUPLOD):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from alias_lexicon import AhoCorasick, AliasLexicon, extract_header_aliases
+from conftest import DATAUPLOD
+from datasheet_extractor import extract_datasheets
+from datasheet_lookup import DatasheetLookup, build_datasheet_db
+
+ROOT = os.path.dirname(DATAUPLOD)
+
+
+@pytest.fixture(scope="module")
+def lookup(tmp_path_factory):
+    with open(os.path.join(DATAUPLOD, "DATASET", "aeldaricodex.md"), encoding="utf-8") as f:
+        datasheets = extract_datasheets(f.read())
+    db_path = str(tmp_path_factory.mktemp("lexicon") / "datasheets.db")
+    build_datasheet_db(datasheets, db_path, "aeldaricodex.md")
+    lookup = DatasheetLookup(db_path)
+    yield lookup
+    lookup.close()
+
+
+@pytest.fixture(scope="module")
+def lexicon(lookup):
+    return AliasLexicon.load(os.path.join(ROOT, "aliases.json"), protected=lookup.names())
+
+
+def test_find_longest_prefers_longer_overlap():
+    matcher = AhoCorasick({"灵族": "a", "灵族导弹发射器": "b", "导弹": "c"})
+    assert matcher.find_longest("双联灵族导弹发射器") == [(2, 9, "b")]
+
+
+@pytest.mark.parametrize("name", ["灵族导弹发射器", "双联灵族导弹发射器", "灵族长步枪", "灵族火焰喷射器"])
+def test_weapon_names_are_not_rewritten(lexicon, name):
+    assert lexicon.normalize(f"{name}的AP是多少") == f"{name}的穿透是多少"
+    assert lexicon.expand(name) == name
+
+
+def test_aliases_are_normalized(lexicon):
+    assert lexicon.normalize("Eldar的OC是多少") == "艾达灵族的控制是多少"
+    assert lexicon.expand("OC是多少") == "控制（OC）是多少"
+
+
+def test_ascii_alias_needs_word_boundary(lexicon):
+    assert lexicon.normalize("MAP") == "MAP"
+
+
+def test_unprotected_lexicon_keeps_names_without_bare_alias():
+    lexicon = AliasLexicon.load(os.path.join(ROOT, "aliases.json"))
+    assert lexicon.normalize("灵族导弹发射器") == "灵族导弹发射器"
+
+
+def test_extract_header_aliases():
+    text = "### 大先知 FARSEER\n## 战火军阵 (WARHOST)\n### 埃尔德拉德 · 乌斯兰 ELDRAD ULTHRAN\n普通文本"
+    assert extract_header_aliases(text) == {
+        "大先知": ["FARSEER"],
+        "战火军阵": ["WARHOST"],
+        "埃尔德拉德·乌斯兰": ["ELDRAD ULTHRAN", "埃尔德拉德 · 乌斯兰"],
+    }
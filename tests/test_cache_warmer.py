@@ -0,0 +1,43 @@
+import json
+
+from cache_warmer import load_history, mine_logs
+
+
+def _json(message, **extra):
+    return json.dumps({"time": "2026-01-01 00:00:00", "level": "INFO", "message": message, **extra},
+                      ensure_ascii=False)
+
+
+def test_mine_logs_counts_each_request_once(tmp_path):
+    current = tmp_path / "app.log"
+    current.write_text("\n".join([
+        _json("收到查询：大先知的属性", query="大先知的属性"),
+        _json("收到查询：警戒射击怎么用？", query="警戒射击怎么用？"),
+        _json("开始扩展查询：警戒射击怎么用？"),
+        _json("处理第 1 个查询变体：1. 警戒射击的触发时机"),
+        _json("收到查询：警戒射击怎么用？", query="警戒射击怎么用？", time="2026-01-01 00:01:00"),
+        _json("开始扩展查询：警戒射击怎么用？", time="2026-01-01 00:01:00"),
+    ]), encoding="utf-8")
+    legacy = tmp_path / "app.log.1"
+    legacy.write_text("\n".join([
+        "2025-12-01 10:00:00 - query_expander - INFO - 开始扩展查询：深入打击的规则",
+        "2025-12-01 10:00:00 - query_expander - INFO - 开始扩展查询：深入打击的规则",
+        "2025-12-01 10:05:00 - app - INFO - 原始查询：警戒射击怎么用？",
+        "2025-12-01 10:05:01 - query_expander - INFO - 扩展后的最优查询：警戒射击的触发时机",
+    ]), encoding="utf-8")
+    older_json = tmp_path / "app.log.2"
+    older_json.write_text(_json("开始扩展查询：突进移动后还能射击吗"), encoding="utf-8")
+
+    queries, variants = mine_logs([str(current), str(legacy), str(older_json)])
+    assert queries == {"警戒射击怎么用？": 3, "大先知的属性": 1, "深入打击的规则": 1, "突进移动后还能射击吗": 1}
+    assert variants == {"警戒射击的触发时机": 2}
+
+
+def test_load_history(tmp_path):
+    text = tmp_path / "history.txt"
+    text.write_text("大先知的属性\n\n1. 深入打击的规则\n大先知的属性\n", encoding="utf-8")
+    assert load_history(str(text)) == {"大先知的属性": 2, "深入打击的规则": 1}
+
+    data = tmp_path / "history.json"
+    data.write_text(json.dumps(["警戒射击", {"query": "警戒射击"}], ensure_ascii=False), encoding="utf-8")
+    assert load_history(str(data)) == {"警戒射击": 2}
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+from chunk_artifact import ChunkArtifact, write_artifact
+
+IDS = ["doc_a_0", "doc_a_1", "doc_a_2"]
+TEXTS = ["大先知\n分歧命运（灵能）", "深入打击\n位于所有敌方模型水平距离9\"外", "警戒射击\n未修正结果为6"]
+METADATAS = [{"chunk_type": "unit_profile", "parent_id": "sec_0"}, {"chunk_type": "core_rule"}, {}]
+SECTIONS = [{"id": "sec_0", "text": "大先知 FARSEER\n分歧命运（灵能）", "metadata": {"kind": "section"}}]
+
+
+def _write(path, scale=1.0, texts=TEXTS):
+    vectors = np.arange(len(IDS) * 4, dtype=np.float32).reshape(len(IDS), 4) * scale
+    write_artifact(str(path), IDS, texts, METADATAS, vectors, model="test-embedding", sections=SECTIONS)
+    return vectors
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "artifact"
+    vectors = _write(path)
+    artifact = ChunkArtifact(str(path))
+    try:
+        assert len(artifact) == 3 and artifact.dim == 4
+        assert artifact.manifest["model"] == "test-embedding"
+        assert artifact.ids == IDS
+        assert [artifact.get(i) for i in range(3)] == [
+            {"id": i, "text": t, "metadata": m} for i, t, m in zip(IDS, TEXTS, METADATAS)]
+        np.testing.assert_array_equal(artifact.embeddings, vectors)
+        batches = list(artifact.iter_batches(2))
+        assert [ids for ids, _, _ in batches] == [IDS[:2], IDS[2:]]
+        np.testing.assert_array_equal(np.concatenate([v for _, v, _ in batches]), vectors)
+        assert batches[0][2][0] == {**METADATAS[0], "text": TEXTS[0]}
+        assert list(artifact.iter_sections()) == SECTIONS
+    finally:
+        artifact.close()
+
+
+def test_empty_artifact(tmp_path):
+    path = tmp_path / "empty"
+    write_artifact(str(path), [], [], [], np.zeros((0, 4), dtype=np.float32))
+    artifact = ChunkArtifact(str(path))
+    assert len(artifact) == 0 and artifact.ids == [] and list(artifact.iter_sections()) == []
+    artifact.close()
+
+
+def test_rewrite_replaces_atomically(tmp_path):
+    path = tmp_path / "artifact"
+    _write(path)
+    old = ChunkArtifact(str(path))
+    new_texts = [t + "（更新）" for t in TEXTS]
+    vectors = _write(path, scale=2.0, texts=new_texts)
+    try:
+        # 已打开的读者仍读取旧内容，重新打开后读取新内容
+        assert old.get(0)["text"] == TEXTS[0]
+        new = ChunkArtifact(str(path))
+        assert new.get(0)["text"] == new_texts[0]
+        np.testing.assert_array_equal(new.embeddings, vectors)
+        new.close()
+    finally:
+        old.close()
+    assert sorted(os.listdir(tmp_path)) == ["artifact"]
+
+
+def test_failed_write_keeps_previous_artifact(tmp_path):
+    path = tmp_path / "artifact"
+    _write(path)
+    with pytest.raises(TypeError):
+        write_artifact(str(path), IDS, TEXTS, [{"bad": object()}] * 3, np.zeros((3, 4)))
+    with pytest.raises(ValueError):
+        write_artifact(str(path), IDS, TEXTS[:2], METADATAS, np.zeros((3, 4)))
+    assert sorted(os.listdir(tmp_path)) == ["artifact"]
+    artifact = ChunkArtifact(str(path))
+    assert artifact.get(2)["text"] == TEXTS[2]
+    artifact.close()
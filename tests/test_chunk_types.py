@@ -0,0 +1,56 @@
+import pytest
+
+from chunk_types import (classify_chunk, infer_chunk_types, ARMY_RULE, CORE_RULE, FAQ, STRATAGEM,
+                         UNIT_PROFILE, WEAPON_PROFILE)
+
+
+def test_typed_queries_keep_core_rules():
+    types = infer_chunk_types("毁灭伤害武器造成暴击致伤时如何结算？")
+    assert types[:2] == [WEAPON_PROFILE, UNIT_PROFILE]
+    assert CORE_RULE in types and FAQ in types
+
+    types = infer_chunk_types("什么是关键词？")
+    assert CORE_RULE in types and FAQ in types
+    assert len(types) == len(set(types))
+
+
+def test_untyped_query_is_unfiltered():
+    assert infer_chunk_types("冲锋需要距离敌人多近？") is None
+
+
+def test_stat_modifier_query_includes_army_rules():
+    assert ARMY_RULE in infer_chunk_types("疾行如风让移动属性增加多少")
+
+
+DATASHEET = """艾达灵族单位数据 人物 (Characters) 司战 AUTARCH
+*   **单位构成:** 一个司战，75 分
+*   **单位装备:** 星镖手枪，星光长刀
+*   **核心技能:** 领袖"""
+
+WEAPON = """艾达灵族单位数据 人物 (Characters) 司战 AUTARCH
+*   **武器名:** 死亡纺织者
+    *   **攻击范围:** 12 **A:** D6 **BS:** - **S:** 4 **AP:** -1 **D:** 1"""
+
+CODEX_STRATAGEM = """分队规则 战火军阵 (WARHOST) 战略技能 (Stratagems)
+3.撤退佯动 (FEIGNED RETREAT): 1CP, 你的移动阶段，阿苏焉尼单位撤退后，本回合仍可射击和冲锋。"""
+
+CORE_STRATAGEM = """英勇介入 核心-战略计划计谋
+时机：对手的冲锋阶段中，在一个敌方单位结束冲锋移动后立刻使用。
+目标：位于那个敌方单位6"内并且假设在己方冲锋阶段中可以对那个敌方单位宣布冲锋的一个己方单位。
+效果：您的单位现在仅仅对那个敌方单位宣布冲锋，并且像在己方冲锋阶段中一样结算本次冲锋。"""
+
+FAQ_ENTRY = """第42页－英勇介入计谋，CP消耗修改为“1CP”。 英勇介入
+问：如果一个计谋同时将两个或更多己方单位最为目标，那么我是否可以使用技能来修正计谋的CP消耗？答：可以。"""
+
+
+@pytest.mark.parametrize("text, source_file, expected", [
+    (DATASHEET, "DATASET/aeldaricodex.md", UNIT_PROFILE),
+    (WEAPON, "DATASET/aeldaricodex.md", WEAPON_PROFILE),
+    (CODEX_STRATAGEM, "DATASET/aeldaricodex.md", STRATAGEM),
+    (CORE_STRATAGEM, "DATASET/40kcorerule.md", STRATAGEM),
+    (FAQ_ENTRY, "DATASET/40kcorefaq.md", FAQ),
+    ("核心概念[第5-9页]\n本部分将对每一局《战锤40000》对战都十分重要的规则术语和概念进行介绍。",
+     "DATASET/40kcorerule.md", CORE_RULE),
+])
+def test_classify_chunk(text, source_file, expected):
+    assert classify_chunk(text, source_file) == expected
@@ -0,0 +1,75 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import DATAUPLOD
+from conversation import ConversationSession
+from datasheet_extractor import extract_datasheets
+from datasheet_lookup import DatasheetLookup, build_datasheet_db
+
+
+@pytest.fixture(scope="module")
+def lookup(tmp_path_factory):
+    with open(os.path.join(DATAUPLOD, "DATASET", "aeldaricodex.md"), encoding="utf-8") as f:
+        datasheets = extract_datasheets(f.read())
+    db_path = str(tmp_path_factory.mktemp("conversation") / "datasheets.db")
+    build_datasheet_db(datasheets, db_path, "aeldaricodex.md")
+    lookup = DatasheetLookup(db_path)
+    yield lookup
+    lookup.close()
+
+
+@pytest.fixture
+def session(lookup):
+    session = ConversationSession(SimpleNamespace(datasheet_lookup=lookup))
+    session.record_turn("大先知可以加入哪些单位？", "卫戍守护者，风暴守护者，战巫议会")
+    return session
+
+
+def test_first_question_is_not_follow_up(lookup):
+    assert not ConversationSession(SimpleNamespace(datasheet_lookup=lookup)).is_follow_up("那它的属性呢？")
+
+
+@pytest.mark.parametrize("query", ["那它的属性呢？", "它的技能呢", "还有呢？", "大先知的这个技能怎么用"])
+def test_markers_without_new_entities_are_follow_ups(session, query):
+    assert session.is_follow_up(query)
+
+
+@pytest.mark.parametrize("query", ["猎鹰坦克", "深入打击", "警戒射击的规则是什么？", "那猎鹰坦克呢？"])
+def test_short_or_new_entity_questions_are_fresh(session, query):
+    assert not session.is_follow_up(query)
+
+
+def test_first_follow_up_reuses_fresh_search_matches(monkeypatch):
+    import vector_search as vs
+
+    search = vs.VectorSearch(pinecone_api_key="test", index_name="test", datasheet_db_path="", doc_store_path="")
+    vectors = {"a": [1.0, 0.0], "b": [0.9, 0.1], "c": [0.8, 0.2]}
+    hydrated = []
+
+    def query_index(embedding, top_k=5, include_values=False, rerank=True, chunk_types=None):
+        ids = ["a", "b"] if rerank else ["a", "b", "c"]
+        return [{"id": i, "score": 1.0, "metadata": {"text": i}, "values": vectors[i] if include_values else None}
+                for i in ids]
+
+    def materialize(hits):
+        hydrated.append([hit["id"] for hit in hits])
+        return [{"id": hit["id"], "text": hit["id"], "score": hit["score"], "metadata": {}} for hit in hits]
+
+    monkeypatch.setattr(search, "embed_query", lambda query: [1.0, 0.0])
+    monkeypatch.setattr(search, "query_index", query_index)
+    monkeypatch.setattr(search, "synthesize", lambda query, matches: "答案")
+    session = ConversationSession(search)
+    monkeypatch.setattr(session, "_materialize", materialize)
+
+    results = search.search("大先知可以加入哪些单位？", include_matches=True)
+    matches = results[0]["matches"]
+    session.add_candidates(matches)
+    session.record_turn("大先知可以加入哪些单位？", results[0]["text"], [m["id"] for m in matches])
+    assert session.turns[-1]["chunk_ids"] == ["a", "b"]
+
+    assert session.ask("那它的属性呢？") == [{"text": "答案", "score": 1.0}]
+    assert hydrated == [["c"]]
+    assert (session.reused, session.fetched) == (2, 1)
+    search.close()
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from conftest import DATAUPLOD
+from datasheet_extractor import extract_datasheets, parse_datasheet
+
+
+@pytest.fixture(scope="module")
+def sheets():
+    with open(os.path.join(DATAUPLOD, "DATASET", "aeldaricodex.md"), encoding="utf-8") as f:
+        return {sheet["name_zh"]: sheet for sheet in extract_datasheets(f.read())}
+
+
+def test_stat_lines(sheets):
+    assert sheets["大先知"]["stats"] == {"M": "7", "T": "3", "SV": "6+", "W": "4", "LD": "6+", "OC": "1"}
+    assert sheets["死神军劫掠者"]["stats"]["M"] == "16"
+
+
+def test_trailing_text_is_not_part_of_stat(sheets):
+    assert sheets["死神军巫灵"]["stats"]["OC"] == "2"
+    assert sheets["死神军毒灾飞艇"]["stats"]["SV"] == "4+"
+    assert sheets["死神军梦魇"]["stats"]["W"] == "1 (梦魇剑客), 2"
+
+
+def test_weapons_after_merged_header(sheets):
+    weapons = [(w["name"], w["category"], w["profile"]) for w in sheets["死神军梦魇"]["weapons"]]
+    assert weapons == [("斩首剑", "melee", ""), ("斩首对剑", "melee", "横扫"), ("斩首对剑", "melee", "重斩")]
+
+
+def test_weapon_profile_fields(sheets):
+    rifle = next(w for w in sheets["死神军毒灾飞艇"]["weapons"] if w["name"] == "毒晶炮")
+    assert (rifle["category"], rifle["range"], rifle["attacks"], rifle["skill"], rifle["ap"], rifle["damage"]) == \
+        ("ranged", "36", "3", "3+", "-1", "2")
+
+
+def test_inline_stats():
+    sheet = parse_datasheet("测试单位 TEST", ["**M** 12, **T** 3, **SV** 4+, **W** 2, **LD** 7+, **OC** 1"])
+    assert sheet["stats"] == {"M": "12", "T": "3", "SV": "4+", "W": "2", "LD": "7+", "OC": "1"}
+    assert sheet["name_en"] == "TEST"
@@ -0,0 +1,51 @@
+import os
+
+from conftest import DATAUPLOD
+from datasheet_extractor import extract_datasheets
+from dedup import chunk_header, deduplicate_chunks, numeric_tokens
+
+BODY = "本单位可以作为领袖加入以下单位：支派武士，风暴守护者。当本模型领导一个单位时，该单位的模型的近战武器拥有致命一击能力。"
+
+
+def test_merges_duplicates_under_same_header():
+    chunks = ["战火军阵 > 分队规则\n" + BODY, "战火军阵 > 分队规则\n" + BODY + "。"]
+    unique, sources, stats = deduplicate_chunks(chunks)
+    assert stats["output"] == 1
+    assert sources == [[0, 1]]
+
+
+def test_boilerplate_under_different_headers_is_merged():
+    chunks = ["司战 AUTARCH\n" + BODY, "翔空司战 AUTARCH WAYLEAPER\n" + BODY]
+    unique, sources, stats = deduplicate_chunks(chunks)
+    assert stats["output"] == 1
+    assert sources == [[0, 1]]
+
+
+def test_different_numbers_are_not_merged():
+    chunks = ["武器\n" + BODY + " **攻击范围:** 18 **A:** 1 **BS:** 3+ **D:** D6",
+              "武器\n" + BODY + " **攻击范围:** 18 **A:** 1 **BS:** 2+ **D:** D6"]
+    assert numeric_tokens(chunks[0]) != numeric_tokens(chunks[1])
+    assert deduplicate_chunks(chunks, threshold=0.5)[2]["output"] == 2
+
+
+def test_autarch_datasheets_stay_separate():
+    with open(os.path.join(DATAUPLOD, "DATASET", "aeldaricodex.md"), encoding="utf-8") as f:
+        sheets = {s["name_zh"]: s["raw_text"] for s in extract_datasheets(f.read())}
+    chunks = [sheets["司战"], sheets["翔空司战"]]
+    unique, sources, _ = deduplicate_chunks(chunks, threshold=0.5)
+    assert len(unique) == 2
+    assert [chunk_header(c) for c in unique] == ["### 司战 AUTARCH", "### 翔空司战 AUTARCH WAYLEAPER"]
+
+
+def test_shared_profiles_merge_across_datasheets():
+    from section_chunker import section_passages
+
+    with open(os.path.join(DATAUPLOD, "DATASET", "aeldaricodex.md"), encoding="utf-8") as f:
+        passages, _ = section_passages(f.read(), "aeldaricodex.md", "t")
+    chunks = [p["text"] for p in passages]
+    unique, sources, stats = deduplicate_chunks(chunks)
+    merged = [members for members in sources if len(members) > 1]
+    assert stats["output"] < stats["input"]
+    assert any(len({chunk_header(chunks[i]) for i in members}) > 1 for members in merged)
+    for members in merged:
+        assert len({numeric_tokens(chunks[i].split("\n", 1)[-1]) for i in members}) == 1
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from hedging import Hedger, StageTimeout
+
+
+@pytest.fixture
+def hedger():
+    # 样本数永远不足，对冲延迟固定为 default_delay
+    hedger = Hedger(enabled=True, default_delay=0.01, min_samples=10 ** 6, max_workers=4)
+    yield hedger
+    hedger.executor.shutdown(wait=False)
+
+
+def _counters(hedger, stage):
+    metrics = hedger.metrics()[stage]
+    return {key: metrics[key] for key in ("calls", "hedged", "hedge_wins", "timeouts", "errors")}
+
+
+def test_fast_primary_is_not_hedged(hedger):
+    assert hedger.call("embed", lambda x: x * 2, 21, deadline=5) == 42
+    assert _counters(hedger, "embed") == {"calls": 1, "hedged": 0, "hedge_wins": 0, "timeouts": 0, "errors": 0}
+
+
+def test_stalled_primary_loses_to_hedge(hedger):
+    release = threading.Event()
+    attempts = []
+    lock = threading.Lock()
+
+    def embed():
+        with lock:
+            attempts.append(len(attempts))
+            attempt = attempts[-1]
+        if attempt == 0:
+            release.wait(5)
+            return "primary"
+        return "hedge"
+
+    try:
+        assert hedger.call("embed", embed, deadline=5) == "hedge"
+    finally:
+        release.set()
+    assert len(attempts) == 2
+    assert _counters(hedger, "embed") == {"calls": 1, "hedged": 1, "hedge_wins": 1, "timeouts": 0, "errors": 0}
+
+
+def test_deadline_raises_stage_timeout(hedger):
+    release = threading.Event()
+    try:
+        with pytest.raises(StageTimeout):
+            hedger.call("rerank", release.wait, 5, deadline=0.05, hedge=False)
+    finally:
+        release.set()
+    assert _counters(hedger, "rerank") == {"calls": 1, "hedged": 0, "hedge_wins": 0, "timeouts": 1, "errors": 0}
+
+
+def test_both_attempts_failing_raises(hedger):
+    hedge_started = threading.Event()
+    attempts = []
+    lock = threading.Lock()
+
+    def retrieve():
+        with lock:
+            attempts.append(len(attempts))
+            attempt = attempts[-1]
+        if attempt == 0:
+            # 主请求在对冲请求发出后才失败
+            hedge_started.wait(5)
+            raise ConnectionError("primary")
+        hedge_started.set()
+        raise ConnectionError("hedge")
+
+    with pytest.raises(ConnectionError):
+        hedger.call("retrieve", retrieve, deadline=5)
+    assert len(attempts) == 2
+    assert _counters(hedger, "retrieve") == {"calls": 1, "hedged": 1, "hedge_wins": 0, "timeouts": 0, "errors": 1}
+
+
+def test_disabled_hedger_still_enforces_deadline():
+    hedger = Hedger(enabled=False, default_delay=0.01, min_samples=10 ** 6, max_workers=2)
+    release = threading.Event()
+    try:
+        with pytest.raises(StageTimeout):
+            hedger.call("embed", release.wait, 5, deadline=0.05)
+    finally:
+        release.set()
+        hedger.executor.shutdown(wait=False)
+    assert _counters(hedger, "embed")["hedged"] == 0
@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+from conftest import DATAUPLOD
+from datasheet_extractor import extract_datasheets
+from datasheet_lookup import build_datasheet_db
+from index_alias import IndexAlias, promote, rollback, seed_version_file, versioned_path
+from vector_search import VectorSearch
+
+
+def test_versioned_path():
+    assert versioned_path("datasheets.db", "default") == "datasheets.db"
+    assert versioned_path("datasheets.db", "v2") == "datasheets.v2.db"
+    assert versioned_path("../lexicon.json", "v2") == "../lexicon.v2.json"
+    assert versioned_path("", "v2") == ""
+
+
+def test_seed_copies_only_missing_files(tmp_path):
+    source, target = tmp_path / "lexicon.json", tmp_path / "lexicon.v2.json"
+    source.write_text(json.dumps({"sources": {}}), encoding="utf-8")
+    assert seed_version_file(str(source), str(target))
+    target.write_text("{}", encoding="utf-8")
+    assert not seed_version_file(str(source), str(target))
+    assert target.read_text(encoding="utf-8") == "{}"
+
+
+@pytest.fixture(scope="module")
+def datasheets():
+    with open(os.path.join(DATAUPLOD, "DATASET", "aeldaricodex.md"), encoding="utf-8") as f:
+        return extract_datasheets(f.read())
+
+
+def test_datasheets_follow_index_version(tmp_path, datasheets):
+    db_path = str(tmp_path / "datasheets.db")
+    build_datasheet_db(datasheets[:1], db_path, "aeldaricodex.md")
+    build_datasheet_db(datasheets, versioned_path(db_path, "v2"), "aeldaricodex.md")
+    alias_path = str(tmp_path / "index_alias.json")
+
+    search = VectorSearch(pinecone_api_key="test", index_name="test", datasheet_db_path=db_path,
+                          doc_store_path="")
+    search.alias = IndexAlias(path=alias_path, default_index="test", check_interval=0)
+    name = datasheets[-1]["name_zh"]
+    assert search.datasheet_lookup.get_unit(name) is None
+
+    promote("v2", "test", path=alias_path)
+    assert search.index_version == "v2"
+    assert search.datasheet_lookup.get_unit(name)["name_zh"] == name
+
+    rollback(alias_path)
+    assert search.datasheet_lookup.get_unit(name) is None
@@ -0,0 +1,37 @@
+import sqlite3
+
+from query_cache import QueryCache
+
+
+def test_answers_are_keyed_by_route(tmp_path):
+    cache = QueryCache(path=str(tmp_path / "cache.db"))
+    cache.put_answer("v1", "大先知的属性？", "数据卡答案", "lookup")
+    cache.put_answer("v1", "大先知的属性", "检索答案", "vector")
+    assert cache.get_answer("v1", "大先知的属性", "lookup") == "数据卡答案"
+    assert cache.get_answer("v1", "大先知的属性？", "vector") == "检索答案"
+    assert cache.get_answer("v1", "大先知的属性", "decompose") is None
+
+    reopened = QueryCache(path=str(tmp_path / "cache.db"))
+    assert reopened.get_answer("v1", "大先知的属性", "lookup") == "数据卡答案"
+
+
+def test_old_answer_table_is_dropped(tmp_path):
+    path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE answers (version TEXT NOT NULL, query TEXT NOT NULL, answer TEXT NOT NULL, "
+                 "route TEXT NOT NULL, created REAL NOT NULL, PRIMARY KEY (version, query))")
+    conn.execute("INSERT INTO answers VALUES ('v1', '大先知的属性', '旧答案', 'warmup', 0)")
+    conn.commit()
+    conn.close()
+
+    cache = QueryCache(path=path, answer_ttl=0)
+    assert cache.get_answer("v1", "大先知的属性", "warmup") is None
+    cache.put_answer("v1", "大先知的属性", "新答案", "vector")
+    assert cache.get_answer("v1", "大先知的属性", "vector") == "新答案"
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = QueryCache(path="")
+    cache.put_embedding("model", "text", [1.0, 2.0])
+    assert cache.get_embedding("model", "text") is None
+    assert not list(tmp_path.iterdir())
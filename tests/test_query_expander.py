@@ -0,0 +1,67 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from query_expander import QueryExpander
+
+
+class FakeCompletions:
+    """按顺序返回预设的回复，记录收到的提示词"""
+
+    def __init__(self, replies, delay=0.0):
+        self.replies = list(replies)
+        self.delay = delay
+        self.prompts = []
+
+    def create(self, model, messages, temperature):
+        self.prompts.append(messages[0]["content"])
+        time.sleep(self.delay)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))], usage=None)
+
+
+@pytest.fixture
+def expander():
+    expander = QueryExpander(openai_api_key="test")
+    yield expander
+    expander.executor.shutdown(wait=True)
+
+
+def _use(expander, completions):
+    expander.__dict__["client"] = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_error_returns_query_before_lexicon(expander):
+    _use(expander, FakeCompletions([RuntimeError("boom")]))
+    assert expander.expand_query("OC是多少") == "OC是多少"
+
+
+def test_cancel_skips_select_call(expander):
+    completions = FakeCompletions(["变体一\n变体二", "变体一"])
+    _use(expander, completions)
+    cancel = threading.Event()
+    cancel.set()
+    assert expander.expand_query("深入打击", cancel) == "深入打击"
+    assert len(completions.prompts) == 1
+
+
+def test_expansion_selects_variant(expander):
+    completions = FakeCompletions(["变体一\n变体二", "变体二"])
+    _use(expander, completions)
+    assert expander.expand_query("深入打击") == "变体二"
+    assert len(completions.prompts) == 2
+
+
+def test_speculative_timeout_stops_expansion(expander):
+    completions = FakeCompletions(["变体一\n变体二", "变体一"], delay=0.2)
+    _use(expander, completions)
+    expander.vector_search.retrieve = lambda query, top_k: [{"id": "1", "text": "深入打击", "score": 1.0}]
+    expander.vector_search.synthesize = lambda query, matches: query
+    result = expander.speculative_search("深入打击", deadline=0.05)
+    assert result == [{"text": "深入打击", "score": 1.0}]
+    expander.executor.shutdown(wait=True)
+    assert len(completions.prompts) == 1
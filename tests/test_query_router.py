@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from conftest import DATAUPLOD
+from datasheet_extractor import extract_datasheets
+from datasheet_lookup import DatasheetLookup, build_datasheet_db
+from query_router import QueryRouter, ROUTE_LOOKUP, ROUTE_VECTOR, ROUTE_EXPAND, ROUTE_DECOMPOSE
+
+
+@pytest.fixture(scope="module")
+def router(tmp_path_factory):
+    with open(os.path.join(DATAUPLOD, "DATASET", "aeldaricodex.md"), encoding="utf-8") as f:
+        datasheets = extract_datasheets(f.read())
+    db_path = str(tmp_path_factory.mktemp("router") / "datasheets.db")
+    build_datasheet_db(datasheets, db_path, "aeldaricodex.md")
+    lookup = DatasheetLookup(db_path)
+    yield QueryRouter(lookup)
+    lookup.close()
+
+
+@pytest.mark.parametrize("query", [
+    "大先知的属性",
+    "大先知的属性是什么？",
+    "幽冥骑士的武器有什么",
+    "大先知的技能是什么？",
+    "猎鹰坦克的关键词是什么?",
+])
+def test_datasheet_questions_are_lookups(router, query):
+    assert router.route(query)["route"] == ROUTE_LOOKUP
+
+
+@pytest.mark.parametrize("query", [
+    "大先知可以加入战巫议会吗？",
+    "当幽冥骑士被摧毁时会发生什么？",
+    "大先知怎么使用灵能？",
+    "如果大先知领导单位，技能如何生效",
+])
+def test_reasoning_questions_are_expanded(router, query):
+    assert router.route(query)["route"] == ROUTE_EXPAND
+
+
+def test_short_rule_name_uses_vector(router):
+    assert router.route("深入打击")["route"] == ROUTE_VECTOR
+    assert router.route("什么是深入打击？")["route"] == ROUTE_VECTOR
+
+
+def test_multi_step_question_is_decomposed(router):
+    query = "幽冥骑士和猎鹰坦克分别对大先知射击，期望造成多少伤害？"
+    assert router.route(query)["route"] == ROUTE_DECOMPOSE
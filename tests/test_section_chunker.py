@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from conftest import DATAUPLOD
+from datachunk import build_section_tree
+from section_chunker import section_passages
+
+SAMPLE = """# 单位数据
+### 司战 AUTARCH
+**射击武器 (Ranged Weapons):**
+*   **武器名:** 死亡纺织者
+    *   **攻击范围:** 12 **A:** D6 **BS:** - **S:** 4 **AP:** -1 **D:** 1
+*   **武器名:** 星镖手枪
+    *   **攻击范围:** 12 **A:** 1 **BS:** 2+ **S:** 4 **AP:** -1 **D:** 1
+"""
+
+
+def _next_line(text, line_start):
+    lines = text.split("\n")
+    index = next(i for i, line in enumerate(lines) if line.startswith(line_start))
+    return lines[index + 1]
+
+
+def test_children_keep_source_order():
+    unit = build_section_tree(SAMPLE)[0].subsections[0]
+    titles = [child if isinstance(child, str) else child.title for child in unit.children]
+    assert titles == [
+        "**射击武器 (Ranged Weapons):**",
+        "*   **武器名:** 死亡纺织者",
+        "*   **攻击范围:** 12 **A:** D6 **BS:** - **S:** 4 **AP:** -1 **D:** 1",
+        "*   **武器名:** 星镖手枪",
+        "*   **攻击范围:** 12 **A:** 1 **BS:** 2+ **S:** 4 **AP:** -1 **D:** 1",
+    ]
+
+
+@pytest.mark.parametrize("max_parent_chars", [4000, 10])
+def test_weapon_name_stays_next_to_profile(max_parent_chars):
+    passages, _ = section_passages(SAMPLE, "sample.md", "t", max_parent_chars=max_parent_chars)
+    text = "\n".join(p["text"] for p in passages)
+    assert _next_line(text, "*   **武器名:** 死亡纺织者").startswith("*   **攻击范围:** 12 **A:** D6")
+    assert _next_line(text, "*   **武器名:** 星镖手枪").startswith("*   **攻击范围:** 12 **A:** 1 ")
+
+
+def test_autarch_parent_keeps_weapon_profiles_adjacent():
+    with open(os.path.join(DATAUPLOD, "DATASET", "aeldaricodex.md"), encoding="utf-8") as f:
+        _, parents = section_passages(f.read(), "aeldaricodex.md", "t")
+    autarch = next(p["text"] for p in parents if p["metadata"]["title_path"].endswith("司战 AUTARCH"))
+    assert _next_line(autarch, "*   **武器名:** 女妖之刃").startswith("*   **攻击范围:** 近战 **A:** 5")
+    assert _next_line(autarch, "*   **武器名:** 星镖手枪").startswith("*   **攻击范围:** 12 **A:** 1")
+
+
+@pytest.mark.parametrize("source", ["aeldaricodex.md", "40kcorerule.md", "40kcorefaq.md"])
+def test_every_parent_has_passages(source):
+    with open(os.path.join(DATAUPLOD, "DATASET", source), encoding="utf-8") as f:
+        passages, parents = section_passages(f.read(), source, "t")
+    used = {p["parent_id"] for p in passages}
+    assert parents and all(parent["id"] in used for parent in parents)
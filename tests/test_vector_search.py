@@ -0,0 +1,41 @@
+import pytest
+
+import vector_search as vs
+
+
+@pytest.fixture
+def search(monkeypatch):
+    search = vs.VectorSearch(pinecone_api_key="test", index_name="test")
+    calls = []
+
+    def query_index(embedding, top_k=5, include_values=False, rerank=True, chunk_types=None):
+        calls.append({"top_k": top_k, "include_values": include_values, "rerank": rerank})
+        return [{"id": str(i), "score": 1.0, "metadata": {}, "values": [1.0, float(i)]} for i in range(top_k)]
+
+    monkeypatch.setattr(search, "query_index", query_index)
+    search.calls = calls
+    yield search
+    search.close()
+
+
+def test_default_search_keeps_rerank_without_vectors(search):
+    hits = search._search_hits([1.0, 0.0], 5, vs.MMR_LAMBDA, None)
+    assert len(hits) == 5
+    assert search.calls == [{"top_k": 5, "include_values": False, "rerank": True}]
+
+
+def test_mmr_diversifies_reranked_pool(search):
+    hits = search._search_hits([1.0, 0.0], 5, 0.5, None)
+    assert len(hits) == 5
+    assert search.calls == [{"top_k": vs.MMR_POOL_SIZE, "include_values": True, "rerank": True}]
+
+
+def test_embedding_cache_key_separates_clients(search):
+    class StubOpenAI:
+        pass
+
+    default_key = search.embedding_cache_key
+    assert default_key.startswith(vs.EMBADDING_MODEL + "@")
+    search.__dict__["client"] = StubOpenAI()
+    assert search.embedding_cache_key == vs.EMBADDING_MODEL + "@StubOpenAI"
+    assert search.embedding_cache_key != default_key
@@ -0,0 +1,243 @@
+"""
+LLM和嵌入调用的token与费用统计
+
+每次用户查询在 track_request 中执行，期间所有调用通过 record_usage 记入当前请求；
+同时按流程阶段和处理模式累计到进程级的 tracker，供接口查询和预算判断使用。
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+from config import MODEL_PRICES, BUDGET_PER_QUERY_USD, BUDGET_PER_MINUTE_USD
+
+logger = logging.getLogger(__name__)
+
+_current_request = contextvars.ContextVar("usage_request", default=None)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int = 0) -> float:
+    """
+    按 MODEL_PRICES 估算一次调用的费用（美元），未知模型返回0
+
+    Args:
+        model: 模型名称，可以带日期后缀
+        prompt_tokens: 输入token数
+        completion_tokens: 输出token数
+
+    Returns:
+        float: 费用
+    """
+    prefix = max((name for name in MODEL_PRICES if model and model.startswith(name)), key=len, default=None)
+    if prefix is None:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[prefix]
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+
+def _add(totals: Dict[str, Any], prompt_tokens: int, completion_tokens: int, cost: float):
+    totals["calls"] += 1
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    totals["cost"] += cost
+
+
+class RequestUsage:
+    def __init__(self, mode: str):
+        """
+        单次查询的用量，推测检索等并行线程会共享同一个实例
+
+        Args:
+            mode: 处理模式
+        """
+        self.mode = mode
+        self.totals = _empty_totals()
+        self.stages = defaultdict(_empty_totals)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._lock:
+            _add(self.totals, prompt_tokens, completion_tokens, cost)
+            _add(self.stages[stage], prompt_tokens, completion_tokens, cost)
+
+    @property
+    def cost(self) -> float:
+        return self.totals["cost"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, **self.totals, "stages": {k: dict(v) for k, v in self.stages.items()}}
+
+
+class UsageTracker:
+    def __init__(self, per_query_budget: float = BUDGET_PER_QUERY_USD,
+                 per_minute_budget: float = BUDGET_PER_MINUTE_USD):
+        """
+        进程级用量统计和预算判断
+
+        Args:
+            per_query_budget: 单次查询的费用预算（美元），0表示不限制
+            per_minute_budget: 最近一分钟的费用预算（美元），0表示不限制
+        """
+        self.per_query_budget = per_query_budget
+        self.per_minute_budget = per_minute_budget
+        self.totals = _empty_totals()
+        self.by_stage = defaultdict(_empty_totals)
+        self.by_mode = defaultdict(lambda: {**_empty_totals(), "requests": 0})
+        self._window = deque()  # (时间戳, 费用)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._lock:
+            _add(self.totals, prompt_tokens, completion_tokens, cost)
+            _add(self.by_stage[stage], prompt_tokens, completion_tokens, cost)
+            self._window.append((time.monotonic(), cost))
+
+    def finish_request(self, usage: RequestUsage):
+        """把一次查询的用量计入所属模式"""
+        with self._lock:
+            totals = self.by_mode[usage.mode]
+            totals["requests"] += 1
+            for key in ("calls", "prompt_tokens", "completion_tokens", "cost"):
+                totals[key] += usage.totals[key]
+
+    def minute_cost(self) -> float:
+        """最近一分钟的费用"""
+        cutoff = time.monotonic() - 60
+        with self._lock:
+            while self._window and self._window[0][0] < cutoff:
+                self._window.popleft()
+            return sum(cost for _, cost in self._window)
+
+    def average_cost(self, mode: str) -> Optional[float]:
+        """某个模式每次查询的平均费用，没有记录时返回None"""
+        with self._lock:
+            totals = self.by_mode.get(mode)
+            if not totals or not totals["requests"]:
+                return None
+            return totals["cost"] / totals["requests"]
+
+    def within_budget(self, mode: str) -> bool:
+        """
+        按该模式的历史平均费用判断这次查询是否会超出预算
+
+        Args:
+            mode: 处理模式
+
+        Returns:
+            bool: 未超出预算或没有历史数据时为True
+        """
+        expected = self.average_cost(mode)
+        if expected is None:
+            expected = 0.0
+        if self.per_query_budget > 0 and expected > self.per_query_budget:
+            return False
+        if self.per_minute_budget > 0 and self.minute_cost() + expected > self.per_minute_budget:
+            return False
+        return True
+
+    def summary(self) -> Dict[str, Any]:
+        """用量汇总：总计、按阶段、按模式以及最近一分钟的费用"""
+        minute_cost = self.minute_cost()
+        with self._lock:
+            return {
+                "total": dict(self.totals),
+                "by_stage": {k: dict(v) for k, v in self.by_stage.items()},
+                "by_mode": {k: dict(v) for k, v in self.by_mode.items()},
+                "minute_cost": minute_cost,
+                "budgets": {"per_query": self.per_query_budget, "per_minute": self.per_minute_budget},
+            }
+
+
+tracker = UsageTracker()
+
+
+def current_request() -> Optional[RequestUsage]:
+    """当前查询的用量，不在 track_request 中时返回None"""
+    return _current_request.get()
+
+
+def query_budget_exceeded() -> bool:
+    """当前查询的费用是否已超出单次查询预算"""
+    usage = current_request()
+    return bool(usage and tracker.per_query_budget > 0 and usage.cost >= tracker.per_query_budget)
+
+
+@contextmanager
+def track_request(mode: str):
+    """
+    统计一次查询的用量，结束时写入日志并计入进程级统计
+
+    Args:
+        mode: 处理模式
+
+    Yields:
+        RequestUsage: 本次查询的用量
+    """
+    usage = RequestUsage(mode)
+    token = _current_request.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_request.reset(token)
+        tracker.finish_request(usage)
+        logger.info("查询用量：模式 %s，%d 次调用，输入 %d token，输出 %d token，费用 $%.6f",
+                    mode, usage.totals["calls"], usage.totals["prompt_tokens"],
+                    usage.totals["completion_tokens"], usage.cost,
+                    extra={"usage": usage.to_dict()})
+
+
+def record_usage(stage: str, model: str, prompt_tokens: int, completion_tokens: int = 0) -> float:
+    """
+    记录一次调用的用量
+
+    Args:
+        stage: 流程阶段，如 embed、expand、synthesize
+        model: 模型名称
+        prompt_tokens: 输入token数
+        completion_tokens: 输出token数
+
+    Returns:
+        float: 本次调用的费用
+    """
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    tracker.add(stage, prompt_tokens, completion_tokens, cost)
+    usage = current_request()
+    if usage is not None:
+        usage.add(stage, prompt_tokens, completion_tokens, cost)
+    logger.debug("调用用量：阶段 %s，模型 %s，输入 %d，输出 %d，费用 $%.6f",
+                 stage, model, prompt_tokens, completion_tokens, cost)
+    return cost
+
+
+def record_openai(stage: str, response, model: str = "") -> float:
+    """从OpenAI SDK的响应（chat或embeddings）中读取usage并记录"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0.0
+    return record_usage(stage, getattr(response, "model", None) or model,
+                        getattr(usage, "prompt_tokens", 0) or 0,
+                        getattr(usage, "completion_tokens", 0) or 0)
+
+
+def record_langchain(stage: str, message, model: str = "") -> float:
+    """从LangChain的AIMessage中读取usage_metadata并记录"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    metadata = getattr(message, "response_metadata", None) or {}
+    if not usage:
+        token_usage = metadata.get("token_usage") or {}
+        usage = {"input_tokens": token_usage.get("prompt_tokens", 0),
+                 "output_tokens": token_usage.get("completion_tokens", 0)}
+    return record_usage(stage, metadata.get("model_name") or model,
+                        usage.get("input_tokens", 0) or 0, usage.get("output_tokens", 0) or 0)
+
+
+__all__ = ['tracker', 'track_request', 'current_request', 'query_budget_exceeded',
+           'record_usage', 'record_openai', 'record_langchain', 'estimate_cost']
@@ -1,30 +1,136 @@
 import os
-from pinecone import Pinecone
-from openai import OpenAI
-from typing import List, Dict, Any
+from functools import cached_property
+from typing import List, Dict, Any, Tuple, Optional
 import logging
-from config import OPENAI_API_KEY, RERANK_MODEL, EMBADDING_MODEL
-import pinecone
+import time
+from config import OPENAI_API_KEY, RERANK_MODEL, EMBADDING_MODEL, DATASHEET_DB_PATH, DOC_STORE_PATH, DOC_STORE_CACHE_SIZE, SECTION_EXPANSION, \
+    MMR_LAMBDA, MMR_POOL_SIZE, ALIAS_LEXICON_PATH, LEXICON_PATH, STAGE_DEADLINES, VECTOR_BACKEND, LOCAL_INDEX_DIR, SERVING_WORKERS, \
+    CHUNK_TYPE_FILTER
+from datasheet_lookup import DatasheetLookup
+from doc_store import DocStore
+from usage_tracker import record_openai
+from mmr import mmr_select
+from alias_lexicon import AliasLexicon
+from index_alias import IndexAlias, DEFAULT_VERSION, versioned_path
+from hedging import hedger, StageTimeout
+from local_index import LocalVectorIndex, IndexWorkerPool, find_artifacts
+from query_cache import query_cache
+from chunk_types import infer_chunk_types, type_filter
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class VectorSearch:
-    def __init__(self, pinecone_api_key: str, index_name: str, openai_api_key=OPENAI_API_KEY):
+    def __init__(self, pinecone_api_key: str, index_name: str, openai_api_key=OPENAI_API_KEY,
+                 datasheet_db_path: str = DATASHEET_DB_PATH, doc_store_path: str = DOC_STORE_PATH):
         """
         初始化向量搜索类
         
         Args:
             pinecone_api_key: Pinecone API密钥
-            index_name: Pinecone索引名称
+            index_name: Pinecone索引名称，存在索引版本别名时以别名为准
             openai_api_key: OpenAI API密钥
+            datasheet_db_path: 数据卡查询表路径，文件不存在时不启用精确查询
+            doc_store_path: 本地文档库路径，文件不存在时从Pinecone metadata读取文本
         """
-        self.client = OpenAI(api_key=openai_api_key)
-        self.pc = Pinecone(api_key=pinecone_api_key)
-        self.index = self.pc.Index(index_name)
+        # OpenAI和Pinecone客户端在第一次调用时才创建，命中缓存或使用本地后端时不需要导入它们
+        self._openai_api_key = openai_api_key
+        self._pinecone_api_key = pinecone_api_key
+        self.alias = IndexAlias(default_index=index_name)
+        self._indexes = {}
+        self._pinned = None
+        # 嵌入缓存，压测等使用替身客户端的场景可以换成独立的缓存或不启用缓存的实例
+        self.query_cache = query_cache
+        self.doc_store = None
+        if doc_store_path and os.path.exists(doc_store_path):
+            self.doc_store = DocStore(doc_store_path, cache_size=DOC_STORE_CACHE_SIZE)
+        # 数据卡查询表和别名词表随索引版本切换，见 _sync_version_data
+        self._datasheet_db_path = datasheet_db_path
+        self._data_version = None
+        self._datasheet_lookup = None
+        self._lexicon = None
+        self.local_index = None
+        if VECTOR_BACKEND == "local":
+            artifact_paths = find_artifacts(LOCAL_INDEX_DIR)
+            if not artifact_paths:
+                raise ValueError(f"{LOCAL_INDEX_DIR} 下没有切片产物，无法使用local后端")
+            self.local_index = IndexWorkerPool(artifact_paths, SERVING_WORKERS) if SERVING_WORKERS > 0 \
+                else LocalVectorIndex(artifact_paths)
         logger.info("VectorSearch初始化完成")
         
+    @cached_property
+    def client(self):
+        """OpenAI客户端，首次使用时创建"""
+        from openai import OpenAI
+        return OpenAI(api_key=self._openai_api_key, timeout=STAGE_DEADLINES["generate"])
+
+    @cached_property
+    def pc(self):
+        """Pinecone客户端，首次查询索引时创建"""
+        from pinecone import Pinecone
+        return Pinecone(api_key=self._pinecone_api_key)
+
+    def _resolve(self):
+        # 每次查询时解析当前版本，别名切换后运行中的进程立即使用新版本
+        index_name, namespace = self._pinned or self.alias.resolve()
+        self._sync_version_data()
+        if index_name not in self._indexes:
+            self._indexes[index_name] = self.pc.Index(index_name)
+        return self._indexes[index_name], namespace
+
+    @property
+    def index(self):
+        """当前版本所在的索引"""
+        return self._resolve()[0]
+
+    @property
+    def index_version(self) -> str:
+        """当前检索使用的索引版本，答案缓存按版本区分"""
+        if self.local_index is not None:
+            return "local"
+        if self._pinned:
+            return self._pinned[1] or DEFAULT_VERSION
+        self.alias.resolve()
+        return self.alias.version
+
+    def pin(self, index_name: str, namespace: str):
+        """固定使用某个版本，不再跟随别名（用于切换前的冒烟查询）"""
+        self._pinned = (index_name, namespace)
+
+    @property
+    def datasheet_lookup(self) -> Optional[DatasheetLookup]:
+        """当前版本的数据卡查询表，文件不存在时为None"""
+        self._sync_version_data()
+        return self._datasheet_lookup
+
+    @property
+    def lexicon(self) -> AliasLexicon:
+        """当前版本的别名词表"""
+        self._sync_version_data()
+        return self._lexicon
+
+    def _version_file(self, path: str, version: str) -> str:
+        # 入库时按版本存放的文件；本版本没有单独的文件时（按版本存放之前入库的版本）使用原路径
+        candidate = versioned_path(path, version)
+        if candidate != path and not os.path.exists(candidate):
+            logger.warning("版本 %s 没有单独的 %s，使用 %s", version, candidate, path)
+            return path
+        return candidate
+
+    def _sync_version_data(self):
+        # 数据卡查询表和别名词表与索引同时入库，切换或回滚版本时一起重新加载
+        version = self.index_version
+        if version == self._data_version:
+            return
+        # 本地后端的切片产物不分版本，使用默认版本的文件
+        data_version = DEFAULT_VERSION if self.local_index is not None else version
+        db_path = self._version_file(self._datasheet_db_path, data_version)
+        lookup = DatasheetLookup(db_path) if db_path and os.path.exists(db_path) else None
+        lexicon = AliasLexicon.load(ALIAS_LEXICON_PATH, self._version_file(LEXICON_PATH, data_version),
+                                    protected=lookup.names() if lookup else ())
+        # 旧版本的查询表可能仍被进行中的请求使用，不主动关闭，由垃圾回收释放
+        self._datasheet_lookup, self._lexicon, self._data_version = lookup, lexicon, version
+        logger.info("已加载版本 %s 的数据卡查询表和别名词表", version)
+
     def generate_query_variants(self, query: str) -> List[str]:
         """
         生成查询变体
@@ -54,13 +160,14 @@ class VectorSearch:
                 temperature=0.7,
                 max_tokens=1000
             )
+            record_openai("variants", response)
             
             variants = [line.strip() for line in response.choices[0].message.content.split('\n') if line.strip()]
-            logger.info(f"生成的查询变体：{variants}")
+            logger.info("生成的查询变体：%s", variants)
             return variants
             
         except Exception as e:
-            logger.error(f"生成查询变体时出错：{str(e)}")
+            logger.error("生成查询变体时出错：%s", e)
             return []
             
     def semantic_parse(self, query: str, context: List[str]) -> str:
@@ -104,52 +211,304 @@ class VectorSearch:
                 temperature=0.7,
                 max_tokens=2000
             )
+            record_openai("synthesize", response)
             
             return response.choices[0].message.content.strip()
             
         except Exception as e:
-            logger.error(f"语义解析时出错：{str(e)}")
+            logger.error("语义解析时出错：%s", e)
             return "抱歉，解析问题时出错。"
             
+    @property
+    def embedding_cache_key(self) -> str:
+        """嵌入缓存中区分向量来源的键：模型名加上接口地址，替身客户端或其他兼容接口的向量不会与线上的混用"""
+        client = self.__dict__.get("client")
+        if client is None:
+            # 客户端尚未创建时按SDK的默认地址计算，命中缓存时不需要导入openai
+            endpoint = os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+        else:
+            endpoint = str(getattr(client, "base_url", None) or type(client).__name__)
+        return f"{EMBADDING_MODEL}@{endpoint.rstrip('/')}"
+
     def get_embedding(self, text):
-        # 获取文本的嵌入向量
-        response = self.client.embeddings.create(
-            model=EMBADDING_MODEL,
-            input=text
+        # 获取文本的嵌入向量；先查缓存，由对冲执行器负责截止时间，不再由SDK重试
+        cache_key = self.embedding_cache_key
+        cached = self.query_cache.get_embedding(cache_key, text)
+        if cached is not None:
+            return cached
+        client = self.client.with_options(timeout=STAGE_DEADLINES["embed"], max_retries=0)
+
+        def embed():
+            response = client.embeddings.create(
+                model=EMBADDING_MODEL,
+                input=text
+            )
+            record_openai("embed", response, EMBADDING_MODEL)
+            return response.data[0].embedding
+
+        embedding = hedger.call("embed", embed)
+        self.query_cache.put_embedding(cache_key, text, embedding)
+        return embedding
+
+    def embed_query(self, query: str):
+        """用别名词表规范化查询后再嵌入，英文名、缩写和俗称与规则原文的中文术语对齐"""
+        expanded = self.lexicon.expand(query)
+        if expanded != query:
+            logger.info("词表扩展查询：%s -> %s", query, expanded)
+        return self.get_embedding(expanded)
+
+    def lookup_datasheets(self, query: str) -> str:
+        """
+        从数据卡查询表中取出查询涉及的单位和武器的精确数据
+        
+        Args:
+            query: 查询文本
+            
+        Returns:
+            str: 格式化后的数据卡文本，未启用或无匹配时为空字符串
+        """
+        if not self.datasheet_lookup:
+            return ""
+        try:
+            matches = self.datasheet_lookup.match_query(query)
+            if matches["units"] or matches["weapons"]:
+                logger.info("数据卡精确匹配：%d 个单位，%d 条武器",
+                            len(matches["units"]), len(matches["weapons"]))
+            return self.datasheet_lookup.format_rows(matches)
+        except Exception as e:
+            logger.error("数据卡查询时出错：%s", e)
+            return ""
+
+    def retrieve(self, query: str, top_k: int = 5, mmr_lambda: float = None,
+                 chunk_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        只做向量检索，不调用LLM整合
+        
+        Args:
+            query: 查询文本
+            top_k: 返回结果数量
+            mmr_lambda: MMR相关性权重，None时使用配置的MMR_LAMBDA
+            chunk_types: 只在这些类型的块中检索；None时若开启CHUNK_TYPE_FILTER则按查询推断
+            
+        Returns:
+            List[Dict[str, Any]]: 检索到的切片列表，包含id、text、score和metadata
+        """
+        matches = self._retrieve_passages(query, top_k, mmr_lambda, chunk_types)
+        if SECTION_EXPANSION and self.doc_store is not None:
+            matches = self.expand_to_sections(matches)
+        return matches
+
+    def _retrieve_passages(self, query: str, top_k: int, mmr_lambda: Optional[float],
+                           chunk_types: Optional[List[str]], include_values: bool = False) -> List[Dict[str, Any]]:
+        # 检索段落并补全文本，不扩展为section；include_values时每个段落带上索引中的向量
+        query_embedding = self.embed_query(query)
+        mmr_lambda = MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        if chunk_types is None and CHUNK_TYPE_FILTER:
+            chunk_types = infer_chunk_types(query)
+        hits = self._search_hits(query_embedding, top_k, mmr_lambda, chunk_types, include_values)
+        if not hits and chunk_types:
+            # 旧索引中的块没有类型，或推断的类型过窄
+            logger.info("限定块类型 %s 后没有结果，改为不限类型检索", chunk_types)
+            hits = self._search_hits(query_embedding, top_k, mmr_lambda, None, include_values)
+        if self.doc_store is None:
+            passages = [
+                {'id': hit['id'], 'text': hit['metadata'].get('text', ''), 'score': hit['score'],
+                 'metadata': hit['metadata']}
+                for hit in hits
+            ]
+        else:
+            passages = self.hydrate([(hit['id'], hit['score']) for hit in hits])
+        if include_values:
+            for passage, hit in zip(passages, hits):
+                passage['values'] = hit['values']
+        return passages
+
+    def _search_hits(self, query_embedding: List[float], top_k: int, mmr_lambda: float,
+                     chunk_types: Optional[List[str]], include_values: bool = False) -> List[Dict[str, Any]]:
+        if mmr_lambda < 1.0 and MMR_POOL_SIZE > top_k:
+            # 先rerank出较小的候选池并只取回这些候选的向量，MMR在rerank结果中按余弦相似度选择
+            pool = self.query_index(query_embedding, MMR_POOL_SIZE, include_values=True, chunk_types=chunk_types)
+            return self.diversify(query_embedding, pool, top_k, mmr_lambda)
+        return self.query_index(query_embedding, top_k, include_values=include_values, chunk_types=chunk_types)
+
+    def query_index(self, embedding: List[float], top_k: int = 5, include_values: bool = False,
+                    rerank: bool = True, chunk_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        用嵌入向量查询索引，不补全文本
+        
+        Args:
+            embedding: 查询的嵌入向量
+            top_k: 返回结果数量
+            include_values: 是否同时返回块的向量
+            rerank: 是否使用rerank模型重排
+            chunk_types: 只在这些类型的块中检索，None为不限制
+            
+        Returns:
+            List[Dict[str, Any]]: 包含id、score和metadata的列表，include_values时还包含values
+        """
+        if self.local_index is not None:
+            # 本地索引没有rerank模型，metadata中总是带有文本
+            return self.local_index.query(embedding, top_k, include_values, chunk_types)
+        index, namespace = self._resolve()
+        # 有本地文档库时只请求ID和分数
+        query = dict(
+            vector=embedding,
+            namespace=namespace,
+            top_k=top_k,
+            include_metadata=self.doc_store is None,
+            include_values=include_values
         )
-        return response.data[0].embedding
+        if chunk_types:
+            # 按类型过滤候选，检索和rerank的范围都随之缩小
+            query["filter"] = type_filter(chunk_types)
+        results = None
+        if rerank:
+            try:
+                # rerank请求较贵，不做对冲，只限制截止时间
+                results = hedger.call("rerank", index.query, hedge=False, rerank_config={
+                    "model": RERANK_MODEL,
+                    "top_k": top_k
+                }, **query)
+            except StageTimeout:
+                logger.warning("rerank超过截止时间，改用未重排的检索结果")
+        if results is None:
+            results = hedger.call("retrieve", index.query, **query)
+        hits = []
+        for match in results.matches:
+            hit = {'id': match.id, 'score': match.score, 'metadata': match.metadata or {}}
+            if include_values:
+                hit['values'] = match.values
+            hits.append(hit)
+        return hits
+
+    @staticmethod
+    def diversify(query_embedding: List[float], hits: List[Dict[str, Any]], top_k: int,
+                  mmr_lambda: float) -> List[Dict[str, Any]]:
+        """
+        用MMR从候选池中选出相互差异较大的top_k个结果，避免同一条规则的相邻切片占满结果
+        
+        Args:
+            query_embedding: 查询的嵌入向量
+            hits: 带values的候选列表
+            top_k: 选择数量
+            mmr_lambda: 相关性权重
+            
+        Returns:
+            List[Dict[str, Any]]: 选中的候选，按选择顺序排列
+        """
+        if len(hits) <= top_k:
+            return hits
+        start = time.perf_counter()
+        selected = mmr_select(query_embedding, [hit['values'] for hit in hits], top_k, mmr_lambda)
+        logger.debug("MMR：从 %d 个候选中选出 %d 个，耗时 %.2f 毫秒",
+                     len(hits), len(selected), (time.perf_counter() - start) * 1000)
+        return [hits[i] for i in selected]
+
+    def hydrate(self, scored_ids: List[Tuple[str, float]]) -> List[Dict[str, Any]]:
+        """
+        根据块ID从本地文档库补全文本
+        
+        Args:
+            scored_ids: (块ID, 分数) 列表
+            
+        Returns:
+            List[Dict[str, Any]]: 包含id、text、score和metadata的切片列表
+        """
+        docs = self.doc_store.get_many([chunk_id for chunk_id, _ in scored_ids]) if self.doc_store else {}
+        missing = [chunk_id for chunk_id, _ in scored_ids if chunk_id not in docs]
+        if missing:
+            # 文档库落后于索引时，回退到从索引读取metadata
+            logger.warning("文档库中缺少 %d 个块，从索引metadata读取", len(missing))
+            if self.local_index is not None:
+                docs.update(self.local_index.fetch(missing))
+            else:
+                index, namespace = self._resolve()
+                fetched = hedger.call("retrieve", index.fetch, ids=missing, namespace=namespace)
+                for chunk_id, vector in fetched.vectors.items():
+                    docs[chunk_id] = {'text': (vector.metadata or {}).get('text', ''), 'metadata': vector.metadata or {}}
+        return [
+            {'id': chunk_id, 'text': docs.get(chunk_id, {}).get('text', ''), 'score': score,
+             'metadata': docs.get(chunk_id, {}).get('metadata', {})}
+            for chunk_id, score in scored_ids
+        ]
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def expand_to_sections(self, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        把命中的段落扩展为所属的完整规则section
+        
+        多个段落属于同一section时只保留分数最高的一个，
+        没有父级或父级不在文档库中的段落原样保留。
+        
+        Args:
+            matches: hydrate返回的切片列表，按分数降序
+            
+        Returns:
+            List[Dict[str, Any]]: 扩展后的切片列表
+        """
+        parent_ids = [m['metadata'].get('parent_id') for m in matches]
+        parents = self.doc_store.get_many([p for p in set(parent_ids) if p])
+        expanded, seen = [], set()
+        for match, parent_id in zip(matches, parent_ids):
+            if parent_id not in parents:
+                expanded.append(match)
+                continue
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+            parent = parents[parent_id]
+            expanded.append({**match, 'id': parent_id, 'text': parent['text'],
+                             'metadata': parent['metadata'], 'passage_id': match['id']})
+        if seen:
+            logger.info("段落扩展为section：%d 个段落 -> %d 个结果", len(matches), len(expanded))
+        return expanded
+
+    def synthesize(self, query: str, matches: List[Dict[str, Any]]) -> str:
+        """
+        基于检索结果生成答案
+        
+        Args:
+            query: 查询文本
+            matches: retrieve返回的切片列表
+            
+        Returns:
+            str: 整合后的答案
+        """
+        context = [match['text'] for match in matches]
+        # 数据卡精确数据放在最前面，优先于模糊检索的切片
+        datasheet_text = self.lookup_datasheets(query)
+        if datasheet_text:
+            context.insert(0, datasheet_text)
+        # 整合结果
+        return self.semantic_parse(query, context)
+
+    def search(self, query: str, top_k: int = 5, mmr_lambda: float = None,
+               chunk_types: Optional[List[str]] = None, include_matches: bool = False) -> List[Dict[str, Any]]:
         """
         执行向量搜索
         
         Args:
             query: 查询文本
             top_k: 返回结果数量
+            mmr_lambda: MMR相关性权重，None时使用配置的MMR_LAMBDA，1.0为不做多样性选择
+            chunk_types: 只在这些类型的块中检索，见 retrieve
+            include_matches: 结果中同时返回命中的段落（带id、metadata和向量），供对话追问复用
             
         Returns:
-            List[Dict[str, Any]]: 搜索结果列表
+            List[Dict[str, Any]]: 搜索结果列表，include_matches时结果带有matches
         """
         try:
-            # 获取查询的嵌入向量
-            query_embedding = self.get_embedding(query)
-            # 使用嵌入向量进行搜索
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                rerank_config={
-                    "model": RERANK_MODEL,
-                    "top_k": top_k
-                }
-            )
-            # 整合结果
-            integrated_answer = self.semantic_parse(query, [match.metadata.get('text', '') for match in results.matches])
+            passages = self._retrieve_passages(query, top_k, mmr_lambda, chunk_types, include_matches)
+            matches = self.expand_to_sections(passages) \
+                if SECTION_EXPANSION and self.doc_store is not None else passages
+            integrated_answer = self.synthesize(query, matches)
             
-            return [{'text': integrated_answer, 'score': 1.0}]
+            result = {'text': integrated_answer, 'score': 1.0}
+            if include_matches:
+                result['matches'] = passages
+            return [result]
             
         except Exception as e:
-            logger.error(f"搜索时出错：{str(e)}")
+            logger.error("搜索时出错：%s", e)
             return []
             
     def search_and_integrate(self, query: str, top_k: int = 5) -> str:
@@ -170,7 +529,8 @@ class VectorSearch:
 
     def close(self):
         # 关闭资源
-        pass  # 这里可以替换为实际的关闭逻辑
+        if self.local_index is not None:
+            self.local_index.close()
 
 # 确保类可以被导入
 __all__ = ['VectorSearch'] 
\ No newline at end of file